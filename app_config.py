@@ -8,6 +8,62 @@ load_dotenv('.env')
 
 PATH_TO_ORCA = os.environ.get('PATH_TO_ORCA')
 SPREADSHEET_ID = os.environ.get('SPREADSHEET_ID')
-LIST_OF_BENCHS = ['geek_bench4', 'sling_shot_extreme', 'antutu7',
-                  'battery_test']
+# Benchmarks to make charts of, keys of benchmarks declared in
+# benchmark_registry.py separated by commas. All of them if not set
+LIST_OF_BENCHS = [key for key in os.environ.get('LIST_OF_BENCHS',
+                                                '').split(',') if key]
 GOOGLE_CREDENTIAL_FILE = os.environ.get('GOOGLE_CREDENTIAL_FILE')
+
+# How many of the latest smartphones are shown in a chart
+PLOT_WINDOW = int(os.environ.get('PLOT_WINDOW', 30))
+# Rankings of all smartphones split into pages, see facets.py: how many
+# smartphones a page shows and the width of a bucket of battery capacity
+FACET_PAGE_SIZE = int(os.environ.get('FACET_PAGE_SIZE', PLOT_WINDOW))
+FACET_CAPACITY_STEP = int(os.environ.get('FACET_CAPACITY_STEP', 1000))
+
+# Local snapshots of the spreadsheet
+CACHE_DIR = os.environ.get('CACHE_DIR', '.cache/sheets')
+CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES', 50 * 1024 * 1024))
+CACHE_MAX_AGE_DAYS = int(os.environ.get('CACHE_MAX_AGE_DAYS', 30))
+
+# Orca servers kept running for the whole run to render charts
+RENDERER_POOL_SIZE = int(os.environ.get('RENDERER_POOL_SIZE', 1))
+RENDER_TIMEOUT = float(os.environ.get('RENDER_TIMEOUT', 60))
+# Processes rendering charts in parallel, one per core if not set
+RENDER_WORKERS = int(os.environ.get('RENDER_WORKERS', 0)) or None
+
+# Rendered images of charts addressed by a hash of their figures
+RENDER_CACHE_DIR = os.environ.get('RENDER_CACHE_DIR', '.cache/images')
+RENDER_CACHE_MAX_BYTES = int(os.environ.get('RENDER_CACHE_MAX_BYTES',
+                                            200 * 1024 * 1024))
+
+# Fingerprints of inputs of charts made by the previous run
+BUILD_STATE_FILE = os.environ.get('BUILD_STATE_FILE',
+                                  '.cache/build_state.json')
+
+# Service that makes charts on demand, see chart_service.py
+SERVICE_HOST = os.environ.get('SERVICE_HOST', '127.0.0.1')
+SERVICE_PORT = int(os.environ.get('SERVICE_PORT', 8050))
+# Seconds between reading sheets again, 0 to never read them again
+SERVICE_REFRESH = float(os.environ.get('SERVICE_REFRESH', 600))
+SERVICE_CACHE_BYTES = int(os.environ.get('SERVICE_CACHE_BYTES',
+                                         100 * 1024 * 1024))
+
+# SQLite catalogue of smartphones kept between runs, see catalogue_store.py.
+# Smartphones are stored only if it's set
+CATALOGUE_DB = os.environ.get('CATALOGUE_DB')
+
+# Quota of Sheets API read requests per minute per user, requests are spread
+# to stay under it. Up to SHEETS_BURST requests may be sent at once
+SHEETS_QUOTA = int(os.environ.get('SHEETS_QUOTA', 60))
+SHEETS_BURST = int(os.environ.get('SHEETS_BURST', 10))
+# Throttled and failed requests are sent again after an exponential backoff
+SHEETS_MAX_RETRIES = int(os.environ.get('SHEETS_MAX_RETRIES', 5))
+SHEETS_MAX_BACKOFF = float(os.environ.get('SHEETS_MAX_BACKOFF', 64))
+# How many requests a run may send to Google, 0 for no limit
+SHEETS_REQUEST_BUDGET = int(os.environ.get('SHEETS_REQUEST_BUDGET', 0))
+
+# Metrics of a run, see metrics.py. They are collected only if a path to
+# any report is set
+METRICS_FILE = os.environ.get('METRICS_FILE')
+METRICS_PROMETHEUS_FILE = os.environ.get('METRICS_PROMETHEUS_FILE')
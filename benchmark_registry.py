@@ -0,0 +1,294 @@
+"""
+Module with the registry of benchmarks: every benchmark is declared once,
+with the layout of its sheet, its score fields, the scores shown as
+stacked bars of its chart and the characteristic shown next to a name
+
+Everything else is made from a declaration: the class which keeps results
+of a smartphone in the benchmark, settings of reading its sheet and a plan
+of extracting axes of its chart. Adding a benchmark is adding one more
+register(BenchmarkSpec(...)) call below
+
+A plan of extracting axes is compiled once per benchmark: it's a set of
+accessors made by attrgetter, so filling axes of a chart is a plain loop
+over smartphones without branching on the benchmark or chains of getattr
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from functools import lru_cache
+from operator import attrgetter
+from typing import Callable, Dict, List, Optional, Tuple, Type, TYPE_CHECKING
+
+import app_config as cfg
+
+if TYPE_CHECKING:
+    from prepare_data import Smartphone
+
+
+class UnknownBenchmark(KeyError):
+    """
+    Raised when a benchmark isn't declared in the registry
+    """
+
+    def __init__(self, key: str) -> None:
+        super().__init__(key)
+        self.key = key
+
+    def __str__(self) -> str:
+        return (f'Unknown benchmark {self.key!r}, declared benchmarks are: '
+                f'{", ".join(BENCHMARKS)}')
+
+
+class Benchmark:
+
+    """
+    Parent class for any benchmark - to gather results of a smarphone in a
+    benchmark
+    """
+
+    name: str = 'Benchmark name here'
+
+    # There would be strings with user-friendly names of subtests for string
+    # representation of an instance of the class
+    subtests: Tuple[str, ...] = ()
+
+    # Names of attributes with scores of a smartphone in subtests, in the
+    # same order as subtests. Every subclass declares its own ones
+    score_fields: Tuple[str, ...] = ()
+
+    __slots__ = ('smartphone', 'percentage_diff')
+
+    def __init__(self, smartphone: 'Smartphone',
+                 percentage_diff: Optional[str] = None) -> None:
+        self.smartphone = smartphone
+        self.percentage_diff = percentage_diff
+
+    def _get_bench_results(self) -> List[int]:
+        """
+        Returns a list of integers that represent results of a smartphone in
+        subtests of a given benchmark
+        """
+        return [getattr(self, field) for field in self.score_fields]
+
+    def __str__(self) -> str:
+        """
+        Returns a string that represents vital information about an instance
+        of the class
+        """
+        score_attrs = self._get_bench_results()
+
+        response = (f'Smartphone {self.smartphone.name}, '
+                    f'results in {self.name}:\n')
+        response += f'Date: {self.smartphone.date}\n'
+
+        # Concatenate a name of the subtest and the score of a smartphone in
+        # this subtest
+        for name, value in zip(self.subtests, score_attrs):
+            response += f'{name}: {value}\n'
+
+        return response
+
+
+@dataclass(frozen=True)
+class BenchmarkSpec:
+    """
+    Declaration of a benchmark
+
+    key - attribute of a smartphone with its results, the name of the
+    benchmark everywhere in the app
+    class_name, name - name of the class and the user-friendly name
+    sheet_name, table_start_row, column_with_name - where the table is in
+    the spreadsheet
+    columns - score fields in the order of score columns of the sheet
+    subtests - pairs of a score field and its user-friendly name, in the
+    order they are shown. A 'total_score' that isn't one of columns is the
+    sum of them
+    axes - score fields shown as stacked bars of a chart
+    label_attr - attribute of a smartphone shown in parentheses after its
+    name on a chart, 'chip' or 'battery_capacity'
+    title, trace_names - the title of a chart and names of its bars, they
+    may be overridden by a section of plot_settings.json named by key
+    """
+    key: str
+    class_name: str
+    name: str
+    sheet_name: str
+    column_with_name: int
+    columns: Tuple[str, ...]
+    subtests: Tuple[Tuple[str, str], ...]
+    axes: Tuple[str, ...]
+    label_attr: str = 'chip'
+    title: str = ''
+    trace_names: Tuple[str, ...] = ()
+    table_start_row: int = 4
+    bench_class: Type[Benchmark] = field(init=False, repr=False,
+                                         compare=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, 'bench_class', _make_class(self))
+
+    @property
+    def score_fields(self) -> Tuple[str, ...]:
+        return tuple(score_field for score_field, _ in self.subtests)
+
+
+def _make_class(spec: BenchmarkSpec) -> Type[Benchmark]:
+    """
+    Makes a class of a benchmark with slots for its scores. Its __init__
+    takes scores in the order of columns of the sheet, missing ones are 0
+    """
+    fields = spec.score_fields
+    columns = spec.columns
+    sums_total = 'total_score' in fields and 'total_score' not in columns
+
+    def __init__(self, smartphone: Smartphone, *scores: int) -> None:
+        if len(scores) > len(columns):
+            raise TypeError(f'{spec.class_name} takes at most '
+                            f'{len(columns)} scores, got {len(scores)}')
+        Benchmark.__init__(self, smartphone)
+        scores += (0,) * (len(columns) - len(scores))
+        for column, score in zip(columns, scores):
+            setattr(self, column, score)
+        if sums_total:
+            self.total_score = sum(scores)
+
+    return type(spec.class_name, (Benchmark,), {
+        '__module__': __name__,
+        '__doc__': f'Results of a smartphone in {spec.name}',
+        '__slots__': fields,
+        '__init__': __init__,
+        'name': spec.name,
+        'subtests': tuple(subtest for _, subtest in spec.subtests),
+        'score_fields': fields,
+    })
+
+
+# declared benchmarks by their keys, in the order they were declared
+BENCHMARKS: Dict[str, BenchmarkSpec] = {}
+
+
+def register(spec: BenchmarkSpec) -> Type[Benchmark]:
+    """
+    Adds a benchmark to the registry
+
+    :return: class of the benchmark
+    """
+    if spec.key in BENCHMARKS:
+        raise ValueError(f'Benchmark {spec.key!r} is already registered')
+    BENCHMARKS[spec.key] = spec
+    return spec.bench_class
+
+
+GeekBench4 = register(BenchmarkSpec(
+    key='geek_bench4',
+    class_name='GeekBench4',
+    name='GeekBench 4',
+    sheet_name='GeekBench 4',
+    column_with_name=32,
+    columns=('multi_core_score', 'single_core_score'),
+    subtests=(('multi_core_score', 'Multi-Core Score'),
+              ('single_core_score', 'Single-Core Score'),
+              ('total_score', 'Total Score')),
+    axes=('multi_core_score', 'single_core_score'),
+    title='Мощность процессора (тест GeekBench 4), баллы',
+    trace_names=('Все ядра', 'Одно ядро')))
+
+SlingShotExtreme = register(BenchmarkSpec(
+    key='sling_shot_extreme',
+    class_name='SlingShotExtreme',
+    name='3DMark Sling Shot Extreme',
+    sheet_name='3DMark Sling Shot Extreme',
+    column_with_name=29,
+    columns=('total_score',),
+    subtests=(('total_score', 'Score'),),
+    axes=('total_score',),
+    title='Игровая производительность (тест 3DMark Sling Shot Extreme), '
+          'баллы',
+    trace_names=('баллы',)))
+
+Antutu7 = register(BenchmarkSpec(
+    key='antutu7',
+    class_name='Antutu7',
+    name='AnTuTu Benchmark 7',
+    sheet_name='Antutu Benchmark 7',
+    column_with_name=29,
+    columns=('total_score',),
+    subtests=(('total_score', 'Score'),),
+    axes=('total_score',),
+    title='Производительность всей системы (тест Antutu Benchmark 7), '
+          'баллы',
+    trace_names=('баллы',)))
+
+# scores are minutes - how much each smartphone lasted in each activity
+BatteryTest = register(BenchmarkSpec(
+    key='battery_test',
+    class_name='BatteryTest',
+    name='Battery Test',
+    sheet_name='battery_test',
+    column_with_name=34,
+    columns=('movie_score', 'read_score', 'game_score'),
+    subtests=(('read_score', 'Read score'), ('movie_score', 'Movie score'),
+              ('game_score', 'Game score'), ('total_score', 'Total score')),
+    axes=('read_score', 'movie_score', 'game_score'),
+    label_attr='battery_capacity',
+    title='Время автономной работы, минуты',
+    trace_names=('Чтение', 'Видео', 'Игры')))
+
+
+def get_spec(key: str) -> BenchmarkSpec:
+    """
+    Gives the declaration of a benchmark, raises UnknownBenchmark if there
+    is no such benchmark
+    """
+    try:
+        return BENCHMARKS[key]
+    except KeyError:
+        raise UnknownBenchmark(key) from None
+
+
+def chart_benchmarks() -> List[str]:
+    """
+    Keys of benchmarks to make charts of: cfg.LIST_OF_BENCHS if it's set
+    and all declared benchmarks otherwise. Raises UnknownBenchmark if
+    cfg.LIST_OF_BENCHS has a key that isn't declared
+    """
+    for key in cfg.LIST_OF_BENCHS:
+        get_spec(key)
+    return list(cfg.LIST_OF_BENCHS or BENCHMARKS)
+
+
+class ExtractionPlan:
+
+    """
+    Accessors of everything a chart of a benchmark is made from, made once
+    from its declaration. Every accessor takes a smartphone
+    """
+
+    def __init__(self, spec: BenchmarkSpec) -> None:
+        self.spec = spec
+        self.benchmark: Callable[[Smartphone], Benchmark] = \
+            attrgetter(spec.key)
+        self.total: Callable[[Smartphone], int] = \
+            attrgetter(f'{spec.key}.total_score')
+        self.percentage: Callable[[Smartphone], Optional[str]] = \
+            attrgetter(f'{spec.key}.percentage_diff')
+        self.label: Callable[[Smartphone], Optional[str]] = \
+            attrgetter(spec.label_attr)
+        self.axes: Tuple[Callable[[Smartphone], int], ...] = tuple(
+            attrgetter(f'{spec.key}.{axis}') for axis in spec.axes)
+
+    def extract_axes(self, smartphones: List[Smartphone]) -> List[List[int]]:
+        """
+        Gives values of every axis of a chart, a list per axis
+        """
+        return [list(map(axis, smartphones)) for axis in self.axes]
+
+
+@lru_cache(maxsize=None)
+def plan(key: str) -> ExtractionPlan:
+    """
+    Gives the plan of extracting axes of a chart of a benchmark, it's
+    compiled on the first call
+    """
+    return ExtractionPlan(get_spec(key))
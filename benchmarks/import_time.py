@@ -0,0 +1,91 @@
+"""
+Check of the startup budget: every module of the app must import quickly
+and without importing heavy libraries, which are imported on first use
+
+Every module is imported in a fresh interpreter. Exits with status 1 if any
+module is over the budget or imports a heavy library
+
+Run from the root of the project:
+    python -m benchmarks.import_time
+
+tests/test_import_time.py makes the same check a part of the tests
+"""
+
+import re
+import subprocess
+import sys
+
+# modules of the app and how long their import may take, in milliseconds
+BUDGET_MS = {
+    'app_config': 100,
+    'benchmark_registry': 100,
+    'prepare_data': 150,
+    'data_sources': 150,
+    'export': 150,
+    'make_chart': 150,
+    'incremental': 150,
+    'catalogue_store': 150,
+    'facets': 150,
+    'history': 150,
+    'render_scheduler': 150,
+    'chart_service': 200,
+    'main': 200,
+}
+
+# libraries that must not be imported until they are used
+HEAVY = ('plotly', 'numpy', 'openpyxl', 'pyarrow', 'apiclient',
+         'googleapiclient', 'httplib2', 'oauth2client')
+
+REPEAT = 3
+
+IMPORT_TIME = re.compile(r'^import time:\s+\d+ \|\s+(\d+) \|\s*(\S+)$')
+
+
+def measure(module: str):
+    """
+    Imports a module in a fresh interpreter
+
+    :return: cumulative import time in milliseconds and heavy libraries
+    the module imported
+    """
+    code = (f'import sys; import {module}; '
+            f'print(" ".join(sorted(m for m in sys.modules '
+            f'if m.split(".")[0] in {HEAVY!r})))')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            capture_output=True, text=True, check=True)
+    micros = 0
+    for line in result.stderr.splitlines():
+        matches = IMPORT_TIME.match(line)
+        if matches and matches.group(2) == module:
+            micros = int(matches.group(1))
+    return micros / 1000, result.stdout.split()
+
+
+def main() -> int:
+    failed = []
+    print(f'{"module":<18} {"ms":>8} {"budget":>8}')
+    for module, budget in BUDGET_MS.items():
+        # the best of several runs, the first one may be slowed down by
+        # compiling bytecode
+        runs = [measure(module) for _ in range(REPEAT)]
+        ms = min(run[0] for run in runs)
+        heavy = runs[-1][1]
+
+        problems = []
+        if ms > budget:
+            problems.append('over budget')
+        if heavy:
+            problems.append(f'imports {", ".join(heavy)}')
+        if problems:
+            failed.append(module)
+        print(f'{module:<18} {ms:>8.1f} {budget:>8} {"; ".join(problems)}')
+
+    if failed:
+        print(f'Startup budget exceeded by: {", ".join(failed)}')
+        return 1
+    print('All modules are within the startup budget')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,207 @@
+"""
+Benchmark suite of the stages of a run on synthetic sheets, see
+benchmarks/synthetic.py. Every stage is timed separately:
+
+* read - read_from_excel_book, sheets come from the fake Sheets API
+* prepare_data - prepare_data of every benchmark
+* build_figure - figures of every benchmark
+* write_to_excel - write_to_excel into a temporary directory
+
+Every stage is run several times and the best time is taken. Times are
+compared with a stored baseline and the suite exits with status 1 if any
+stage got slower than the baseline by more than the tolerance. Baselines
+depend on the machine, so save a new one when running the suite somewhere
+else
+
+Run from the root of the project:
+    python -m benchmarks.suite
+    python -m benchmarks.suite --sizes 100 1000000 --save
+"""
+
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import tempfile
+import time
+from contextlib import redirect_stdout
+from typing import Callable, Dict, List, Optional
+
+from benchmark_registry import chart_benchmarks
+from benchmarks.synthetic import make_client
+from data_sources import GoogleSheetsSource
+from make_chart import build_figure
+from prepare_data import Smartphones
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+SIZES = (100, 10_000, 100_000)
+REPEAT = 5
+
+# a stage is slower if it takes more than (1 + TOLERANCE) of the baseline
+TOLERANCE = 0.25
+# and more than that many seconds longer, so tiny stages don't fail on noise
+MIN_SLOWDOWN = 0.02
+
+STAGES = ('read', 'prepare_data', 'build_figure', 'write_to_excel')
+
+Times = Dict[str, Dict[str, float]]
+
+
+def best_time(func: Callable[[], object], repeat: int) -> float:
+    """
+    Runs a function several times and gives the shortest time of a run,
+    garbage is collected before every run
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(size: int, repeat: int = REPEAT,
+        page_size: Optional[int] = None) -> Dict[str, float]:
+    """
+    Times every stage on sheets with size rows
+
+    :param size: number of rows in all sheets together
+    :param repeat: how many times every stage is run
+    :param page_size: read sheets in pages of page_size rows, all at once
+    if None
+    :return: dict where a key is a stage and a value is its best time in
+    seconds
+    """
+    source = GoogleSheetsSource(client=make_client(size),
+                                page_size=page_size)
+
+    def read() -> Smartphones:
+        smartphones = Smartphones()
+        smartphones.read_from_excel_book(source=source)
+        return smartphones
+
+    smartphones = read()
+    smartphones.build_date_index()
+
+    benches = chart_benchmarks()
+
+    def prepare() -> list:
+        return [smartphones.prepare_data(bench) for bench in benches]
+
+    data = prepare()
+
+    def build() -> list:
+        return [build_figure(bench, data_for_plots)
+                for bench, data_for_plots in zip(benches, data)]
+
+    # plotly is imported and its validators are made on the first figure,
+    # that's the cost of a startup and not of building figures
+    build()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'smartphones.xlsx')
+
+        def write() -> None:
+            with redirect_stdout(io.StringIO()):
+                smartphones.write_to_excel(path)
+
+        stages = {'read': read, 'prepare_data': prepare,
+                  'build_figure': build, 'write_to_excel': write}
+        return {stage: best_time(stages[stage], repeat) for stage in STAGES}
+
+
+def compare(times: Times, baseline: Times, tolerance: float) -> List[str]:
+    """
+    Prints times next to the baseline
+
+    :return: descriptions of stages that got slower
+    """
+    regressions = []
+    print(f'{"rows":>8} {"stage":<15} {"seconds":>10} {"baseline":>10} '
+          f'{"change":>8}')
+    for size, stages in times.items():
+        for stage, seconds in stages.items():
+            base = baseline.get(size, {}).get(stage)
+            if base is None:
+                print(f'{size:>8} {stage:<15} {seconds:>10.4f}')
+                continue
+            change = seconds / base - 1 if base else 0
+            slower = (seconds > base * (1 + tolerance)
+                      and seconds - base > MIN_SLOWDOWN)
+            if slower:
+                regressions.append(f'{stage} on {size} rows: {seconds:.4f}s '
+                                   f'instead of {base:.4f}s')
+            print(f'{size:>8} {stage:<15} {seconds:>10.4f} {base:>10.4f} '
+                  f'{change:>+8.0%}{" slower" if slower else ""}')
+    return regressions
+
+
+def load_baseline(path: str) -> Times:
+    with open(path, encoding='utf8') as infile:
+        return json.load(infile)['times']
+
+
+def save_baseline(path: str, times: Times) -> None:
+    baseline = {'python': platform.python_version(),
+                'machine': platform.machine(),
+                'processor': platform.processor(),
+                'times': {size: {stage: round(seconds, 6)
+                                 for stage, seconds in stages.items()}
+                          for size, stages in times.items()}}
+    with open(path, 'w', encoding='utf8') as outfile:
+        json.dump(baseline, outfile, indent=4)
+        outfile.write('\n')
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Time stages of a run on '
+                                                 'synthetic sheets')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES,
+                        metavar='ROWS',
+                        help='numbers of rows in all sheets together')
+    parser.add_argument('--repeat', type=int, default=REPEAT,
+                        help='how many times every stage is run')
+    parser.add_argument('--page-size', type=int, default=None, metavar='N',
+                        help='read sheets in pages of N rows')
+    parser.add_argument('--baseline', default=BASELINE_FILE, metavar='PATH',
+                        help='file with baseline times')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='allowed slowdown, 0.25 is 25%% slower')
+    parser.add_argument('--save', action='store_true',
+                        help='save times as the new baseline instead of '
+                             'comparing with it')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    # keys of JSON objects are strings, so sizes are strings too
+    times = {str(size): run(size, args.repeat, args.page_size)
+             for size in args.sizes}
+
+    if args.save:
+        compare(times, {}, args.tolerance)
+        save_baseline(args.baseline, times)
+        print(f'Baseline was saved to {args.baseline}')
+        return 0
+
+    baseline = (load_baseline(args.baseline)
+                if os.path.exists(args.baseline) else {})
+    regressions = compare(times, baseline, args.tolerance)
+    if not baseline:
+        print(f'There is no baseline in {args.baseline}, save it with '
+              f'--save')
+    if regressions:
+        print('Stages got slower than the baseline:')
+        for regression in regressions:
+            print(f'  {regression}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
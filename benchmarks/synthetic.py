@@ -0,0 +1,276 @@
+"""
+Generator of synthetic sheets with results of benchmarks and a local fake
+of Google Sheets API that serves them, optionally with a quota and
+transient errors like the real one
+
+Sheets have the same layouts as the real ones described by
+Smartphones._make_table_reading_settings: heading rows, then rows of an
+action flag, a date, 'Name (Chip)' or 'Name (Capacity)', scores and a total
+score. The same devices are tested in every benchmark, a few of them are
+highlighted or ignored and some have no date, as in the real spreadsheet.
+The same size and seed always give the same sheets
+
+Sheets can also be written as CSV files to be read with --csv-dir:
+    python -m benchmarks.synthetic 100000 /tmp/synthetic
+"""
+
+import csv
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from gspread_downloader import HEADER_ROWS, RequestScheduler, SheetsClient
+from prepare_data import Smartphones
+from row_parser import DATE_FORMAT
+
+Sheets = Dict[str, List[List[str]]]
+
+VENDORS = ('Samsung Galaxy', 'Xiaomi Redmi', 'Huawei', 'Honor',
+           'Apple iPhone', 'OnePlus', 'Nokia', 'Motorola Moto', 'Sony Xperia',
+           'Meizu')
+CHIPS = ('Snapdragon 845', 'Snapdragon 710', 'Snapdragon 450', 'Kirin 980',
+         'Kirin 710', 'Helio P60', 'Helio G90T', 'Exynos 9810', 'A12 Bionic')
+FIRST_DATE = date(2015, 1, 1)
+DAYS = 5 * 365
+
+# shares of devices that are highlighted, ignored and have no date
+HIGHLIGHTED = 0.02
+IGNORED = 0.03
+WITHOUT_DATE = 0.05
+
+
+def make_sheets(rows: int, seed: int = 0) -> Sheets:
+    """
+    Makes sheets of every benchmark, rows are split between them evenly
+
+    :param rows: number of rows in all sheets together
+    :param seed: seed of random values
+    :return: dict where a key is a name of a sheet and a value is its rows,
+    heading rows included, as Google Sheets API returns them
+    """
+    settings = Smartphones._make_table_reading_settings()
+    devices = max(rows // len(settings), 1)
+    rnd = random.Random(seed)
+
+    # attributes of a device are the same in every sheet
+    names, chips, capacities, dates, actions = [], [], [], [], []
+    for i in range(devices):
+        names.append(f'{rnd.choice(VENDORS)} {i}')
+        chips.append(rnd.choice(CHIPS))
+        capacities.append(f'{rnd.randrange(2000, 6001, 100)} мАч')
+        dates.append('' if rnd.random() < WITHOUT_DATE else
+                     (FIRST_DATE + timedelta(days=rnd.randrange(DAYS)))
+                     .strftime(DATE_FORMAT))
+        flag = rnd.random()
+        actions.append('+' if flag < HIGHLIGHTED else
+                       '-' if flag < HIGHLIGHTED + IGNORED else '')
+
+    sheets = {}
+    for trs in settings.values():
+        characteristics = (capacities
+                           if trs.chip_or_capacity == 'battery_capacity'
+                           else chips)
+        # headings aren't read, only their number matters
+        sheet = [[trs.sheet_name] for _ in range(HEADER_ROWS)]
+        for i in range(devices):
+            scores = [rnd.randrange(100, 10_000)
+                      for _ in range(trs.columns_after_name)]
+            row = [actions[i], dates[i],
+                   f'{names[i]} ({characteristics[i]})']
+            row.extend(map(str, scores))
+            # the total score is only in sheets with several subtests
+            if len(scores) > 1:
+                row.append(str(sum(scores)))
+            sheet.append(row)
+        sheets[trs.sheet_name] = sheet
+    return sheets
+
+
+class FakeResponse(dict):
+
+    """
+    Headers and the status of a response, like httplib2.Response
+    """
+
+    def __init__(self, status: int, headers: Optional[dict] = None) -> None:
+        super().__init__(headers or {})
+        self.status = status
+
+
+class FakeHttpError(Exception):
+
+    """
+    Error of a request, like googleapiclient.errors.HttpError
+    """
+
+    def __init__(self, resp: FakeResponse) -> None:
+        super().__init__(f'<HttpError {resp.status}>')
+        self.resp = resp
+
+
+class _Request:
+
+    def __init__(self, service: 'FakeSheetsService',
+                 make_payload: Callable[[], dict]) -> None:
+        self.service = service
+        self.make_payload = make_payload
+
+    def execute(self, **kwargs) -> dict:
+        self.service.admit()
+        # a response goes through JSON as it does over the wire
+        return json.loads(json.dumps(self.make_payload(),
+                                     ensure_ascii=False))
+
+
+class FakeSheetsService:
+
+    """
+    Local fake of a discovered sheets service, supports values().get with
+    whole sheets and ranges of rows like "'GeekBench 4'!3:102",
+    values().batchGet with whole sheets and get with the number of rows of
+    a sheet
+
+    Like the real API it may answer 429 to requests over a quota of quota
+    requests in any period seconds, and 503 to a share error_rate of
+    requests
+    """
+
+    def __init__(self, sheets: Sheets, quota: int = 0, period: float = 60.0,
+                 error_rate: float = 0.0, latency: float = 0.0,
+                 seed: int = 0) -> None:
+        """
+        :param sheets: sheets to serve, see make_sheets
+        :param quota: requests allowed in a period, 0 for no quota
+        :param period: period of the quota in seconds
+        :param error_rate: share of requests failed with 503
+        :param latency: seconds every request takes
+        :param seed: seed of failed requests
+        """
+        self.sheets = sheets
+        self.quota = quota
+        self.period = period
+        self.error_rate = error_rate
+        self.latency = latency
+        self.requests = 0
+        self.throttled = 0
+        self.failed = 0
+        self._sent: deque = deque()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def admit(self) -> None:
+        """
+        Decides whether a request is served or fails, raises FakeHttpError
+        in the latter case
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.requests += 1
+            now = time.monotonic()
+            while self._sent and self._sent[0] <= now - self.period:
+                self._sent.popleft()
+            if self.quota and len(self._sent) >= self.quota:
+                self.throttled += 1
+                retry_after = self._sent[0] + self.period - now
+                raise FakeHttpError(FakeResponse(
+                    429, {'retry-after': f'{retry_after:.3f}'}))
+            self._sent.append(now)
+            if self._random.random() < self.error_rate:
+                self.failed += 1
+                raise FakeHttpError(FakeResponse(503))
+
+    def spreadsheets(self) -> '_Spreadsheets':
+        return _Spreadsheets(self)
+
+    @staticmethod
+    def _split_range(range_: str) -> Tuple[str, str]:
+        name, _, rows = range_.partition('!')
+        if name.startswith("'"):
+            name = name[1:-1].replace("''", "'")
+        return name, rows
+
+    def _values(self, range_: str) -> List[List[str]]:
+        name, rows = self._split_range(range_)
+        values = self.sheets[name]
+        if rows:
+            first, last = (int(number) for number in rows.split(':'))
+            values = values[first - 1:last]
+        # like Google, blank rows at the end of a range are omitted
+        end = len(values)
+        while end and not any(values[end - 1]):
+            end -= 1
+        return values[:end]
+
+    def get(self, spreadsheetId: str, range: str) -> _Request:
+        return _Request(self, lambda: {'range': range,
+                                       'values': self._values(range)})
+
+    def batchGet(self, spreadsheetId: str, ranges: List[str]) -> _Request:
+        return _Request(self, lambda: {'valueRanges': [
+            {'range': range_, 'values': self._values(range_)}
+            for range_ in ranges]})
+
+
+class _Spreadsheets:
+
+    def __init__(self, service: FakeSheetsService) -> None:
+        self.service = service
+
+    def values(self) -> FakeSheetsService:
+        return self.service
+
+    def get(self, spreadsheetId: str, ranges: List[str],
+            fields: Optional[str] = None) -> _Request:
+        # only the number of rows of the grid is supported, the grid ends
+        # with the last row of a sheet
+        sheets = self.service.sheets
+        return _Request(self.service, lambda: {'sheets': [
+            {'properties': {'gridProperties': {'rowCount': len(
+                sheets[self.service._split_range(range_)[0]])}}}
+            for range_ in ranges]})
+
+
+def make_client(rows: int, seed: int = 0,
+                scheduler: Optional[RequestScheduler] = None,
+                **service_options) -> SheetsClient:
+    """
+    Makes a client of the spreadsheet served by FakeSheetsService with
+    synthetic sheets, see make_sheets
+
+    :param rows: number of rows in all sheets together
+    :param seed: seed of random values
+    :param scheduler: scheduler of requests, by default requests are not
+    limited since the fake has no quota unless it's given one
+    :param service_options: options of FakeSheetsService
+    """
+    service = FakeSheetsService(make_sheets(rows, seed), **service_options)
+    return SheetsClient(spreadsheet_id='synthetic', service=service,
+                        scheduler=scheduler or RequestScheduler(quota=0))
+
+
+def write_csv(sheets: Sheets, directory: str) -> None:
+    """
+    Writes sheets as CSV files readable by data_sources.CsvSource
+    """
+    os.makedirs(directory, exist_ok=True)
+    for name, rows in sheets.items():
+        path = os.path.join(directory, f'{name}.csv')
+        with open(path, 'w', newline='', encoding='utf-8') as outfile:
+            csv.writer(outfile).writerows(rows)
+
+
+def main() -> None:
+    rows, directory = int(sys.argv[1]), sys.argv[2]
+    write_csv(make_sheets(rows), directory)
+    print(f'Wrote {rows} rows to {directory}')
+
+
+if __name__ == '__main__':
+    main()
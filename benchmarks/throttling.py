@@ -0,0 +1,118 @@
+"""
+Check of the scheduler of requests against the fake Sheets API with a quota
+and transient errors, see benchmarks/synthetic.py:
+
+* limited - the scheduler keeps under the quota, so nothing is throttled,
+  and failed requests are sent again
+* unlimited - without the rate limit requests are throttled, and they are
+  sent again after Retry-After
+* dedup - identical requests made at the same time are sent once
+* budget - a run stops when it has sent the allowed number of requests
+
+Quotas are per QUOTA_PERIOD seconds instead of a minute to keep the check
+short. Exits with status 1 if any check fails
+
+Run from the root of the project:
+    python -m benchmarks.throttling
+
+tests/test_scheduler.py makes the same checks on fewer rows
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+from benchmarks.synthetic import make_client
+from gspread_downloader import (HEADER_ROWS, RequestBudgetExceeded,
+                                RequestScheduler, SheetsClient)
+
+ROWS = 20_000
+SHEET = 'GeekBench 4'
+PAGE_SIZE = 100
+QUOTA = 20
+QUOTA_PERIOD = 2.0
+BURST = 5
+ERROR_RATE = 0.1
+
+
+def download(client: SheetsClient) -> bool:
+    """
+    Downloads a sheet page by page and checks that nothing was lost
+    """
+    pages = list(client.iter_sheet_pages(SHEET, PAGE_SIZE))
+    rows = [row for page in pages for row in page if row]
+    return rows == client.service.sheets[SHEET][HEADER_ROWS:]
+
+
+def report(client: SheetsClient, seconds: float) -> None:
+    service, scheduler = client.service, client.scheduler
+    print(f'  {service.requests} requests in {seconds:.1f} s, '
+          f'{service.requests / seconds:.1f} per second, '
+          f'{service.throttled} throttled, {service.failed} failed, '
+          f'{scheduler.retries} retries')
+
+
+def check_limited() -> bool:
+    scheduler = RequestScheduler(quota=QUOTA, period=QUOTA_PERIOD,
+                                 burst=BURST, backoff=0.05, max_backoff=0.5)
+    client = make_client(ROWS, scheduler=scheduler, quota=QUOTA,
+                         period=QUOTA_PERIOD, error_rate=ERROR_RATE)
+    start = time.perf_counter()
+    ok = download(client)
+    report(client, time.perf_counter() - start)
+    return ok and client.service.throttled == 0
+
+
+def check_unlimited() -> bool:
+    scheduler = RequestScheduler(quota=0, backoff=0.05, max_backoff=0.5,
+                                 max_retries=20)
+    client = make_client(ROWS, scheduler=scheduler, quota=QUOTA,
+                         period=QUOTA_PERIOD)
+    start = time.perf_counter()
+    ok = download(client)
+    report(client, time.perf_counter() - start)
+    return ok and client.service.throttled > 0
+
+
+def check_dedup() -> bool:
+    client = make_client(ROWS, latency=0.2)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        sheets = list(executor.map(client.get_sheet, [SHEET] * 8))
+    print(f'  {client.service.requests} requests for 8 identical ones')
+    return (client.service.requests == 1
+            and all(sheet == sheets[0] for sheet in sheets))
+
+
+def check_budget() -> bool:
+    client = make_client(ROWS, scheduler=RequestScheduler(quota=0, budget=3))
+    try:
+        download(client)
+    except RequestBudgetExceeded as e:
+        print(f'  {e}')
+        return client.service.requests == 3
+    return False
+
+
+CHECKS: Dict[str, Callable[[], bool]] = {
+    'limited': check_limited,
+    'unlimited': check_unlimited,
+    'dedup': check_dedup,
+    'budget': check_budget,
+}
+
+
+def main() -> int:
+    failed = []
+    for name, check in CHECKS.items():
+        print(f'{name}:')
+        if not check():
+            failed.append(name)
+    if failed:
+        print(f'Failed checks: {", ".join(failed)}')
+        return 1
+    print('All checks passed')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,77 @@
+"""
+Microbenchmark of selecting the latest smartphones for a chart: a full sort
+by date against a heap of the window size and against a prebuilt date index
+
+Run from the root of the project:
+    python -m benchmarks.top_n
+"""
+
+import random
+import timeit
+from datetime import datetime, timedelta
+from operator import attrgetter
+
+import app_config as cfg
+from prepare_data import Smartphone, Smartphones
+
+SIZES = (10_000, 100_000)
+REPEAT = 5
+
+
+def make_smartphones(size: int, seed: int = 0) -> Smartphones:
+    """
+    Makes smartphones with random dates and scores, many of them share the
+    same date to check that ties are resolved the same way
+    """
+    rnd = random.Random(seed)
+    start = datetime(2015, 1, 1)
+    smartphones = Smartphones()
+    for i in range(size):
+        smartphone = Smartphone(f'Smartphone {i}',
+                                date=start + timedelta(days=rnd.randrange(
+                                    size // 10 + 1)),
+                                ignore=rnd.random() < 0.05)
+        smartphone.antutu7.total_score = rnd.randrange(0, 400_000)
+        smartphones.all_smartphones[smartphone.name] = smartphone
+    return smartphones
+
+
+def full_sort(smartphones: Smartphones, benchmark: str, window: int):
+    """
+    The way the latest smartphones used to be selected
+    """
+    eligible = [x for x in smartphones.all_smartphones.values()
+                if x.date and getattr(x, benchmark).total_score
+                and not x.ignore]
+    return sorted(eligible, key=attrgetter('date'))[-window:]
+
+
+def main() -> None:
+    benchmark = 'antutu7'
+    window = cfg.PLOT_WINDOW
+
+    print(f'{"devices":>8} {"full sort":>12} {"heap":>12} {"index":>12}')
+    for size in SIZES:
+        smartphones = make_smartphones(size)
+        expected = full_sort(smartphones, benchmark, window)
+        assert smartphones._select_latest(benchmark, window) == expected
+
+        sort_time = min(timeit.repeat(
+            lambda: full_sort(smartphones, benchmark, window),
+            number=1, repeat=REPEAT))
+        heap_time = min(timeit.repeat(
+            lambda: smartphones._select_latest(benchmark, window),
+            number=1, repeat=REPEAT))
+
+        smartphones.build_date_index()
+        assert smartphones._select_latest(benchmark, window) == expected
+        index_time = min(timeit.repeat(
+            lambda: smartphones._select_latest(benchmark, window),
+            number=1, repeat=REPEAT))
+
+        print(f'{size:>8} {sort_time * 1000:>10.2f}ms '
+              f'{heap_time * 1000:>10.2f}ms {index_time * 1000:>10.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+"""
+Module with a persistent catalogue of smartphones in a local SQLite database
+
+Every ingest upserts smartphones, their characteristics and scores into the
+catalogue, so results survive between runs and the app can start from the
+catalogue instead of reading the whole spreadsheet again. Smartphones that
+disappeared from the spreadsheet stay in the catalogue, and every changed
+score is recorded in the history table by a trigger
+
+Tables:
+
+* smartphones - a row per smartphone, indexed by name and by date
+* results - a row per score: smartphone, benchmark, field, score, indexed
+  by benchmark
+* history - old and new values of every score that changed
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import app_config as cfg
+from benchmark_registry import BENCHMARKS
+from metrics import timed
+from prepare_data import Smartphone, Smartphones
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS smartphones (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    date TEXT,
+    chip TEXT,
+    battery_capacity TEXT,
+    is_highlighted INTEGER NOT NULL DEFAULT 0,
+    is_ignored INTEGER NOT NULL DEFAULT 0,
+    -- order in which smartphones were added, ties of dates are resolved by
+    -- it just like in memory
+    position INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS smartphones_by_date
+    ON smartphones (date, position);
+
+CREATE TABLE IF NOT EXISTS results (
+    smartphone_id INTEGER NOT NULL REFERENCES smartphones (id),
+    benchmark TEXT NOT NULL,
+    field TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    PRIMARY KEY (smartphone_id, benchmark, field)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS results_by_benchmark
+    ON results (benchmark, field, score);
+
+CREATE TABLE IF NOT EXISTS history (
+    smartphone_id INTEGER NOT NULL REFERENCES smartphones (id),
+    benchmark TEXT NOT NULL,
+    field TEXT NOT NULL,
+    old_score INTEGER NOT NULL,
+    new_score INTEGER NOT NULL,
+    changed_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_by_smartphone
+    ON history (smartphone_id, benchmark);
+
+CREATE TRIGGER IF NOT EXISTS results_history
+AFTER UPDATE OF score ON results WHEN old.score != new.score
+BEGIN
+    INSERT INTO history (smartphone_id, benchmark, field, old_score,
+                         new_score, changed_at)
+    VALUES (old.smartphone_id, old.benchmark, old.field, old.score,
+            new.score, strftime('%Y-%m-%dT%H:%M:%SZ', 'now'));
+END;
+'''
+
+# characteristics missing from a sheet that was read don't erase the known
+# ones, flags are taken from the spreadsheet as they are
+UPSERT_SMARTPHONE = '''
+INSERT INTO smartphones (name, date, chip, battery_capacity, is_highlighted,
+                         is_ignored, position)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (name) DO UPDATE SET
+    date = COALESCE(excluded.date, date),
+    chip = COALESCE(excluded.chip, chip),
+    battery_capacity = COALESCE(excluded.battery_capacity, battery_capacity),
+    is_highlighted = excluded.is_highlighted,
+    is_ignored = excluded.is_ignored
+'''
+
+UPSERT_RESULT = '''
+INSERT INTO results (smartphone_id, benchmark, field, score)
+VALUES ((SELECT id FROM smartphones WHERE name = ?), ?, ?, ?)
+ON CONFLICT (smartphone_id, benchmark, field) DO UPDATE SET
+    score = excluded.score
+WHERE score != excluded.score
+'''
+
+# the same smartphones in the same order as Smartphones._select_latest, the
+# index by date is walked from the date a ranking is made as of until limit
+# smartphones are found. A negative limit is no limit
+SELECT_LATEST = '''
+SELECT name FROM smartphones AS s
+WHERE s.date IS NOT NULL AND s.date <= ? AND NOT s.is_ignored
+    AND EXISTS (SELECT 1 FROM results AS r
+                WHERE r.smartphone_id = s.id AND r.benchmark = ?
+                    AND r.field = 'total_score' AND r.score != 0)
+ORDER BY s.date DESC, s.position DESC
+LIMIT ?
+'''
+
+
+def _to_text(date: Optional[datetime]) -> Optional[str]:
+    return date.isoformat(sep=' ') if date else None
+
+
+def _to_datetime(text: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(text) if text else None
+
+
+class CatalogueStore:
+
+    """
+    Catalogue of smartphones in a SQLite database, see the docstring of the
+    module. The connection may be used from several threads, one at a time
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        """
+        :param path: path to the database, cfg.CATALOGUE_DB by default. It's
+        created if it doesn't exist
+        """
+        self.path = path or cfg.CATALOGUE_DB
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path,
+                                           check_same_thread=False)
+        self._connection.execute('PRAGMA foreign_keys = ON')
+        self._connection.execute('PRAGMA journal_mode = WAL')
+        self._connection.execute('PRAGMA synchronous = NORMAL')
+        with self._connection:
+            self._connection.executescript(SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def __enter__(self) -> CatalogueStore:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute(
+                'SELECT COUNT(*) FROM smartphones').fetchone()[0]
+
+    @timed('catalogue_save')
+    def save(self, smartphones: Smartphones) -> None:
+        """
+        Upserts smartphones and their scores in one transaction. Only
+        benchmarks a smartphone has any score in are stored
+
+        :param smartphones: smartphones read from the spreadsheet
+        :return: None
+        """
+        devices = list(smartphones.all_smartphones.values())
+
+        def results() -> Iterator[Tuple[str, str, str, int]]:
+            for s in devices:
+                for attr, spec in BENCHMARKS.items():
+                    bench = getattr(s, attr)
+                    scores = [getattr(bench, field)
+                              for field in spec.score_fields]
+                    if any(scores):
+                        for field, score in zip(spec.score_fields, scores):
+                            yield s.name, attr, field, score
+
+        with self._lock, self._connection:
+            last = self._connection.execute(
+                'SELECT COALESCE(MAX(position), 0) FROM smartphones'
+            ).fetchone()[0]
+            # positions of smartphones already in the catalogue are kept
+            self._connection.executemany(UPSERT_SMARTPHONE, (
+                (s.name, _to_text(s.date), s.chip, s.battery_capacity,
+                 int(s.highlight), int(s.ignore), last + i)
+                for i, s in enumerate(devices, start=1)))
+            self._connection.executemany(UPSERT_RESULT, results())
+
+    @timed('catalogue_load')
+    def load(self) -> Smartphones:
+        """
+        Makes smartphones from the catalogue, they are linked to it so that
+        prepare_data selects the latest smartphones with a query
+
+        :return: smartphones in the order they were added to the catalogue
+        """
+        smartphones = Smartphones()
+        by_id: Dict[int, Smartphone] = {}
+        with self._lock:
+            for (id_, name, date, chip, battery_capacity, highlight,
+                 ignore) in self._connection.execute(
+                    'SELECT id, name, date, chip, battery_capacity, '
+                    'is_highlighted, is_ignored FROM smartphones '
+                    'ORDER BY position'):
+                smartphone = Smartphone(name, date=_to_datetime(date),
+                                        highlight=bool(highlight),
+                                        ignore=bool(ignore))
+                smartphone.chip = chip
+                smartphone.battery_capacity = battery_capacity
+                smartphones.all_smartphones[name] = smartphone
+                by_id[id_] = smartphone
+                if highlight:
+                    smartphones.highlighted_smartphones.append(smartphone)
+
+            for id_, attr, field, score in self._connection.execute(
+                    'SELECT smartphone_id, benchmark, field, score '
+                    'FROM results'):
+                setattr(getattr(by_id[id_], attr), field, score)
+
+        smartphones.catalogue = self
+        return smartphones
+
+    def latest(self, benchmark: str, limit: Optional[int],
+               as_of: Optional[datetime] = None) -> List[str]:
+        """
+        Names of the latest smartphones by date with a score in a benchmark
+        which are not ignored
+
+        :param benchmark: name of a benchmark
+        :param limit: how many smartphones to give, all of them if None
+        :param as_of: give only smartphones dated as of this moment
+        :return: names sorted by date, the latest one goes last
+        """
+        # dates are stored as text, which sorts like the dates
+        until = _to_text(as_of or datetime.max)
+        with self._lock:
+            names = [name for name, in self._connection.execute(
+                SELECT_LATEST,
+                (until, benchmark, -1 if limit is None else limit))]
+        names.reverse()
+        return names
+
+    def history(self, name: str,
+                benchmark: Optional[str] = None) -> List[tuple]:
+        """
+        Changes of scores of a smartphone
+
+        :param name: name of a smartphone
+        :param benchmark: name of a benchmark, all benchmarks if None
+        :return: list of (benchmark, field, old score, new score, time of
+        the change) sorted by time
+        """
+        query = ('SELECT h.benchmark, h.field, h.old_score, h.new_score, '
+                 'h.changed_at FROM history AS h '
+                 'JOIN smartphones AS s ON s.id = h.smartphone_id '
+                 'WHERE s.name = ?')
+        params: tuple = (name,)
+        if benchmark is not None:
+            query += ' AND h.benchmark = ?'
+            params += (benchmark,)
+        with self._lock:
+            return self._connection.execute(
+                query + ' ORDER BY h.rowid', params).fetchall()
@@ -0,0 +1,387 @@
+"""
+Module with a long-running HTTP service that makes charts on demand
+
+Smartphones are read once and kept in memory, they are read again in the
+background every cfg.SERVICE_REFRESH seconds. Rendered charts are kept in a
+size-bounded LRU cache keyed by a version of the data and parameters of a
+chart, and concurrent requests for the same chart wait for one render
+instead of rendering it again
+
+    GET /chart/geek_bench4            PNG image
+    GET /chart/geek_bench4.svg        SVG image
+    GET /chart/geek_bench4.json       plotly figure
+    GET /chart/geek_bench4?width=800&height=800
+    GET /health                       version of the data
+    GET /metrics                      metrics in the Prometheus format
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import Future
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple, TYPE_CHECKING
+from urllib.parse import parse_qs, urlsplit
+
+import app_config as cfg
+from benchmark_registry import UnknownBenchmark, chart_benchmarks
+from incremental import chart_inputs, fingerprint
+from make_chart import (CHART_HEIGHT, CHART_WIDTH, build_figure,
+                        figure_to_bytes, load_plot_settings)
+from metrics import METRICS, incr, span
+from prepare_data import Smartphones
+from renderer import RendererPool
+
+if TYPE_CHECKING:
+    from data_sources import DataSource
+
+CONTENT_TYPES = {'png': 'image/png', 'svg': 'image/svg+xml',
+                 'json': 'application/json'}
+
+# the biggest chart the service agrees to render, in pixels
+MAX_CHART_SIZE = 4096
+
+ChartKey = Tuple[str, str, str, int, int]
+
+
+class ServiceUnavailable(Exception):
+    """
+    Raised when there is no data to make charts from yet
+    """
+
+
+class UnknownFormat(Exception):
+    """
+    Raised when a chart is requested in a format the service doesn't make
+    """
+
+
+class ImageLRU:
+
+    """
+    Thread-safe LRU cache of rendered charts bounded by their total size
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._items: 'OrderedDict[ChartKey, bytes]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: ChartKey) -> Optional[bytes]:
+        with self._lock:
+            content = self._items.get(key)
+            if content is None:
+                self.misses += 1
+                incr('service_cache_misses')
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            incr('service_cache_hits')
+            return content
+
+    def peek(self, key: ChartKey) -> Optional[bytes]:
+        """
+        Gives a cached chart without counting a hit or a miss
+        """
+        with self._lock:
+            return self._items.get(key)
+
+    def put(self, key: ChartKey, content: bytes) -> None:
+        # a chart bigger than the whole cache is not cached at all
+        if len(content) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._items[key] = content
+            self.size += len(content)
+            while self.size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+
+class ChartService:
+
+    """
+    Keeps smartphones in memory and makes charts of them
+    """
+
+    def __init__(self, source: Optional[DataSource] = None,
+                 renderer: Optional[RendererPool] = None,
+                 refresh_interval: Optional[float] = None,
+                 cache_bytes: Optional[int] = None) -> None:
+        """
+        :param source: where to read sheets from, the google spreadsheet
+        by default
+        :param renderer: anything with RendererPool.to_image, a new pool of
+        Orca servers by default
+        :param refresh_interval: seconds between reading sheets again,
+        cfg.SERVICE_REFRESH by default, 0 to never read them again
+        :param cache_bytes: size of the cache of rendered charts,
+        cfg.SERVICE_CACHE_BYTES by default
+        """
+        self.source = source
+        self.renderer = renderer or RendererPool()
+        self.refresh_interval = (cfg.SERVICE_REFRESH
+                                 if refresh_interval is None
+                                 else refresh_interval)
+        self.images = ImageLRU(cache_bytes or cfg.SERVICE_CACHE_BYTES)
+        self.renders = 0
+
+        self.smartphones: Optional[Smartphones] = None
+        self.version: Optional[str] = None
+
+        self._lock = threading.Lock()
+        self._in_flight: Dict[ChartKey, Future] = {}
+        self._stop = threading.Event()
+        self._refresher: Optional[threading.Thread] = None
+
+    def reload(self) -> bool:
+        """
+        Reads sheets again and replaces smartphones in memory with new ones
+
+        Requests being served keep using the old smartphones, the next
+        requests use the new ones. The version of the data only changes if
+        any chart would change, so cached charts survive a reload that
+        found nothing new
+
+        :return: true if the data changed
+        """
+        smartphones = Smartphones()
+        smartphones.read_from_excel_book(source=self.source)
+        smartphones.build_date_index()
+
+        hasher = hashlib.sha256()
+        plot_settings = load_plot_settings()
+        for bench in chart_benchmarks():
+            inputs = chart_inputs(smartphones, bench, plot_settings)
+            hasher.update(fingerprint(inputs).encode('ascii'))
+        version = hasher.hexdigest()[:16]
+
+        with self._lock:
+            changed = version != self.version
+            self.smartphones, self.version = smartphones, version
+        if changed:
+            print(f'Data version is {version} now')
+        return changed
+
+    def _refresh_loop(self) -> None:
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.reload()
+            except Exception as e:
+                # keep serving the data we already have
+                print(f'Failed to read sheets again, keep the old data: '
+                      f'{e!r}')
+
+    def start(self) -> None:
+        """
+        Reads sheets for the first time and starts refreshing them in the
+        background
+        """
+        if self.smartphones is None:
+            self.reload()
+        if self.refresh_interval and self._refresher is None:
+            self._refresher = threading.Thread(target=self._refresh_loop,
+                                               name='chart-service-refresh',
+                                               daemon=True)
+            self._refresher.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._refresher is not None:
+            self._refresher.join()
+            self._refresher = None
+        self.renderer.shutdown()
+
+    def _render(self, smartphones: Smartphones, bench: str, fmt: str,
+                width: int, height: int) -> bytes:
+        with self._lock:
+            self.renders += 1
+        fig = build_figure(bench, smartphones.prepare_data(bench))
+        incr('renders')
+        with span('render'):
+            if fmt == 'json':
+                return figure_to_bytes(fig, fmt)
+            return self.renderer.to_image(fig, format=fmt, width=width,
+                                          height=height)
+
+    def get_chart(self, bench: str, fmt: str = 'png',
+                  width: int = CHART_WIDTH,
+                  height: int = CHART_HEIGHT) -> bytes:
+        """
+        Gives a chart of a benchmark, from the cache if possible
+
+        :param bench: name of a benchmark
+        :param fmt: one of CONTENT_TYPES
+        :param width: width of an image in pixels
+        :param height: height of an image in pixels
+        :return: content of the chart
+        :raises UnknownBenchmark: if there is no chart of the benchmark
+        :raises UnknownFormat: if fmt isn't one of CONTENT_TYPES
+        :raises ServiceUnavailable: if sheets haven't been read yet
+        """
+        if bench not in chart_benchmarks():
+            raise UnknownBenchmark(bench)
+        if fmt not in CONTENT_TYPES:
+            raise UnknownFormat(f'Unknown format {fmt!r}, formats are: '
+                                f'{", ".join(CONTENT_TYPES)}')
+
+        with self._lock:
+            smartphones, version = self.smartphones, self.version
+        if smartphones is None:
+            raise ServiceUnavailable('Sheets have not been read yet')
+
+        key = (version, bench, fmt, width, height)
+        content = self.images.get(key)
+        if content is not None:
+            return content
+
+        # the first request renders the chart, the others wait for it. The
+        # cache is checked again, the chart may have been rendered and its
+        # render may have left _in_flight since the lookup above
+        with self._lock:
+            content = self.images.peek(key)
+            future = self._in_flight.get(key)
+            owner = content is None and future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+        if content is not None:
+            return content
+        if not owner:
+            return future.result()
+
+        try:
+            content = self._render(smartphones, bench, fmt, width, height)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            self.images.put(key, content)
+            future.set_result(content)
+            return content
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+
+class ChartRequestHandler(BaseHTTPRequestHandler):
+
+    """
+    Handler of requests to the service, see the docstring of the module
+    """
+
+    server: ChartHTTPServer
+
+    def _send(self, status: HTTPStatus, content: bytes,
+              content_type: str = 'text/plain; charset=utf-8') -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _error(self, status: HTTPStatus, message: str) -> None:
+        self._send(status, f'{message}\n'.encode('utf8'))
+
+    def do_GET(self) -> None:
+        service = self.server.service
+        url = urlsplit(self.path)
+
+        if url.path == '/health':
+            body = {'version': service.version,
+                    'cached_charts': len(service.images),
+                    'cache_hits': service.images.hits,
+                    'cache_misses': service.images.misses,
+                    'renders': service.renders}
+            self._send(HTTPStatus.OK, json.dumps(body).encode('utf8'),
+                       CONTENT_TYPES['json'])
+            return
+
+        if url.path == '/metrics':
+            self._send(HTTPStatus.OK, METRICS.to_prometheus().encode('utf8'),
+                       'text/plain; version=0.0.4; charset=utf-8')
+            return
+
+        if not url.path.startswith('/chart/'):
+            self._error(HTTPStatus.NOT_FOUND, 'Not found')
+            return
+
+        bench, _, fmt = url.path[len('/chart/'):].partition('.')
+        query = parse_qs(url.query)
+        fmt = fmt or query.get('format', ['png'])[0]
+        try:
+            width = int(query.get('width', [CHART_WIDTH])[0])
+            height = int(query.get('height', [CHART_HEIGHT])[0])
+        except ValueError:
+            self._error(HTTPStatus.BAD_REQUEST, 'Width and height must be '
+                                                'integers')
+            return
+        if not (0 < width <= MAX_CHART_SIZE and 0 < height <= MAX_CHART_SIZE):
+            self._error(HTTPStatus.BAD_REQUEST,
+                        f'Width and height must be between 1 and '
+                        f'{MAX_CHART_SIZE}')
+            return
+
+        try:
+            content = service.get_chart(bench, fmt, width, height)
+        except UnknownBenchmark:
+            self._error(HTTPStatus.NOT_FOUND, f'Unknown benchmark {bench!r}')
+        except UnknownFormat as e:
+            self._error(HTTPStatus.BAD_REQUEST, str(e))
+        except ServiceUnavailable as e:
+            self._error(HTTPStatus.SERVICE_UNAVAILABLE, str(e))
+        except Exception as e:
+            # anything else is a bug, so it's logged with the traceback
+            self.log_error('Failed to make a chart of %s:\n%s', bench,
+                           traceback.format_exc())
+            self._error(HTTPStatus.INTERNAL_SERVER_ERROR,
+                        f'Failed to make the chart: {e!r}')
+        else:
+            self._send(HTTPStatus.OK, content, CONTENT_TYPES[fmt])
+
+
+class ChartHTTPServer(ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int],
+                 service: ChartService) -> None:
+        super().__init__(address, ChartRequestHandler)
+        self.service = service
+
+
+def serve(host: Optional[str] = None, port: Optional[int] = None,
+          source: Optional[DataSource] = None) -> None:
+    """
+    Runs the service until it is interrupted
+
+    :param host: host to listen on, cfg.SERVICE_HOST by default
+    :param port: port to listen on, cfg.SERVICE_PORT by default
+    :param source: where to read sheets from, the google spreadsheet
+    by default
+    :return: None
+    """
+    service = ChartService(source=source)
+    service.start()
+    address = (host or cfg.SERVICE_HOST, port or cfg.SERVICE_PORT)
+    with ChartHTTPServer(address, service) as server:
+        print(f'Serving charts on http://{address[0]}:{address[1]}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            service.stop()
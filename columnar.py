@@ -0,0 +1,173 @@
+"""
+Module with a columnar store of smartphones: every attribute of all
+smartphones is kept in one NumPy array, so data for plots is prepared with
+vectorized operations instead of loops over Smartphone objects
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+import app_config as cfg
+from benchmark_registry import BENCHMARKS, Benchmark, get_spec
+from metrics import timed
+from prepare_data import DataForPlots, Smartphones
+
+
+class ColumnarSmartphones:
+
+    """
+    Read-only columnar copy of Smartphones
+
+    Smartphones keep the order they have in Smartphones.all_smartphones,
+    because that order decides how smartphones with the same date or the
+    same score are sorted
+    """
+
+    def __init__(self, smartphones: Smartphones) -> None:
+        devices = list(smartphones.all_smartphones.values())
+        index = {id(s): i for i, s in enumerate(devices)}
+
+        self.names = np.array([s.name for s in devices], dtype=object)
+        # characteristics shown next to names, chips and battery capacities
+        self.labels: Dict[str, np.ndarray] = {
+            attr: np.array([getattr(s, attr) for s in devices], dtype=object)
+            for attr in {spec.label_attr for spec in BENCHMARKS.values()}}
+        self.dates = np.array([s.date for s in devices],
+                              dtype='datetime64[us]')
+        self.highlight = np.array([s.highlight for s in devices], dtype=bool)
+        self.ignore = np.array([s.ignore for s in devices], dtype=bool)
+
+        # highlighted smartphones in the order they were highlighted, the
+        # same smartphone may be there more than once
+        self.highlighted = np.array(
+            [index[id(s)] for s in smartphones.highlighted_smartphones],
+            dtype=np.intp)
+
+        self.scores: Dict[str, Dict[str, np.ndarray]] = {}
+        for bench, spec in BENCHMARKS.items():
+            fields = spec.score_fields
+            benchmarks = [getattr(s, bench) for s in devices]
+            self.scores[bench] = {
+                field: np.array([getattr(b, field) for b in benchmarks],
+                                dtype=np.int64)
+                for field in fields}
+
+    @classmethod
+    def from_smartphones(cls, smartphones: Smartphones) \
+            -> ColumnarSmartphones:
+        return cls(smartphones)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _results(self, bench: str, selected: np.ndarray) -> List[Benchmark]:
+        """
+        Makes results of selected smartphones in a benchmark, they aren't
+        linked to smartphones
+        """
+        spec = get_spec(bench)
+        columns = [self.scores[bench][column][selected].tolist()
+                   for column in spec.columns]
+        return [spec.bench_class(None, *scores) for scores in zip(*columns)]
+
+    def _evaluate_percentage_difference(self, bench: str,
+                                        selected: np.ndarray) -> List[str]:
+        """
+        Evaluates how much every selected smartphone is better or worse than
+        the reference one - the best of highlighted smartphones or the best
+        of selected smartphones if none is highlighted
+
+        :param bench: name of a benchmark
+        :param selected: indexes of smartphones sorted by total score
+        :return: percentage difference of every selected smartphone
+        """
+        total = self.scores[bench]['total_score']
+        if len(self.highlighted):
+            ref_score = total[self.highlighted].max()
+        else:
+            ref_score = total[selected[-1]]
+
+        if ref_score == 0:
+            raise ZeroDivisionError('division by zero')
+
+        scores = total[selected]
+        differences = (scores * 100 / ref_score).astype(np.int64)
+
+        percentages = []
+        for score, difference in zip(scores.tolist(), differences.tolist()):
+            if score < ref_score:
+                percentages.append(f'-{100 - difference}')
+            elif score > ref_score:
+                percentages.append(f'+{difference - 100}')
+            else:
+                percentages.append(str(difference))
+        return percentages
+
+    @timed('prepare_data')
+    def prepare_data(self, benchmark: str, window: Optional[int] = None,
+                     rank_key: Optional[Callable[[Benchmark], Any]] = None) \
+            -> DataForPlots:
+        """
+        Prepares data for a plot of a benchmark, the same way
+        Smartphones.prepare_data does
+
+        :param benchmark: name of a benchmark
+        :param window: how many of the latest smartphones to show,
+        cfg.PLOT_WINDOW by default
+        :param rank_key: function that takes results of a smartphone in the
+        benchmark and returns a key to rank smartphones by, the total score
+        by default. Results given to it aren't linked to a smartphone
+        :return: axes of a plot
+        """
+        window = cfg.PLOT_WINDOW if window is None else window
+        total = self.scores[benchmark]['total_score']
+
+        # smartphones with date and values of a benchmark of interest
+        eligible = np.flatnonzero(~np.isnat(self.dates) & (total != 0)
+                                  & ~self.ignore)
+
+        # the latest smartphones by date, sorted by the total score or by
+        # rank_key. Sorts are stable to keep ties in the same order as
+        # Python's sort
+        selected = eligible[np.argsort(self.dates[eligible], kind='stable')]
+        selected = selected[max(len(selected) - window, 0):]
+        if rank_key is None:
+            selected = selected[np.argsort(total[selected], kind='stable')]
+        else:
+            # only the window is ranked, so results are made for it alone
+            keys = [rank_key(results)
+                    for results in self._results(benchmark, selected)]
+            selected = selected[sorted(range(len(selected)),
+                                       key=keys.__getitem__)]
+
+        # no smartphone has a score, so there is no reference either
+        percentages = (self._evaluate_percentage_difference(benchmark,
+                                                            selected)
+                       if len(selected) else [])
+
+        data_for_plots = DataForPlots()
+        highlighted = self.highlight[selected]
+        data_for_plots.highlighted_smartphones = \
+            np.flatnonzero(highlighted).tolist()
+
+        spec = get_spec(benchmark)
+        attrs = self.labels[spec.label_attr][selected]
+        names = self.names[selected]
+        count = len(selected)
+        for indx, (name, attr, percentage, bold) in enumerate(
+                zip(names, attrs, percentages, highlighted.tolist())):
+            strng = f'{count - indx}. {name} ({attr})'
+            if percentage != '100':
+                strng += f' ({percentage}%)'
+            if bold:
+                strng = f'<b>{strng}</b>'
+            data_for_plots.y_axis_names.append(strng)
+
+        scores = self.scores[benchmark]
+        data_for_plots.x_axes = [scores[axis][selected].tolist()
+                                 for axis in spec.axes]
+
+        return data_for_plots
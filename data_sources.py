@@ -0,0 +1,192 @@
+"""
+Module with sources of tables with results of benchmarks: the google
+spreadsheet, a local Excel workbook or local CSV files
+
+Every source gives rows of a sheet in pages, the same rows Google Sheets
+API would return: cells are strings or numbers, blank cells at the end of
+a row are dropped and the heading rows of a table are skipped
+"""
+
+from __future__ import annotations
+
+import csv
+import mmap
+import os
+from typing import (Dict, Iterable, Iterator, List, Optional, Tuple,
+                    TYPE_CHECKING)
+
+from gspread_downloader import (HEADER_ROWS, SheetsClient, download_sheets,
+                                get_client, prefetch)
+
+if TYPE_CHECKING:
+    from prepare_data import TableReadingSettings
+    from sheet_cache import SheetCache
+
+Page = List[list]
+
+DEFAULT_PAGE_SIZE = 1000
+
+
+def _paginate(rows: Iterable[list], page_size: int) -> Iterator[Page]:
+    page = []
+    for row in rows:
+        page.append(row)
+        if len(page) == page_size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+def _normalize(cells: Iterable) -> list:
+    """
+    Makes a row look like a row from Google Sheets API: an empty cell is an
+    empty string and there are no empty cells at the end of the row
+    """
+    row = ['' if cell is None else cell for cell in cells]
+    while row and row[-1] == '':
+        row.pop()
+    return row
+
+
+class DataSource:
+
+    """
+    Parent class for any source of tables with results of benchmarks
+    """
+
+    def iter_pages(self, trs: TableReadingSettings) -> Iterator[Page]:
+        """
+        Gives rows of one sheet page by page
+
+        :param trs: settings of reading the sheet
+        :return: iterator over pages, lists of rows
+        """
+        raise NotImplementedError
+
+    def read(self, settings: List[TableReadingSettings]) \
+            -> Iterator[Tuple[TableReadingSettings, Iterable[Page]]]:
+        """
+        Gives rows of several sheets, sheet after sheet in the given order
+
+        :param settings: settings of reading every sheet
+        :return: iterator over pairs of settings and pages of a sheet
+        """
+        for trs in settings:
+            yield trs, self.iter_pages(trs)
+
+
+class GoogleSheetsSource(DataSource):
+
+    """
+    The google spreadsheet, see read_from_excel_book for the meaning of the
+    parameters
+    """
+
+    def __init__(self, client: Optional[SheetsClient] = None,
+                 cache: Optional[SheetCache] = None, offline: bool = False,
+                 max_workers: Optional[int] = None,
+                 page_size: Optional[int] = None) -> None:
+        self.client = client
+        self.cache = cache
+        self.offline = offline
+        self.max_workers = max_workers
+        self.page_size = page_size
+
+    def iter_pages(self, trs: TableReadingSettings) -> Iterator[Page]:
+        client = self.client or get_client()
+        if self.page_size and not self.offline:
+            return prefetch(client.iter_sheet_pages(trs.sheet_name,
+                                                    self.page_size))
+        sheets = download_sheets([trs.sheet_name], client=client,
+                                 cache=self.cache, offline=self.offline)
+        return iter([sheets[trs.sheet_name]])
+
+    def read(self, settings: List[TableReadingSettings]) \
+            -> Iterator[Tuple[TableReadingSettings, Iterable[Page]]]:
+        if self.page_size and not self.offline:
+            yield from super().read(settings)
+            return
+
+        # all sheets are downloaded at once, it's one request instead of
+        # one request per sheet
+        sheets = download_sheets([trs.sheet_name for trs in settings],
+                                 client=self.client, cache=self.cache,
+                                 offline=self.offline,
+                                 max_workers=self.max_workers)
+        for trs in settings:
+            yield trs, [sheets[trs.sheet_name]]
+
+
+class XlsxSource(DataSource):
+
+    """
+    Local Excel workbook exported from the spreadsheet, with a worksheet
+    per benchmark named as the sheet in the spreadsheet
+
+    The workbook is opened in read-only mode, so rows are streamed from the
+    file instead of loading the whole workbook into memory
+    """
+
+    def __init__(self, path: str,
+                 page_size: int = DEFAULT_PAGE_SIZE) -> None:
+        self.path = path
+        self.page_size = page_size
+
+    def iter_pages(self, trs: TableReadingSettings) -> Iterator[Page]:
+        from openpyxl import load_workbook
+
+        wb = load_workbook(self.path, read_only=True, data_only=True)
+        try:
+            ws = wb[trs.sheet_name]
+            rows = (_normalize(cells) for cells in
+                    ws.iter_rows(min_row=HEADER_ROWS + 1, values_only=True))
+            yield from _paginate(rows, self.page_size)
+        finally:
+            wb.close()
+
+
+class CsvSource(DataSource):
+
+    """
+    Local CSV files exported from the spreadsheet, a file per benchmark in
+    one directory named as the sheet in the spreadsheet, e.g.
+    'GeekBench 4.csv'
+
+    Files are memory-mapped and decoded line by line, so a file is never
+    read into memory as a whole
+    """
+
+    def __init__(self, directory: str, page_size: int = DEFAULT_PAGE_SIZE,
+                 encoding: str = 'utf-8-sig',
+                 file_names: Optional[Dict[str, str]] = None) -> None:
+        """
+        :param directory: directory with CSV files
+        :param page_size: number of rows in a page
+        :param encoding: encoding of the files
+        :param file_names: names of files of particular sheets if they
+        differ from '{sheet name}.csv'
+        """
+        self.directory = directory
+        self.page_size = page_size
+        self.encoding = encoding
+        self.file_names = file_names or {}
+
+    def path(self, sheet_name: str) -> str:
+        file_name = self.file_names.get(sheet_name, f'{sheet_name}.csv')
+        return os.path.join(self.directory, file_name)
+
+    def iter_pages(self, trs: TableReadingSettings) -> Iterator[Page]:
+        with open(self.path(trs.sheet_name), 'rb') as infile:
+            # an empty file can't be mapped, and there are no rows anyway
+            if os.fstat(infile.fileno()).st_size == 0:
+                return
+            with mmap.mmap(infile.fileno(), 0,
+                           access=mmap.ACCESS_READ) as mapped:
+                lines = (line.decode(self.encoding)
+                         for line in iter(mapped.readline, b''))
+                reader = csv.reader(lines)
+                for _ in range(HEADER_ROWS):
+                    next(reader, None)
+                rows = (_normalize(cells) for cells in reader)
+                yield from _paginate(rows, self.page_size)
@@ -0,0 +1,172 @@
+"""
+Module that exports smartphones and their results in benchmarks to an Excel
+workbook, a CSV file or a Parquet file
+
+Every format is written from the same schema, a list of columns, so the
+heading and the values of a row are always in the same order. Rows are
+made one by one and written straight away, so the memory used doesn't grow
+with the number of smartphones
+"""
+
+from __future__ import annotations
+
+import csv
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import islice
+from operator import attrgetter
+from typing import (Any, Callable, Iterable, Iterator, List, Optional,
+                    TYPE_CHECKING)
+
+from benchmark_registry import BENCHMARKS, get_spec
+
+if TYPE_CHECKING:
+    from prepare_data import Smartphone, Smartphones
+
+FORMATS = ('xlsx', 'csv', 'parquet')
+
+# rows in a row group of a Parquet file
+PARQUET_BATCH_SIZE = 65536
+
+
+@dataclass(frozen=True)
+class Column:
+    """
+    One column of an export: its heading, how to get a value from a
+    smartphone and a type of values - 'date', 'str' or 'int'
+    """
+    heading: str
+    get: Callable[[Smartphone], Any]
+    kind: str
+
+
+def make_schema(benches: Optional[List[str]] = None) -> List[Column]:
+    """
+    Makes columns of an export: info about a smartphone and then scores in
+    every subtest of every benchmark
+
+    :param benches: names of benchmarks, all declared benchmarks by
+    default
+    :return: list of columns
+    """
+    columns = [Column('Date', attrgetter('date'), 'date'),
+               Column('Smartphone', attrgetter('name'), 'str'),
+               Column('Chip', attrgetter('chip'), 'str'),
+               Column('Battery', attrgetter('battery_capacity'), 'str')]
+
+    for bench_name in benches or BENCHMARKS:
+        bench = get_spec(bench_name).bench_class
+        for subtest, score_field in zip(bench.subtests, bench.score_fields):
+            columns.append(Column(f'{bench.name}: {subtest}',
+                                  attrgetter(f'{bench_name}.{score_field}'),
+                                  'int'))
+    return columns
+
+
+def iter_rows(smartphones: Smartphones,
+              schema: List[Column]) -> Iterator[list]:
+    """
+    Gives a row of values for every smartphone, in the order of the schema
+    """
+    getters = [column.get for column in schema]
+    for s in smartphones.all_smartphones.values():
+        yield [get(s) for get in getters]
+
+
+def _batches(rows: Iterable[list], size: int) -> Iterator[List[list]]:
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def write_xlsx(smartphones: Smartphones, path: str,
+               schema: Optional[List[Column]] = None) -> None:
+    """
+    Writes smartphones to an Excel workbook with one sheet
+
+    The workbook is write-only, so rows are streamed to the file instead of
+    keeping all the cells in memory
+    """
+    from openpyxl import Workbook
+
+    schema = schema or make_schema()
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('smartphones')
+    ws.append([column.heading for column in schema])
+    for row in iter_rows(smartphones, schema):
+        ws.append(row)
+    wb.save(path)
+
+
+def write_csv(smartphones: Smartphones, path: str,
+              schema: Optional[List[Column]] = None) -> None:
+    """
+    Writes smartphones to a CSV file, dates are written in ISO format
+    """
+    schema = schema or make_schema()
+    with open(path, 'w', encoding='utf8', newline='') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow([column.heading for column in schema])
+        for row in iter_rows(smartphones, schema):
+            writer.writerow(['' if value is None
+                             else value.isoformat()
+                             if isinstance(value, datetime) else value
+                             for value in row])
+
+
+def write_parquet(smartphones: Smartphones, path: str,
+                  schema: Optional[List[Column]] = None,
+                  batch_size: int = PARQUET_BATCH_SIZE) -> None:
+    """
+    Writes smartphones to a Parquet file, a row group per batch of rows
+
+    Needs pyarrow, which is not a requirement of the app
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError('pyarrow is needed to export to Parquet, '
+                           'install it with "pip install pyarrow"') from e
+
+    schema = schema or make_schema()
+    types = {'date': pa.timestamp('us'), 'str': pa.string(),
+             'int': pa.int64()}
+    arrow_schema = pa.schema([(column.heading, types[column.kind])
+                              for column in schema])
+
+    with pq.ParquetWriter(path, arrow_schema) as writer:
+        for batch in _batches(iter_rows(smartphones, schema), batch_size):
+            arrays = [pa.array([row[i] for row in batch], type=field.type)
+                      for i, field in enumerate(arrow_schema)]
+            writer.write_table(pa.Table.from_arrays(arrays,
+                                                    schema=arrow_schema))
+
+
+WRITERS = {'xlsx': write_xlsx, 'csv': write_csv, 'parquet': write_parquet}
+
+
+def export(smartphones: Smartphones, path: str,
+           fmt: Optional[str] = None,
+           benches: Optional[List[str]] = None) -> None:
+    """
+    Exports smartphones to a file
+
+    :param smartphones: smartphones with results of benchmarks
+    :param path: path to the file
+    :param fmt: one of FORMATS, taken from the extension of the file by
+    default
+    :param benches: names of benchmarks to export, all declared benchmarks
+    by default
+    :return: None
+    """
+    fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower()
+    if fmt not in WRITERS:
+        raise ValueError(f'Unknown export format {fmt!r}, '
+                         f'expected one of {", ".join(FORMATS)}')
+    WRITERS[fmt](smartphones, path, make_schema(benches))
+    print(f'Wrote down data to {path}')
@@ -0,0 +1,292 @@
+"""
+Module that splits complete rankings of smartphones into pages, so charts
+show every smartphone with a score in a benchmark and not only the latest
+cfg.PLOT_WINDOW ones that fit into one chart
+
+Smartphones are ranked once per benchmark: they are sorted, percentages
+are evaluated against one reference smartphone and the length of the x
+axis is found in that single pass. The ranking is then split into facets
+keeping its order - by the vendor of a chip, by a bucket of battery
+capacity or not at all - and every facet is cut into pages of page_size
+smartphones. So a smartphone has the same rank, percentage and colors on
+every page, and all pages of a benchmark share the scale
+
+Pages of all benchmarks are rendered in parallel, see
+render_scheduler.render_pages, to images/<facet>/<benchmark>/001.png and
+so on. Pages beyond the ones made and directories of benchmarks that
+weren't charted are removed. images/<facet>/index.json lists pages:
+
+    {"facet": "vendor", "format": "png", "page_size": 30,
+     "benchmarks": [{"benchmark": "geek_bench4", "title": "...",
+                     "smartphones": 1234, "reference": "...",
+                     "pages": [{"path": "geek_bench4/001.png",
+                                "facet": "Qualcomm", "page": 1, "pages": 3,
+                                "first_rank": 1, "last_rank": 412,
+                                "smartphones": 30, "ok": true}, ...]}]}
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import re
+import shutil
+from dataclasses import dataclass
+from itertools import islice
+from typing import (Callable, Dict, Iterable, List, Optional, Tuple,
+                    TYPE_CHECKING)
+
+import app_config as cfg
+from benchmark_registry import chart_benchmarks, plan
+from make_chart import (IMAGES_DIR, X_MARGIN, chart_extension,
+                        chart_settings, load_plot_settings)
+from metrics import span
+from render_cache import write_if_changed
+
+if TYPE_CHECKING:
+    from prepare_data import DataForPlots, Smartphone, Smartphones
+    from render_cache import RenderCache
+
+MANIFEST = 'index.json'
+
+UNKNOWN = 'нет данных'
+
+# vendors of chips by the beginnings of names of chips
+CHIP_VENDORS = (
+    (re.compile(r'snapdragon|qualcomm|msm|sdm', re.I), 'Qualcomm'),
+    (re.compile(r'helio|dimensity|mediatek|mt\d', re.I), 'MediaTek'),
+    (re.compile(r'kirin|hisilicon', re.I), 'HiSilicon'),
+    (re.compile(r'exynos', re.I), 'Samsung'),
+    (re.compile(r'a\d+\b|apple', re.I), 'Apple'),
+    (re.compile(r'tensor', re.I), 'Google'),
+    (re.compile(r'unisoc|spreadtrum|tiger', re.I), 'Unisoc'),
+)
+
+CAPACITY = re.compile(r'\d+')
+
+
+def chip_vendor(smartphone: Smartphone) -> str:
+    """
+    Gives the vendor of the chip of a smartphone, the first word of the
+    name of the chip if the vendor isn't known
+    """
+    chip = (smartphone.chip or '').strip()
+    if not chip:
+        return UNKNOWN
+    for pattern, vendor in CHIP_VENDORS:
+        if pattern.match(chip):
+            return vendor
+    return chip.split()[0]
+
+
+def capacity_bucket(smartphone: Smartphone) -> str:
+    """
+    Gives the bucket of battery capacity of a smartphone, buckets are
+    cfg.FACET_CAPACITY_STEP mAh wide
+    """
+    found = CAPACITY.search(smartphone.battery_capacity or '')
+    if found is None:
+        return UNKNOWN
+    step = cfg.FACET_CAPACITY_STEP
+    low = int(found.group()) // step * step
+    return f'{low}–{low + step - 1} мАч'
+
+
+# ways to split a ranking, a function gives the facet of a smartphone and
+# None keeps the whole ranking in one facet
+FACETS: Dict[str, Optional[Callable[[Smartphone], str]]] = {
+    'page': None,
+    'vendor': chip_vendor,
+    'capacity': capacity_bucket,
+}
+
+
+@dataclass
+class Page:
+    """
+    One chart of a ranking: smartphones from the best to the worst and
+    their ranks
+    """
+    bench: str
+    name: str
+    facet: Optional[str]
+    number: int
+    pages: int
+    smartphones: List[Smartphone]
+    ranks: List[int]
+
+    def to_data_for_plots(self, x_max: int) -> DataForPlots:
+        """
+        Makes axes of the chart of the page, the best smartphone is on top
+        """
+        from prepare_data import Smartphones
+
+        data_for_plots = Smartphones.make_plot_data(
+            self.bench, self.smartphones[::-1], self.ranks[::-1])
+        subtitle = f'страница {self.number} из {self.pages}'
+        if self.facet is not None:
+            subtitle = f'{self.facet}, {subtitle}'
+        data_for_plots.subtitle = subtitle
+        data_for_plots.x_max = x_max
+        return data_for_plots
+
+
+@dataclass
+class Ranking:
+    """
+    Pages of a ranking of a benchmark
+    """
+    bench: str
+    smartphones: int
+    reference: Optional[str]
+    x_max: int
+    pages: List[Page]
+
+
+def _chunks(items: Iterable, size: int) -> Iterable[list]:
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def paginate(smartphones: Smartphones, bench: str, facet_by: str = 'page',
+             page_size: Optional[int] = None) -> Ranking:
+    """
+    Ranks all smartphones in a benchmark and splits the ranking into pages
+
+    :param smartphones: smartphones with results of benchmarks
+    :param bench: name of a benchmark
+    :param facet_by: one of FACETS
+    :param page_size: smartphones on a page, cfg.FACET_PAGE_SIZE by default
+    :return: the ranking split into pages
+    """
+    page_size = page_size or cfg.FACET_PAGE_SIZE
+    facet_of = FACETS[facet_by]
+    bench_plan = plan(bench)
+
+    with span('rank'):
+        ranked = smartphones.rank(bench)
+        ranked.reverse()
+
+        longest = 0
+        reference = None
+        facets: Dict[Optional[str], List[Tuple[int, Smartphone]]] = {}
+        for rank, s in enumerate(ranked, start=1):
+            longest = max(longest, sum(axis(s) for axis in bench_plan.axes))
+            if reference is None and bench_plan.percentage(s) == '100':
+                reference = s.name
+            facet = facet_of(s) if facet_of is not None else None
+            facets.setdefault(facet, []).append((rank, s))
+
+    # facets go in the order of their best smartphones
+    pages: List[Page] = []
+    for facet, members in facets.items():
+        chunks = list(_chunks(members, page_size))
+        for number, chunk in enumerate(chunks, start=1):
+            pages.append(Page(bench, f'{len(pages) + 1:03d}', facet, number,
+                              len(chunks), [s for _, s in chunk],
+                              [rank for rank, _ in chunk]))
+
+    return Ranking(bench, len(ranked), reference,
+                   math.ceil(longest * X_MARGIN), pages)
+
+
+def _remove_stale(directory: str, rankings: List[Ranking],
+                  fmt: str) -> None:
+    """
+    Removes pages of a previous run which are beyond the pages this run
+    planned, and directories of benchmarks this run didn't chart. A page
+    that failed to render keeps its previous image
+    """
+    if not os.path.isdir(directory):
+        return
+    extension = f'.{chart_extension(fmt)}'
+    planned = {ranking.bench: {page.name + extension
+                               for page in ranking.pages}
+               for ranking in rankings}
+    for bench in os.listdir(directory):
+        bench_dir = os.path.join(directory, bench)
+        if not os.path.isdir(bench_dir):
+            continue
+        if bench not in planned:
+            shutil.rmtree(bench_dir)
+            continue
+        for file_name in os.listdir(bench_dir):
+            stem = file_name[:-len(extension)]
+            if (file_name.endswith(extension) and stem.isdigit()
+                    and file_name not in planned[bench]):
+                os.remove(os.path.join(bench_dir, file_name))
+
+
+def render_facets(smartphones: Smartphones, facet_by: str = 'page',
+                  benches: Optional[Iterable[str]] = None,
+                  page_size: Optional[int] = None,
+                  max_workers: Optional[int] = None,
+                  cache: Optional[RenderCache] = None,
+                  fmt: str = 'png') -> Tuple[dict, bool]:
+    """
+    Makes pages of rankings of several benchmarks and their manifest
+
+    :param smartphones: smartphones with results of benchmarks
+    :param facet_by: one of FACETS
+    :param benches: names of benchmarks, chart_benchmarks() by default
+    :param page_size: smartphones on a page, cfg.FACET_PAGE_SIZE by default
+    :param max_workers: number of processes, see render_charts
+    :param cache: cache of rendered images, see render_charts
+    :param fmt: format of pages, see make_chart.FORMATS
+    :return: the manifest and whether all pages were made
+    """
+    from render_scheduler import render_pages
+
+    page_size = page_size or cfg.FACET_PAGE_SIZE
+    benches = list(chart_benchmarks() if benches is None else benches)
+    rankings = [paginate(smartphones, bench, facet_by, page_size)
+                for bench in benches]
+
+    # pages of all benchmarks are rendered by one pool of processes
+    jobs: Dict[str, Tuple[str, DataForPlots]] = {}
+    for ranking in rankings:
+        for page in ranking.pages:
+            name = f'{facet_by}/{ranking.bench}/{page.name}'
+            jobs[name] = (ranking.bench,
+                          page.to_data_for_plots(ranking.x_max))
+    results = dict(zip(jobs, render_pages(jobs, max_workers, cache, fmt)))
+
+    directory = os.path.join(IMAGES_DIR, facet_by)
+    plot_settings = load_plot_settings()
+    manifest = {'facet': facet_by, 'format': fmt, 'page_size': page_size,
+                'benchmarks': []}
+    _remove_stale(directory, rankings, fmt)
+    for ranking in rankings:
+        entries = []
+        for page in ranking.pages:
+            result = results[f'{facet_by}/{ranking.bench}/{page.name}']
+            entries.append({
+                'path': (os.path.relpath(result.path, directory)
+                         .replace(os.sep, '/') if result.ok else None),
+                'facet': page.facet,
+                'page': page.number,
+                'pages': page.pages,
+                'first_rank': page.ranks[0],
+                'last_rank': page.ranks[-1],
+                'smartphones': len(page.smartphones),
+                'ok': result.ok,
+            })
+        manifest['benchmarks'].append({
+            'benchmark': ranking.bench,
+            'title': chart_settings(ranking.bench, plot_settings)['title'],
+            'smartphones': ranking.smartphones,
+            'reference': ranking.reference,
+            'pages': entries,
+        })
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, MANIFEST)
+    write_if_changed(path, json.dumps(manifest, ensure_ascii=False,
+                                      indent=4).encode('utf8'))
+    print(f'Manifest of pages was written to {path}')
+    return manifest, all(result.ok for result in results.values())
@@ -1,15 +1,502 @@
 """
 Module that connects to a particular google spreadsheet with results of
-smartphones benchmarks return one sheet from a table
-"""
-from typing import List
+smartphones benchmarks and returns sheets from that table
+
+The google client libraries take a while to import, so they are imported
+only when the first request is made
 
-# It works irregardless pycharm's whining
-from apiclient.discovery import build
-from httplib2 import Http
-from oauth2client.service_account import ServiceAccountCredentials
+Every request goes through a RequestScheduler, which keeps the app under the
+quota of Sheets API, retries requests that were throttled or failed on the
+side of Google, and sends identical requests made at the same time only once
+"""
+import json
+import queue
+import random
+import socket
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import (Callable, Dict, Hashable, Iterable, Iterator, List,
+                    Optional, TYPE_CHECKING)
 
 import app_config as cfg
+from metrics import METRICS, incr, span
+from sheet_cache import CacheMissError
+
+if TYPE_CHECKING:
+    from oauth2client.service_account import ServiceAccountCredentials
+    from sheet_cache import SheetCache
+
+SCOPES = ['https://spreadsheets.google.com/feeds',
+          'https://www.googleapis.com/auth/drive']
+
+# the first rows of every sheet are headings of a table
+HEADER_ROWS = 2
+
+# statuses of responses worth sending a request again: throttling and
+# transient errors of Google
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class RequestBudgetExceeded(Exception):
+    """
+    Raised when a run has sent as many requests as it was allowed to
+    """
+
+
+class TokenBucket:
+
+    """
+    Thread-safe token bucket: up to capacity requests may be sent at once,
+    after that requests are spread evenly at rate requests per second
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        if rate <= 0:
+            raise ValueError(f'Rate of a token bucket must be positive, '
+                             f'got {rate}')
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Takes a token, waits until there is one if the bucket is empty.
+        Tokens are reserved in order, so waiting threads are served first
+        come, first served
+
+        :return: seconds spent waiting
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens
+                               + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+def _status(error: Exception) -> Optional[int]:
+    """
+    Gives the http status of an error of the google client, the client is
+    not imported to check the type of the error
+    """
+    resp = getattr(error, 'resp', None)
+    status = getattr(resp, 'status', None)
+    return int(status) if status is not None else None
+
+
+def _retry_after(error: Exception) -> float:
+    resp = getattr(error, 'resp', None)
+    try:
+        return float(resp.get('retry-after', 0))
+    except (AttributeError, TypeError, ValueError):
+        return 0.0
+
+
+class RequestScheduler:
+
+    """
+    Sends requests to Google APIs as fast as the quota allows
+
+    * rate limit - a token bucket lets burst requests go at once and spreads
+      the rest so that no more than quota requests are sent in any period
+    * retries - a request throttled with 429 or failed with 5xx or a broken
+      connection is sent again after an exponential backoff with full
+      jitter, or after Retry-After if Google asks to wait longer
+    * deduplication - identical requests made at the same time, e.g. the same
+      page wanted by two threads, are sent once and share the response
+    * budget - a run sends at most budget requests, retries included, and
+      fails with RequestBudgetExceeded after that
+    """
+
+    def __init__(self, quota: Optional[int] = None, period: float = 60.0,
+                 burst: Optional[int] = None,
+                 max_retries: Optional[int] = None,
+                 backoff: float = 1.0, max_backoff: Optional[float] = None,
+                 budget: Optional[int] = None) -> None:
+        """
+        :param quota: requests allowed in a period, cfg.SHEETS_QUOTA by
+        default, 0 not to limit the rate at all
+        :param period: period of the quota in seconds
+        :param burst: requests that may be sent at once, cfg.SHEETS_BURST
+        by default
+        :param max_retries: how many times a request is sent again,
+        cfg.SHEETS_MAX_RETRIES by default
+        :param backoff: the longest wait before the first retry in seconds,
+        it doubles with every retry
+        :param max_backoff: the longest wait before any retry,
+        cfg.SHEETS_MAX_BACKOFF by default
+        :param budget: requests a run may send, cfg.SHEETS_REQUEST_BUDGET
+        by default, 0 for no limit
+        """
+        quota = cfg.SHEETS_QUOTA if quota is None else quota
+        burst = cfg.SHEETS_BURST if burst is None else burst
+        self.bucket: Optional[TokenBucket] = None
+        if quota:
+            burst = max(1, min(burst, quota - 1))
+            # a full bucket plus what it gets during a period is the quota,
+            # a quota of one request lets one request go every period
+            self.bucket = TokenBucket(max(quota - burst, 1) / period, burst)
+        self.max_retries = (cfg.SHEETS_MAX_RETRIES if max_retries is None
+                            else max_retries)
+        self.backoff = backoff
+        self.max_backoff = (cfg.SHEETS_MAX_BACKOFF if max_backoff is None
+                            else max_backoff)
+        self.budget = (cfg.SHEETS_REQUEST_BUDGET if budget is None
+                       else budget)
+
+        self.sent = 0
+        self.retries = 0
+        self.deduplicated = 0
+        self._lock = threading.Lock()
+        self._in_flight: Dict[Hashable, Future] = {}
+
+    def execute(self, send: Callable[[], dict],
+                key: Optional[Hashable] = None) -> dict:
+        """
+        Sends a request
+
+        :param send: function that sends the request and returns a response
+        :param key: anything that tells identical requests apart, requests
+        without a key are never deduplicated
+        :return: the response
+        """
+        if key is None:
+            return self._send_with_retries(send)
+
+        # the first request is sent, the identical ones wait for it
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+            else:
+                self.deduplicated += 1
+        if not owner:
+            incr('api_deduplicated')
+            return future.result()
+
+        try:
+            response = self._send_with_retries(send)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(response)
+            return response
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def _send_with_retries(self, send: Callable[[], dict]) -> dict:
+        attempt = 0
+        while True:
+            with self._lock:
+                if self.budget and self.sent >= self.budget:
+                    raise RequestBudgetExceeded(
+                        f'The run has already sent {self.sent} requests')
+                self.sent += 1
+            if self.bucket is not None:
+                self.bucket.acquire()
+            try:
+                return send()
+            except (ConnectionError, TimeoutError, socket.timeout) as e:
+                error = e
+            except Exception as e:
+                if _status(e) not in RETRY_STATUSES:
+                    raise
+                error = e
+
+            if attempt >= self.max_retries:
+                raise error
+            # full jitter, so threads throttled together don't come back
+            # together
+            delay = random.uniform(0, min(self.max_backoff,
+                                          self.backoff * 2 ** attempt))
+            delay = max(delay, _retry_after(error))
+            attempt += 1
+            with self._lock:
+                self.retries += 1
+            incr('api_retries')
+            print(f'Request failed with {error!r}, retry {attempt} of '
+                  f'{self.max_retries} in {delay:.1f} s')
+            time.sleep(delay)
+
+
+class SheetsClient:
+
+    """
+    Client of the spreadsheet with results of smartphones benchmarks
+
+    Credentials and the discovery document are loaded only once - on the
+    first request - and the same authorized http connection is reused for
+    every request after that, so the connection is kept alive between calls.
+
+    Both the transport and the service are injectable: pass an
+    ``httplib2.Http``-like object as ``http`` to send requests through it
+    instead of an authorized connection, or pass any object with the
+    interface of a discovered sheets service as ``service`` to skip
+    discovery altogether (e.g. a local fake in tests)
+
+    Requests are sent through ``scheduler``, a RequestScheduler with the
+    settings from app_config by default
+
+    httplib2 connections are not thread-safe, so when the client makes
+    connections itself every thread gets its own authorized connection,
+    while the credentials and the discovered service are still shared
+    """
+
+    def __init__(self, spreadsheet_id: Optional[str] = None,
+                 service=None, http=None, drive_service=None,
+                 scheduler: Optional[RequestScheduler] = None) -> None:
+        self.spreadsheet_id = spreadsheet_id or cfg.SPREADSHEET_ID
+        self.scheduler = scheduler or RequestScheduler()
+        self._service = service
+        self._http = http
+        self._drive_service = drive_service
+        self._credentials = None
+        self._owns_transport = http is None and service is None
+        self._local = threading.local()
+
+    @property
+    def service(self):
+        """
+        Discovered sheets service, built on the first access
+        """
+        if self._service is None:
+            self._service = self._build('sheets', 'v4')
+        return self._service
+
+    @property
+    def drive_service(self):
+        """
+        Discovered drive service, built on the first access. It is used only
+        for cheap metadata requests
+        """
+        if self._drive_service is None:
+            self._drive_service = self._build('drive', 'v3')
+        return self._drive_service
+
+    def _build(self, name: str, version: str):
+        # It works irregardless pycharm's whining
+        from apiclient.discovery import build
+
+        return build(name, version, http=self.http, cache_discovery=False)
+
+    def _authorize(self):
+        """
+        Makes a new authorized http connection
+        """
+        from httplib2 import Http
+
+        return self.credentials.authorize(Http())
+
+    @property
+    def http(self):
+        """
+        Authorized http connection, made on the first access
+        """
+        if self._http is None:
+            self._http = self._authorize()
+        return self._http
+
+    @property
+    def credentials(self) -> 'ServiceAccountCredentials':
+        """
+        Credentials of the service account, read on the first access
+        """
+        if self._credentials is None:
+            from oauth2client.service_account import \
+                ServiceAccountCredentials
+
+            self._credentials = \
+                ServiceAccountCredentials.from_json_keyfile_name(
+                    cfg.GOOGLE_CREDENTIAL_FILE, SCOPES)
+        return self._credentials
+
+    def _execute(self, request, key: Optional[Hashable] = None) -> dict:
+        """
+        Executes a request through the scheduler and counts it
+
+        :param request: request of the google client
+        :param key: anything that tells identical requests apart, see
+        RequestScheduler.execute
+        """
+        def send() -> dict:
+            incr('api_calls')
+            return self._send(request)
+
+        with span('download'):
+            response = self.scheduler.execute(send, key)
+        if METRICS.enabled:
+            # the size of the decoded payload, the http layer doesn't tell
+            # how many bytes came over the wire
+            incr('bytes_fetched', len(json.dumps(
+                response, ensure_ascii=False).encode('utf8')))
+        return response
+
+    def _send(self, request) -> dict:
+        """
+        Executes a request with an http connection of the current thread
+        """
+        if not self._owns_transport:
+            return request.execute()
+
+        if threading.current_thread() is threading.main_thread():
+            return request.execute(http=self.http)
+
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            http = self._authorize()
+            self._local.http = http
+        return request.execute(http=http)
+
+    def get_sheets(self, sheet_names: Iterable[str]) -> Dict[str,
+                                                              List[List[str]]]:
+        """
+        Downloads several sheets of the spreadsheet with a single
+        values:batchGet request
+
+        :param sheet_names: names of sheets to download
+        :return: dict where a key is a name of a sheet and a value is a list
+        of lists where every list represents one row of a table
+        """
+        sheet_names = list(sheet_names)
+        if not sheet_names:
+            return {}
+
+        response = self._execute(
+            self.service.spreadsheets().values().batchGet(
+                spreadsheetId=self.spreadsheet_id, ranges=sheet_names),
+            key=('batchGet', tuple(sheet_names)))
+
+        # value ranges are returned in the same order they were requested
+        value_ranges = response.get('valueRanges', [])
+        sheets = {name: value_range.get('values', [])[HEADER_ROWS:]
+                  for name, value_range in zip(sheet_names, value_ranges)}
+        return sheets
+
+    def get_sheet(self, sheet_name: str) -> List[List[str]]:
+        """
+        Downloads one sheet of the spreadsheet
+
+        :param sheet_name: name of a sheet to download
+        :return: list of lists where every list represents one row of a table
+        """
+        response = self._execute(
+            self.service.spreadsheets().values().get(
+                spreadsheetId=self.spreadsheet_id, range=sheet_name),
+            key=('get', sheet_name))
+        return response.get('values', [])[HEADER_ROWS:]
+
+    def get_sheets_concurrently(self, sheet_names: Iterable[str],
+                                max_workers: int) -> Dict[str,
+                                                          List[List[str]]]:
+        """
+        Downloads several sheets of the spreadsheet with separate requests
+        sent at the same time
+
+        :param sheet_names: names of sheets to download
+        :param max_workers: how many requests may be in flight at once
+        :return: dict where a key is a name of a sheet and a value is a list
+        of lists where every list represents one row of a table. Sheets go
+        in the same order they were requested regardless of the order
+        in which the responses arrived
+        """
+        sheet_names = list(sheet_names)
+        if not sheet_names:
+            return {}
+
+        # touch the service in this thread, so discovery happens only once
+        # and not in every worker at the same time
+        _ = self.service
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            sheets = dict(zip(sheet_names,
+                              executor.map(self.get_sheet, sheet_names)))
+        return sheets
+
+    def get_row_count(self, sheet_name: str) -> int:
+        """
+        Asks how many rows the grid of a sheet has, blank ones included
+
+        :param sheet_name: name of a sheet
+        :return: number of rows
+        """
+        response = self._execute(
+            self.service.spreadsheets().get(
+                spreadsheetId=self.spreadsheet_id, ranges=[sheet_name],
+                fields='sheets.properties.gridProperties.rowCount'),
+            key=('rowCount', sheet_name))
+        return response['sheets'][0]['properties']['gridProperties'][
+            'rowCount']
+
+    def iter_sheet_pages(self, sheet_name: str,
+                         page_size: int) -> Iterator[List[List[str]]]:
+        """
+        Downloads a sheet page by page, every page is a range of page_size
+        rows requested separately
+
+        Pages are requested up to the last row of the grid of the sheet, so
+        blank rows in the middle of a sheet don't end it. Google omits blank
+        rows at the end of a range, so a page may be shorter than page_size
+        or even empty. Such a page is padded with blank rows to keep numbers
+        of rows right
+
+        :param sheet_name: name of a sheet to download
+        :param page_size: number of rows in a page
+        :return: iterator over pages, lists of rows
+        """
+        row_count = self.get_row_count(sheet_name)
+        quoted_name = "'{}'".format(sheet_name.replace("'", "''"))
+        first = HEADER_ROWS + 1
+        while first <= row_count:
+            last = min(first + page_size - 1, row_count)
+            range_ = f'{quoted_name}!{first}:{last}'
+            response = self._execute(
+                self.service.spreadsheets().values().get(
+                    spreadsheetId=self.spreadsheet_id, range=range_),
+                key=('get', range_))
+            # the response may be shared by deduplicated requests, so the
+            # page is padded in a copy
+            rows = list(response.get('values', []))
+            rows.extend([] for _ in range(last - first + 1 - len(rows)))
+            yield rows
+            first = last + 1
+
+    def get_modified_time(self) -> str:
+        """
+        Asks Google Drive when the spreadsheet was modified last time. The
+        response is tiny compared to the sheets themselves
+
+        :return: modified time of the spreadsheet in RFC 3339 format
+        """
+        response = self._execute(
+            self.drive_service.files().get(fileId=self.spreadsheet_id,
+                                           fields='modifiedTime'),
+            key=('modifiedTime',))
+        return response['modifiedTime']
+
+
+_client: Optional[SheetsClient] = None
+
+
+def get_client() -> SheetsClient:
+    """
+    Returns a client shared by the whole process, so authentication and
+    discovery happen only once per run
+    """
+    global _client
+    if _client is None:
+        _client = SheetsClient()
+    return _client
+
 
 def get_spreadsheet(sheet_name: str) -> List[List[str]]:
 
@@ -22,15 +509,109 @@ def get_spreadsheet(sheet_name: str) -> List[List[str]]:
     :return: list of lists where every list represents one row of a table
     """
 
-    scopes = ['https://spreadsheets.google.com/feeds',
-              'https://www.googleapis.com/auth/drive']
+    return get_client().get_sheets([sheet_name])[sheet_name]
+
 
-    cred_file = cfg.GOOGLE_CREDENTIAL_FILE
-    creds = ServiceAccountCredentials.from_json_keyfile_name(cred_file, scopes)
-    service = build('sheets', 'v4', http=creds.authorize(Http()))
-    gsheet = service.spreadsheets().values().get(
-        spreadsheetId=cfg.SPREADSHEET_ID, range=sheet_name).execute()
+def download_sheets(sheet_names: Iterable[str],
+                    client: Optional[SheetsClient] = None,
+                    cache: Optional['SheetCache'] = None,
+                    offline: bool = False,
+                    max_workers: Optional[int] = None) -> Dict[
+                        str, List[List[str]]]:
+    """
+    Returns sheets from the cache if the spreadsheet hasn't been changed
+    since they were cached, and downloads the rest of them
+
+    :param sheet_names: names of sheets to get
+    :param client: client of the spreadsheet, a shared one by default
+    :param cache: cache of sheets, if None every sheet is downloaded
+    :param offline: take every sheet from the cache without touching the
+    network regardless of whether the spreadsheet was modified or not
+    :param max_workers: download sheets with separate concurrent requests,
+    at most max_workers of them at once. If None, all sheets are downloaded
+    with a single batch request
+    :return: dict where a key is a name of a sheet and a value is a list
+    of lists where every list represents one row of a table
+    """
+    sheet_names = list(sheet_names)
+    client = client or get_client()
+
+    if offline:
+        if cache is None:
+            raise CacheMissError('Offline mode needs a cache of sheets')
+        sheets = {}
+        for name in sheet_names:
+            rows = cache.get(client.spreadsheet_id, name)
+            if rows is None:
+                raise CacheMissError(f'Sheet {name} is not cached')
+            sheets[name] = rows
+        return sheets
+
+    def fetch(names: List[str]) -> Dict[str, List[List[str]]]:
+        if max_workers:
+            return client.get_sheets_concurrently(names, max_workers)
+        return client.get_sheets(names)
+
+    if cache is None:
+        return fetch(sheet_names)
+
+    modified_time = client.get_modified_time()
+    sheets = {name: cache.get(client.spreadsheet_id, name, modified_time)
+              for name in sheet_names}
+    missing = [name for name, rows in sheets.items() if rows is None]
+    if missing:
+        downloaded = fetch(missing)
+        for name, rows in downloaded.items():
+            cache.put(client.spreadsheet_id, name, modified_time, rows)
+        sheets.update(downloaded)
+        cache.evict()
+    else:
+        print('The spreadsheet has not been modified, using cached sheets')
+
+    return sheets
+
+
+def prefetch(pages: Iterator[List[List[str]]],
+             depth: int = 1) -> Iterator[List[List[str]]]:
+    """
+    Pulls pages from an iterator in a background thread, so the next page
+    is downloaded while the current one is being processed
+
+    :param pages: iterator over pages
+    :param depth: how many pages may wait to be processed, memory is bounded
+    by depth + 2 pages
+    :return: iterator over the same pages in the same order
+    """
+    done = object()
+    buffer: 'queue.Queue' = queue.Queue(maxsize=depth)
+    stop = threading.Event()
 
-    print(gsheet)
-    return gsheet['values'][2:]
+    def pull() -> None:
+        try:
+            for page in pages:
+                if stop.is_set():
+                    return
+                buffer.put(page)
+        except Exception as e:
+            buffer.put(e)
+        else:
+            buffer.put(done)
 
+    thread = threading.Thread(target=pull, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # let the thread finish if the consumer stopped early
+        stop.set()
+        while thread.is_alive():
+            try:
+                buffer.get_nowait()
+            except queue.Empty:
+                thread.join(0.1)
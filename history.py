@@ -0,0 +1,125 @@
+"""
+Module that makes charts of benchmarks as they were on past dates: a
+series of rankings of the latest smartphones as of every date, see
+Smartphones.prepare_series. Scores are the current ones, only the
+smartphones shown depend on a date
+
+In json and html formats a series is one animated chart with a frame per
+date, images/history/<benchmark>.html. Images can't be animated, so in
+other formats every frame is rendered as an image of its own,
+images/history/<benchmark>/<YYYY-MM-DD>.png, in parallel like pages of
+rankings. All frames of a benchmark share the scale of the x axis
+"""
+
+from __future__ import annotations
+
+import math
+import os
+from datetime import date, timedelta
+from typing import Iterable, List, Optional, Tuple, TYPE_CHECKING
+
+from benchmark_registry import chart_benchmarks
+from make_chart import (FIGURE_FORMATS, X_MARGIN, build_animation,
+                        chart_path, figure_to_bytes, write_plotlyjs)
+from metrics import span
+from render_cache import write_if_changed
+from row_parser import DATE_FORMAT
+
+if TYPE_CHECKING:
+    from prepare_data import DataForPlots, Smartphones
+    from render_cache import RenderCache
+
+HISTORY_DIR = 'history'
+
+
+def month_ends(first: date, last: date) -> List[date]:
+    """
+    Gives the last day of every month from the month of first to the month
+    of last, both included
+    """
+    ends = []
+    year, month = first.year, first.month
+    while (year, month) <= (last.year, last.month):
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        ends.append(date(year, month, 1) - timedelta(days=1))
+    return ends
+
+
+def make_series(smartphones: Smartphones, bench: str,
+                dates: List[date],
+                window: Optional[int] = None) -> List[DataForPlots]:
+    """
+    Prepares axes of charts of a benchmark as of every date, with a
+    subtitle of the date and the x axis long enough for every one of them
+
+    :param smartphones: smartphones with results of benchmarks
+    :param bench: name of a benchmark
+    :param dates: dates of charts
+    :param window: how many of the latest smartphones to show,
+    cfg.PLOT_WINDOW by default
+    :return: axes of a chart for every date
+    """
+    series = smartphones.prepare_series(bench, dates, window)
+    longest = max((sum(bars) for data_for_plots in series
+                   for bars in zip(*data_for_plots.x_axes)), default=0)
+    for as_of, data_for_plots in zip(dates, series):
+        data_for_plots.subtitle = f'на {as_of.strftime(DATE_FORMAT)}'
+        data_for_plots.x_max = math.ceil(longest * X_MARGIN)
+    return series
+
+
+def _write_animation(bench: str, frames: List[Tuple[str, DataForPlots]],
+                     fmt: str) -> str:
+    fig = build_animation(bench, frames)
+    path = chart_path(f'{HISTORY_DIR}/{bench}', fmt)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if fmt == 'html':
+        write_plotlyjs(os.path.dirname(path))
+    with span('render'):
+        write_if_changed(path, figure_to_bytes(fig, fmt))
+    return path
+
+
+def render_history(smartphones: Smartphones, dates: Iterable[date],
+                   benches: Optional[Iterable[str]] = None,
+                   window: Optional[int] = None,
+                   max_workers: Optional[int] = None,
+                   cache: Optional[RenderCache] = None,
+                   fmt: str = 'html') -> bool:
+    """
+    Makes charts of several benchmarks as they were on several dates
+
+    :param smartphones: smartphones with results of benchmarks
+    :param dates: dates of charts
+    :param benches: names of benchmarks, chart_benchmarks() by default
+    :param window: how many of the latest smartphones to show,
+    cfg.PLOT_WINDOW by default
+    :param max_workers: number of processes rendering images, see
+    render_charts
+    :param cache: cache of rendered images, see render_charts
+    :param fmt: format of charts, see make_chart.FORMATS. Charts in
+    FIGURE_FORMATS are animated, other formats get an image per date
+    :return: whether all charts were made
+    """
+    from render_scheduler import render_pages
+
+    dates = sorted(set(dates))
+    benches = list(chart_benchmarks() if benches is None else benches)
+    series = {bench: make_series(smartphones, bench, dates, window)
+              for bench in benches}
+
+    if fmt in FIGURE_FORMATS:
+        for bench, data in series.items():
+            frames = [(as_of.strftime(DATE_FORMAT), data_for_plots)
+                      for as_of, data_for_plots in zip(dates, data)]
+            path = _write_animation(bench, frames, fmt)
+            print(f'{bench}: {len(frames)} frames saved as {path}')
+        return True
+
+    # frames of all benchmarks are rendered by one pool of processes
+    frames = {f'{HISTORY_DIR}/{bench}/{as_of.isoformat()}':
+              (bench, data_for_plots)
+              for bench, data in series.items()
+              for as_of, data_for_plots in zip(dates, data)}
+    results = render_pages(frames, max_workers, cache, fmt)
+    return all(result.ok for result in results)
@@ -0,0 +1,119 @@
+"""
+Module that finds out which charts have to be made again because their
+inputs changed since the previous run
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, List, Optional, TYPE_CHECKING
+
+import app_config as cfg
+from benchmark_registry import get_spec
+from make_chart import chart_path, chart_settings
+from render_cache import write_if_changed
+
+if TYPE_CHECKING:
+    from prepare_data import Smartphones
+
+# keys of plot_settings.json used by every chart, settings of a chart itself
+# are given by make_chart.chart_settings
+SHARED_SETTINGS_KEYS = ('default_bar_colors', 'highlight_colors',
+                        'layout_settings')
+
+
+def chart_inputs(smartphones: Smartphones, bench: str,
+                 plot_settings: dict, window: Optional[int] = None) -> dict:
+    """
+    Gathers everything a chart of a benchmark is made from
+
+    A chart depends not only on rows of its own sheet: a date of a
+    smartphone is taken from the first sheet it appears in, a chip is taken
+    from any sheet with chips, and '+' or '-' in any sheet highlights or
+    hides the smartphone in every chart. So inputs are taken from the
+    smartphones after all sheets were read rather than from raw rows
+
+    :param smartphones: smartphones with results of benchmarks
+    :param bench: name of a benchmark
+    :param plot_settings: contents of plot_settings.json
+    :param window: how many of the latest smartphones the chart shows,
+    cfg.PLOT_WINDOW by default
+    :return: JSON serializable dict
+    """
+    label_attr = get_spec(bench).label_attr
+
+    devices = []
+    for s in smartphones.all_smartphones.values():
+        benchmark = getattr(s, bench)
+        if not benchmark.total_score:
+            continue
+        devices.append([s.name, s.date.isoformat() if s.date else None,
+                        s.highlight, s.ignore, getattr(s, label_attr),
+                        benchmark._get_bench_results()])
+
+    # scores of highlighted smartphones decide which one is the reference
+    # for percentages, even if they have no results in this benchmark
+    highlighted = [[s.name, getattr(s, bench).total_score]
+                   for s in smartphones.highlighted_smartphones]
+
+    settings = {key: plot_settings.get(key) for key in SHARED_SETTINGS_KEYS}
+    settings[bench] = chart_settings(bench, plot_settings)
+
+    return {'devices': devices, 'highlighted': highlighted,
+            'settings': settings,
+            'window': cfg.PLOT_WINDOW if window is None else window}
+
+
+def fingerprint(inputs: dict) -> str:
+    content = json.dumps(inputs, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(content.encode('utf8')).hexdigest()
+
+
+class BuildState:
+
+    """
+    Fingerprints of inputs of every chart made by the previous run, kept in
+    a JSON file between runs. A chart of a benchmark in every format has
+    its own fingerprint
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path or cfg.BUILD_STATE_FILE
+        try:
+            with open(self.path, 'r', encoding='utf8') as infile:
+                self.fingerprints: Dict[str, str] = json.load(infile)
+        except (OSError, ValueError):
+            self.fingerprints = {}
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        write_if_changed(self.path, json.dumps(
+            self.fingerprints, indent=4, sort_keys=True).encode('utf8'))
+
+    def affected(self, smartphones: Smartphones, benches: Iterable[str],
+                 plot_settings: dict, fmt: str = 'png') -> Dict[str, str]:
+        """
+        Finds charts whose inputs changed since the previous run or whose
+        images are missing
+
+        :return: dict where a key is a name of a benchmark to be made again
+        and a value is a new fingerprint of its inputs
+        """
+        affected = {}
+        for bench in benches:
+            new = fingerprint(chart_inputs(smartphones, bench, plot_settings))
+            path = chart_path(bench, fmt)
+            if self.fingerprints.get(path) != new or not os.path.exists(path):
+                affected[bench] = new
+        return affected
+
+    def update(self, fingerprints: Dict[str, str],
+               benches: List[str], fmt: str = 'png') -> None:
+        """
+        Remembers fingerprints of charts that were made successfully
+        """
+        for bench in benches:
+            self.fingerprints[chart_path(bench, fmt)] = fingerprints[bench]
+        self.save()
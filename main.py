@@ -1,26 +1,348 @@
 # Main entry point to the app
 
-from app_config import LIST_OF_BENCHS
-from make_chart import make_chart
-from prepare_data import Smartphones
+import argparse
+import sys
+from contextlib import contextmanager
+from datetime import date
+from typing import Callable, Dict, Iterator, List, Optional, TYPE_CHECKING
 
+import app_config as cfg
+from export import FORMATS as EXPORT_FORMATS
+from facets import FACETS
+from make_chart import FORMATS
+from metrics import METRICS, enable as enable_metrics
 
-def main() -> None:
+if TYPE_CHECKING:
+    from prepare_data import Smartphones
+
+# Modules with heavy dependencies - plotly, numpy, openpyxl and the google
+# client - are imported by the commands which need them, so e.g. exporting
+# never imports plotly
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Parses command line arguments of the app
+
+    Running the app without a command is the same as running the render
+    command
+    """
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or (argv[0] not in COMMANDS
+                    and argv[0] not in ('-h', '--help')):
+        argv.insert(0, 'render')
+
+    # options of reading sheets, every command reads them
+    sources = argparse.ArgumentParser(add_help=False)
+    cache_mode = sources.add_mutually_exclusive_group()
+    cache_mode.add_argument('--offline', action='store_true',
+                            help='read sheets from the local cache only')
+    cache_mode.add_argument('--no-cache', action='store_true',
+                            help='always download sheets and do not cache '
+                                 'them')
+    local = sources.add_mutually_exclusive_group()
+    local.add_argument('--xlsx', default=None, metavar='PATH',
+                       help='read sheets from a local Excel workbook '
+                            'instead of the google spreadsheet')
+    local.add_argument('--csv-dir', default=None, metavar='DIR',
+                       help='read sheets from CSV files in DIR, a file per '
+                            'sheet, instead of the google spreadsheet')
+    sources.add_argument('--concurrency', type=int, default=None,
+                         metavar='N',
+                         help='download sheets with up to N concurrent '
+                              'requests instead of one batch request')
+    sources.add_argument('--page-size', type=int, default=None, metavar='N',
+                         help='stream sheets in pages of N rows, sheets are '
+                              'not cached in this mode')
+    sources.add_argument('--catalogue', default=cfg.CATALOGUE_DB,
+                         metavar='PATH',
+                         help='keep smartphones in a SQLite catalogue at '
+                              'PATH, every read of sheets is saved to it')
+    sources.add_argument('--from-catalogue', action='store_true',
+                         help='load smartphones from the catalogue instead of '
+                              'reading sheets')
+    sources.add_argument('--metrics', default=cfg.METRICS_FILE,
+                         metavar='PATH',
+                         help='collect timings of stages and counters and '
+                              'write them to PATH as JSON at the end')
+    sources.add_argument('--prometheus', default=cfg.METRICS_PROMETHEUS_FILE,
+                         metavar='PATH',
+                         help='also write metrics to PATH in the Prometheus '
+                              'text format')
+    sources.add_argument('--profile', default=None, metavar='DIR',
+                         help='profile CPU and memory of every stage and '
+                              'write reports to DIR, charts are rendered in '
+                              'one process in this mode')
+    sources.add_argument('--profile-rate', type=float, default=None,
+                         metavar='HZ',
+                         help='with --profile, sample stacks HZ times per '
+                              'second instead of tracing every call, and '
+                              'write collapsed stacks for flame graphs')
+
+    parser = argparse.ArgumentParser(description='Make charts with results '
+                                                 'of smartphones benchmarks')
+    commands = parser.add_subparsers(dest='command', metavar='COMMAND')
+
+    commands.add_parser('ingest', parents=[sources],
+                        help='read sheets and report rows that could not be '
+                             'read, sheets are cached for later runs')
+
+    export_parser = commands.add_parser('export', parents=[sources],
+                                        help='export smartphones to files')
+    export_parser.add_argument('paths', nargs='+', metavar='PATH',
+                               help='file to export to, the format is taken '
+                                    'from the extension: '
+                                    f'{", ".join(EXPORT_FORMATS)}')
+
+    render_parser = commands.add_parser('render', parents=[sources],
+                                        help='make charts, the default '
+                                             'command')
+    render_parser.add_argument('--workers', type=int, default=None,
+                               metavar='N',
+                               help='render charts with N processes, one per '
+                                    'core by default')
+    render_parser.add_argument('--format', choices=FORMATS, default='png',
+                               help='format of charts, json and html are '
+                                    'written without Orca')
+    render_parser.add_argument('--no-render-cache', action='store_true',
+                               help='render every chart even if it has not '
+                                    'changed')
+    render_parser.add_argument('--incremental', action='store_true',
+                               help='make only charts whose inputs changed '
+                                    'since the previous run')
+    render_parser.add_argument('--columnar', action='store_true',
+                               help='prepare data for charts with the '
+                                    'columnar store of smartphones')
+    render_parser.add_argument('--facet', choices=FACETS, default=None,
+                               help='rank all smartphones instead of the '
+                                    'latest ones and split rankings into '
+                                    'pages, by chip vendor, by battery '
+                                    'capacity or just by size')
+    render_parser.add_argument('--facet-size', type=int, default=None,
+                               metavar='N',
+                               help='with --facet, show N smartphones on a '
+                                    'page, see FACET_PAGE_SIZE')
+
+    history_parser = commands.add_parser('history', parents=[sources],
+                                         help='make charts as they were on '
+                                              'past dates')
+    dates = history_parser.add_mutually_exclusive_group(required=True)
+    dates.add_argument('--dates', nargs='+', type=date.fromisoformat,
+                       metavar='DATE',
+                       help='make charts as of every DATE, YYYY-MM-DD')
+    dates.add_argument('--months', nargs=2, type=date.fromisoformat,
+                       metavar=('FIRST', 'LAST'),
+                       help='make charts as of the end of every month from '
+                            'FIRST to LAST')
+    history_parser.add_argument('--window', type=int, default=None,
+                                metavar='N',
+                                help='show N latest smartphones, see '
+                                     'PLOT_WINDOW')
+    history_parser.add_argument('--workers', type=int, default=None,
+                                metavar='N',
+                                help='render images with N processes, one '
+                                     'per core by default')
+    history_parser.add_argument('--format', choices=FORMATS, default='html',
+                                help='format of charts, json and html charts '
+                                     'are animated, other formats get an '
+                                     'image per date')
+    history_parser.add_argument('--no-render-cache', action='store_true',
+                                help='render every image even if it has not '
+                                     'changed')
+
+    serve_parser = commands.add_parser('serve', parents=[sources],
+                                       help='run a service that makes charts '
+                                            'on demand')
+    serve_parser.add_argument('--port', type=int, default=None,
+                              help='port of the service, see SERVICE_PORT')
+
+    args = parser.parse_args(argv)
+    if args.from_catalogue and not args.catalogue:
+        parser.error('--from-catalogue needs --catalogue or CATALOGUE_DB')
+    if getattr(args, 'facet', None) and (args.incremental or args.columnar):
+        parser.error('--facet cannot be used with --incremental or '
+                     '--columnar')
+    return args
+
+
+def make_data_source(args: argparse.Namespace):
+    """
+    Makes a source of sheets chosen by command line arguments
+    """
+    from data_sources import CsvSource, GoogleSheetsSource, XlsxSource
+    from sheet_cache import SheetCache
+
+    if args.xlsx:
+        return XlsxSource(args.xlsx)
+    if args.csv_dir:
+        return CsvSource(args.csv_dir)
+    return GoogleSheetsSource(cache=None if args.no_cache else SheetCache(),
+                              offline=args.offline,
+                              max_workers=args.concurrency,
+                              page_size=args.page_size)
+
+
+@contextmanager
+def read_smartphones(args: argparse.Namespace) -> Iterator['Smartphones']:
+    """
+    Reads smartphones from sheets or from the catalogue and saves the ones
+    read from sheets to the catalogue
+
+    Smartphones loaded from the catalogue are linked to it, so the latest
+    smartphones are selected with its index, and it's closed when the
+    command is done with them
+    """
+    from catalogue_store import CatalogueStore
+    from prepare_data import Smartphones
+
+    if args.from_catalogue:
+        with CatalogueStore(args.catalogue) as catalogue:
+            yield catalogue.load()
+        return
+
+    smartphones = Smartphones()
+    smartphones.read_from_excel_book(source=make_data_source(args))
+    if args.catalogue:
+        with CatalogueStore(args.catalogue) as catalogue:
+            catalogue.save(smartphones)
+    yield smartphones
+
+
+def ingest(args: argparse.Namespace) -> int:
+    with read_smartphones(args) as smartphones:
+        print(f'Read {len(smartphones.all_smartphones)} smartphones')
+    return 0
+
+
+def export(args: argparse.Namespace) -> int:
+    from export import export as export_smartphones
+
+    with read_smartphones(args) as smartphones:
+        for path in args.paths:
+            export_smartphones(smartphones, path)
+    return 0
+
+
+def render(args: argparse.Namespace) -> int:
+    with read_smartphones(args) as smartphones:
+        return _render(args, smartphones)
+
+
+def _render(args: argparse.Namespace, smartphones: 'Smartphones') -> int:
+    from benchmark_registry import chart_benchmarks
+    from incremental import BuildState
+    from make_chart import load_plot_settings
+    from render_cache import RenderCache
+    from render_scheduler import render_charts
+
+    render_cache = None if args.no_render_cache else RenderCache()
+    if args.facet:
+        from facets import render_facets
+
+        _, ok = render_facets(smartphones, args.facet,
+                              page_size=args.facet_size,
+                              max_workers=args.workers, cache=render_cache,
+                              fmt=args.format)
+        return 0 if ok else 1
+
+    # every chart takes the latest smartphones, so sort them by date once,
+    # unless the index of the catalogue does it
+    if smartphones.catalogue is None:
+        smartphones.build_date_index()
+
+    benches = chart_benchmarks()
+    build_state = BuildState()
+    fingerprints = build_state.affected(smartphones, benches,
+                                        load_plot_settings(), args.format)
+    if args.incremental:
+        benches = [bench for bench in benches if bench in fingerprints]
+        print(f'Charts to be made again: {", ".join(benches) or "none"}')
+
+    # make a chart for every benchmark in a list
+    if args.columnar:
+        from columnar import ColumnarSmartphones
+
+        source = ColumnarSmartphones.from_smartphones(smartphones)
+    else:
+        source = smartphones
+    results = render_charts(source, benches, max_workers=args.workers,
+                            cache=render_cache, fmt=args.format)
+
+    build_state.update(fingerprints,
+                       [r.bench for r in results
+                        if r.ok and r.bench in fingerprints],
+                       args.format)
+    return 0 if all(result.ok for result in results) else 1
+
+
+def history(args: argparse.Namespace) -> int:
+    from history import month_ends, render_history
+    from render_cache import RenderCache
+
+    dates = args.dates or month_ends(*args.months)
+    with read_smartphones(args) as smartphones:
+        ok = render_history(smartphones, dates, window=args.window,
+                            max_workers=args.workers,
+                            cache=(None if args.no_render_cache
+                                   else RenderCache()),
+                            fmt=args.format)
+    return 0 if ok else 1
+
+
+def serve(args: argparse.Namespace) -> int:
+    from chart_service import serve as serve_charts
+
+    # sheets are read again and again, so the cache saves downloads of
+    # sheets that didn't change
+    serve_charts(port=args.port, source=make_data_source(args))
+    return 0
+
+
+COMMANDS: Dict[str, Callable[[argparse.Namespace], int]] = {
+    'ingest': ingest,
+    'export': export,
+    'render': render,
+    'history': history,
+    'serve': serve,
+}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
     """
     Main entry point in the app.
 
     Runs all essential modules to read data
     and render charts
 
-    :return: None
+    :param argv: command line arguments, sys.argv by default
+    :return: exit status, 1 if any chart failed
     """
-    smartphones = Smartphones()
-    smartphones.read_from_excel_book()
+    args = parse_args(argv)
+    collect_metrics = bool(args.metrics or args.prometheus)
+    if collect_metrics:
+        enable_metrics()
 
-    # make a chart for every benchmark in a list
-    for bench in LIST_OF_BENCHS:
-        make_chart(bench, smartphones)
+    profiler = None
+    if args.profile:
+        from profiling import Profiler
+
+        # worker processes are not profiled, so charts are rendered here
+        if args.command in ('render', 'history'):
+            args.workers = 1
+        profiler = Profiler(args.profile, args.profile_rate)
+        profiler.start()
+
+    try:
+        return COMMANDS[args.command](args)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+            profiler.write()
+        if collect_metrics:
+            METRICS.write(args.metrics, args.prometheus)
+            paths = filter(None, [args.metrics, args.prometheus])
+            print(f'Metrics were written to {" and ".join(paths)}')
 
 
 if __name__ == '__main__':
-    main()
+    raise SystemExit(main())
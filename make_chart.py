@@ -1,63 +1,155 @@
 """
 Module that shapes all the information about smartphones to a from that
 plotly - library for making charts - understands
+
+Importing the module has no side effects and doesn't import plotly: plotly,
+plot settings, the images directory and Orca are set up when the first
+chart is made
 """
 
 from __future__ import annotations
 
 import json
 import os
-from typing import TYPE_CHECKING
-
-import plotly.graph_objs as go
-import plotly.io as pio
-from plotly.offline import init_notebook_mode
+from functools import lru_cache
+from typing import List, Optional, Tuple, TYPE_CHECKING
 
 import app_config as cfg
+from benchmark_registry import get_spec
+from metrics import incr, span, timed
+from render_cache import write_if_changed
 
 if TYPE_CHECKING:
-    from prepare_data import Smartphones
+    import plotly.graph_objs as go
+    from prepare_data import DataForPlots, Smartphones
+    from render_cache import RenderCache
+    from renderer import RendererPool
 
+PLOT_SETTINGS_FILE = 'plot_settings.json'
+IMAGES_DIR = 'images'
 
-# make plotly work offline
-init_notebook_mode(connected=True)
+CHART_WIDTH = 1366
+CHART_HEIGHT = 1366
 
-if not os.path.exists('images'):
-    os.mkdir('images')
+# a fixed x axis shared by several charts is a bit longer than the longest
+# bar, like plotly makes it
+X_MARGIN = 1.05
 
-# set a link to the electron app which renders charts
-pio.orca.config.executable = cfg.PATH_TO_ORCA
+# milliseconds a frame of an animated chart is shown
+FRAME_DURATION = 1000
 
-with open('plot_settings.json', 'r', encoding='utf8') as infile:
-    ps = json.load(infile)
+# formats plotly writes by itself, without Orca
+FIGURE_FORMATS = ('json', 'html', 'standalone-html')
+# formats rendered by Orca
+IMAGE_FORMATS = ('png', 'svg', 'jpeg', 'webp', 'pdf')
+FORMATS = IMAGE_FORMATS + FIGURE_FORMATS
 
+# plotly.js shared by all the charts in html format, it's written next to
+# them instead of being embedded into every file
+PLOTLY_JS = 'plotly.min.js'
 
-def make_chart(bench: str, smartphones: Smartphones):
-    print(f'Start preparing data for a {bench} plot...')
-    data_for_plots = smartphones.prepare_data(bench)
-    axes = data_for_plots.get_axes()
+HTML_TEMPLATE = """<html>
+<head>
+<meta charset="utf-8" />
+<style>html, body {{height: 100%; margin: 0;}}</style>
+{script}
+</head>
+<body>
+{div}
+</body>
+</html>
+"""
+
+
+@lru_cache(maxsize=None)
+def load_plot_settings(path: str = PLOT_SETTINGS_FILE) -> dict:
+    """
+    Reads settings of plots, only once per process
+    """
+    with open(path, 'r', encoding='utf8') as infile:
+        return json.load(infile)
+
+
+def __getattr__(name: str):
+    # make_chart.ps used to be read on import, it's read on first use now
+    if name == 'ps':
+        return load_plot_settings()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def chart_settings(bench: str, plot_settings: dict) -> dict:
+    """
+    Gives the title and names of bars of a chart of a benchmark: the ones
+    declared in benchmark_registry.py, overridden by a section of
+    plot_settings.json named after the benchmark if there is one
+
+    Raises ValueError if the section doesn't name every bar
+    """
+    spec = get_spec(bench)
+    settings = {'title': spec.title, 'traces_names': list(spec.trace_names)}
+    settings.update(plot_settings.get(bench, {}))
+    if len(settings['traces_names']) < len(spec.axes):
+        raise ValueError(f'{PLOT_SETTINGS_FILE}: traces_names of {bench!r} '
+                         f'must name {len(spec.axes)} bars: '
+                         f'{", ".join(spec.axes)}')
+    return settings
+
+
+def init_notebook() -> None:
+    """
+    Makes plotly work offline in a Jupyter notebook
+    """
+    from plotly.offline import init_notebook_mode
+
+    init_notebook_mode(connected=True)
 
-    print('Start making the plot...')
+
+@lru_cache(maxsize=None)
+def _configure_orca() -> None:
+    # set a link to the electron app which renders charts
+    import plotly.io as pio
+
+    pio.orca.config.executable = cfg.PATH_TO_ORCA
+
+
+@timed('build_figure')
+def build_figure(bench: str, data_for_plots: DataForPlots) -> go.Figure:
+    """
+    Makes a plotly figure of a benchmark chart
+
+    :param bench: name of a benchmark
+    :param data_for_plots: axes of the chart
+    :return: figure ready to be rendered
+    """
+    import plotly.graph_objs as go
+
+    ps = load_plot_settings()
+    settings = chart_settings(bench, ps)
     axis_length = len(data_for_plots.y_axis_names)
     default_colors = ps['default_bar_colors']
     highlight_colors = ps['highlight_colors']
     traces = []
 
+    # a trace per declared bar even if it has no values, so frames of an
+    # animation always have the same traces
+    x_axes = list(data_for_plots.x_axes)
+    x_axes += [[] for _ in range(len(get_spec(bench).axes) - len(x_axes))]
+
     # We have to change the order of colors in case there are more than two
     # colors needed. Basically we shift list so as them start with the last
     # value instead of the first
-    if data_for_plots.all_axes_used():
+    if len(x_axes) >= 3:
         default_colors = default_colors[-1:] + default_colors[:-1]
         highlight_colors = highlight_colors[-1:] + highlight_colors[:-1]
 
-    for i, value in enumerate(axes[1:]):
-        if not axes[i + 1]:
-            break
+    for i, value in enumerate(x_axes):
         # here we set default colors for each bar at first, then special colors
-        # to highlight smartphones of interest
-        colors = [default_colors[i]] * axis_length
+        # to highlight smartphones of interest. Colors go round if there are
+        # more bars than colors
+        colors = [default_colors[i % len(default_colors)]] * axis_length
+        highlight_color = highlight_colors[i % len(highlight_colors)]
         for smartphone_index in data_for_plots.highlighted_smartphones:
-            colors[smartphone_index] = highlight_colors[i]
+            colors[smartphone_index] = highlight_color
 
         trace = go.Bar(
             x=value,
@@ -66,7 +158,7 @@ def make_chart(bench: str, smartphones: Smartphones):
             textfont={'color': ['#ffffff'] * axis_length,
                       'size': [20] * axis_length},
             textposition='auto',
-            name=ps[bench]['traces_names'][i],
+            name=settings['traces_names'][i],
             orientation='h',
             marker=dict(
                 color=colors
@@ -75,16 +167,179 @@ def make_chart(bench: str, smartphones: Smartphones):
 
         traces.append(trace)
 
-    layout = go.Layout(title=ps[bench]['title'],
+    title = settings['title']
+    if data_for_plots.subtitle:
+        title += f'<br>{data_for_plots.subtitle}'
+    xaxis = dict(tickfont=ps['layout_settings']['tickfont'])
+    # pages of one ranking share the scale, so bars are comparable
+    if data_for_plots.x_max is not None:
+        xaxis['range'] = [0, data_for_plots.x_max]
+
+    layout = go.Layout(title=title,
                        titlefont=ps['layout_settings']['titlefont'],
                        margin=ps['layout_settings']['margin'],
                        barmode='stack',
                        legend=ps['layout_settings']['legend'],
-                       xaxis=dict(tickfont=ps['layout_settings']['tickfont']),
+                       xaxis=xaxis,
                        yaxis=dict(tickfont=ps['layout_settings']['tickfont'],
                                   showticklabels=True))
 
-    fig = go.Figure(data=traces, layout=layout)
-    print(f'Start rendering the {bench} plot...')
-    pio.write_image(fig, f'images/{bench}.png', width=1366, height=1366)
-    print(f'The plot was saved as images/{bench}.png')
+    return go.Figure(data=traces, layout=layout)
+
+
+@timed('build_animation')
+def build_animation(bench: str,
+                    frames: List[Tuple[str, DataForPlots]]) -> go.Figure:
+    """
+    Makes an animated plotly figure of a benchmark chart with a frame per
+    state of the chart, a slider to pick a frame and a button to play them
+
+    :param bench: name of a benchmark
+    :param frames: pairs of a name of a frame and axes of the chart
+    :return: figure which starts with the first frame
+    """
+    import plotly.graph_objs as go
+
+    figures = [(name, build_figure(bench, data_for_plots))
+               for name, data_for_plots in frames]
+
+    def show(names: List[Optional[str]], duration: int) -> dict:
+        # bars are different in every frame, so frames are redrawn
+        return dict(method='animate',
+                    args=[names, {'frame': {'duration': duration,
+                                            'redraw': True},
+                                  'mode': 'immediate',
+                                  'fromcurrent': True}])
+
+    fig = go.Figure(
+        data=figures[0][1].data if figures else [],
+        layout=figures[0][1].layout if figures else {},
+        frames=[go.Frame(data=figure.data, name=name,
+                         layout={'title': figure.layout.title})
+                for name, figure in figures])
+    # Figure.update_layout is missing from plotly 3
+    fig.layout.update(
+        updatemenus=[dict(type='buttons', showactive=False,
+                          buttons=[dict(label='▶',
+                                        **show(None, FRAME_DURATION)),
+                                   dict(label='❚❚', **show([None], 0))])],
+        sliders=[dict(steps=[dict(label=name, **show([name], 0))
+                             for name, _ in figures])])
+    return fig
+
+
+def chart_extension(fmt: str) -> str:
+    """
+    Gives the extension of a file of a chart in a given format
+    """
+    return 'html' if fmt == 'standalone-html' else fmt
+
+
+def chart_path(bench: str, fmt: str = 'png') -> str:
+    """
+    Gives a path to a chart of a benchmark in a given format
+
+    :param bench: name of a benchmark or of a chart, it may contain
+    subdirectories of the images directory
+    """
+    return f'{IMAGES_DIR}/{bench}.{chart_extension(fmt)}'
+
+
+def write_plotlyjs(directory: str = IMAGES_DIR) -> str:
+    """
+    Writes plotly.js used by charts in html format, the file is left alone
+    if it's already there and is the same
+
+    :param directory: directory with charts
+    :return: path to the file
+    """
+    from plotly.offline import get_plotlyjs
+
+    path = os.path.join(directory, PLOTLY_JS)
+    write_if_changed(path, get_plotlyjs().encode('utf8'))
+    return path
+
+
+def figure_to_bytes(fig: go.Figure, fmt: str) -> bytes:
+    """
+    Writes a figure in one of FIGURE_FORMATS, which doesn't need Orca
+
+    :param fig: plotly figure
+    :param fmt: 'json' for the figure itself, 'html' for a page that loads
+    plotly.js from PLOTLY_JS next to it or 'standalone-html' for a page
+    with plotly.js embedded into it
+    :return: content of a file
+    """
+    import plotly.io as pio
+    from plotly.offline import plot
+
+    if fmt == 'json':
+        return pio.to_json(fig).encode('utf8')
+
+    standalone = fmt == 'standalone-html'
+    div = plot(fig, output_type='div', include_plotlyjs=standalone,
+               auto_open=False)
+    script = '' if standalone else f'<script src="{PLOTLY_JS}"></script>'
+    return HTML_TEMPLATE.format(script=script, div=div).encode('utf8')
+
+
+def render_chart(bench: str, data_for_plots: DataForPlots,
+                 renderer: Optional[RendererPool] = None,
+                 cache: Optional[RenderCache] = None,
+                 fmt: str = 'png', name: Optional[str] = None) -> str:
+    """
+    Makes a figure of a benchmark chart and saves it as an image
+
+    :param bench: name of a benchmark
+    :param data_for_plots: axes of the chart
+    :param renderer: pool of Orca servers, if None plotly manages Orca
+    by itself
+    :param cache: cache of rendered images, the figure is rendered only if
+    there is no image of exactly the same figure in the cache
+    :param fmt: one of FORMATS. Formats from FIGURE_FORMATS are written
+    without Orca, so neither the renderer nor the cache is used for them
+    :param name: name of the chart for its path, the name of the benchmark
+    by default
+    :return: path to the image
+    """
+    fig = build_figure(bench, data_for_plots)
+    path = chart_path(name or bench, fmt)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    if fmt in FIGURE_FORMATS:
+        if fmt == 'html':
+            write_plotlyjs(os.path.dirname(path))
+        with span('render'):
+            write_if_changed(path, figure_to_bytes(fig, fmt))
+        return path
+
+    image_format = fmt
+    key = image = None
+    if cache is not None:
+        key = cache.make_key(fig, image_format, CHART_WIDTH, CHART_HEIGHT)
+        image = cache.get(key)
+
+    if image is None:
+        if renderer is None:
+            # plotly starts Orca by itself
+            import plotly.io as pio
+
+            _configure_orca()
+            renderer = pio
+        incr('renders')
+        with span('render'):
+            image = renderer.to_image(fig, format=image_format,
+                                      width=CHART_WIDTH, height=CHART_HEIGHT)
+        if cache is not None:
+            cache.put(key, image)
+
+    write_if_changed(path, image)
+    return path
+
+
+def make_chart(bench: str, smartphones: Smartphones,
+               renderer: Optional[RendererPool] = None,
+               cache: Optional[RenderCache] = None,
+               fmt: str = 'png') -> str:
+    data_for_plots = smartphones.prepare_data(bench)
+    return render_chart(bench, data_for_plots, renderer, cache, fmt)
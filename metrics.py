@@ -0,0 +1,209 @@
+"""
+Module with lightweight instrumentation of a run: named spans which measure
+how long every stage takes and counters of API calls, rows, bytes and cache
+hits
+
+Metrics are disabled by default. When disabled, a span is a shared object
+that does nothing and a counter is a single check of a flag, so
+instrumented code runs as fast as it did without metrics
+
+    with span('download'):
+        ...
+    incr('api_calls')
+
+At the end of a run metrics are written as a JSON report and, optionally,
+in the Prometheus text format
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from functools import wraps
+from typing import Callable, Dict, Optional
+
+# names of metrics in the Prometheus format start with it
+PROMETHEUS_PREFIX = 'ferra_plots'
+
+
+class _NullSpan:
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc_info) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics: Metrics, name: str) -> None:
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self) -> None:
+        if self.metrics.profiler is not None:
+            self.metrics.profiler.enter(self.name)
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+        if self.metrics.profiler is not None:
+            self.metrics.profiler.exit(self.name)
+
+
+class Metrics:
+
+    """
+    Registry of spans and counters of one process, safe to use from
+    several threads
+    """
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        # profiling.Profiler that profiles every span, if any
+        self.profiler = None
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started = time.time()
+            # name -> [count, total seconds, max seconds]
+            self.spans: Dict[str, list] = {}
+            self.counters: Dict[str, float] = {}
+
+    def span(self, name: str):
+        """
+        Measures how long a block of code takes, the same name may be used
+        many times - durations are summed up
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            stats = self.spans.get(name)
+            if stats is None:
+                self.spans[name] = [1, seconds, seconds]
+            else:
+                stats[0] += 1
+                stats[1] += seconds
+                stats[2] = max(stats[2], seconds)
+
+    def incr(self, name: str, value: float = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self) -> dict:
+        """
+        Gives all the metrics as a JSON serializable dict
+        """
+        with self._lock:
+            spans = {name: {'count': count, 'seconds': round(total, 6),
+                            'max_seconds': round(longest, 6)}
+                     for name, (count, total, longest) in self.spans.items()}
+            return {'started': self.started,
+                    'seconds': round(time.time() - self.started, 6),
+                    'spans': spans, 'counters': dict(self.counters)}
+
+    def merge(self, report: Optional[dict]) -> None:
+        """
+        Adds metrics of another process, e.g. of a worker that rendered a
+        chart, given as a report of its Metrics
+        """
+        if not self.enabled or not report:
+            return
+        with self._lock:
+            for name, stats in report['spans'].items():
+                totals = self.spans.setdefault(name, [0, 0.0, 0.0])
+                totals[0] += stats['count']
+                totals[1] += stats['seconds']
+                totals[2] = max(totals[2], stats['max_seconds'])
+            for name, value in report['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_prometheus(self) -> str:
+        """
+        Gives all the metrics in the Prometheus text exposition format
+        """
+        report = self.report()
+        prefix = PROMETHEUS_PREFIX
+        spans = sorted(report['spans'].items())
+        lines = []
+        # samples of one metric have to go together
+        for metric, key, kind in (('span_seconds_total', 'seconds', 'counter'),
+                                  ('span_count_total', 'count', 'counter'),
+                                  ('span_max_seconds', 'max_seconds',
+                                   'gauge')):
+            lines.append(f'# TYPE {prefix}_{metric} {kind}')
+            lines.extend(f'{prefix}_{metric}{{span="{name}"}} {stats[key]}'
+                         for name, stats in spans)
+        for name, value in sorted(report['counters'].items()):
+            lines.append(f'# TYPE {prefix}_{name}_total counter')
+            lines.append(f'{prefix}_{name}_total {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: Optional[str] = None,
+              prometheus_path: Optional[str] = None) -> None:
+        """
+        Writes the JSON report and the Prometheus text to files
+
+        :param path: path to the JSON report
+        :param prometheus_path: path to the Prometheus text
+        :return: None
+        """
+        if path:
+            _write_text(path, json.dumps(self.report(), indent=4,
+                                         sort_keys=True))
+        if prometheus_path:
+            _write_text(prometheus_path, self.to_prometheus())
+
+
+def _write_text(path: str, text: str) -> None:
+    # render_cache imports this module
+    from render_cache import write_if_changed
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    write_if_changed(path, text.encode('utf8'))
+
+
+# metrics of the current process
+METRICS = Metrics()
+
+
+def enable() -> None:
+    METRICS.enabled = True
+
+
+def span(name: str):
+    return METRICS.span(name)
+
+
+def incr(name: str, value: float = 1) -> None:
+    METRICS.incr(name, value)
+
+
+def timed(name: str) -> Callable:
+    """
+    Decorator which measures every call of a function as a span
+    """
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return func(*args, **kwargs)
+            with _Span(METRICS, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
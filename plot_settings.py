@@ -14,25 +14,12 @@ highlight_colors = [
     'rgba(2, 97, 133, 1)'  # dark blue-ish
 ]
 
-geek_bench4 = {'traces_names': ('Все ядра', 'Одно ядро'),
-               'title': 'Мощность процессора (тест GeekBench 4), баллы'}
-
-sling_shot_extreme = {'title': 'Игровая производительность (тест 3DMark Sling Shot Extreme), баллы',
-                      'traces_names': ('баллы',)}
-
-antutu7 = {'title': 'Производительность всей системы (тест Antutu Benchmark 7), баллы',
-           'traces_names': ('баллы',)}
-
-battery_test = {'title': 'Время автономной работы, минуты',
-                'traces_names': ('Чтение', 'Видео', 'Игры')
-                }
+# titles of charts and names of their bars are declared with benchmarks in
+# benchmark_registry.py, a section named after a benchmark overrides them,
+# e.g. plot_setting['antutu7'] = {'title': '...'}
 
 plot_setting['default_bar_colors'] = default_bar_colors
 plot_setting['highlight_colors'] = highlight_colors
-plot_setting['geek_bench4'] = geek_bench4
-plot_setting['sling_shot_extreme'] = sling_shot_extreme
-plot_setting['antutu7'] = antutu7
-plot_setting['battery_test'] = battery_test
 
 layout_settings = {'titlefont': {'size': 36},
                    'margin': {'pad': 15, 'l': 550},
@@ -1,90 +1,86 @@
 from __future__ import annotations
 
-import re
+import heapq
+from bisect import bisect_right
 from dataclasses import dataclass, field
-from datetime import datetime
-from typing import Optional, Dict, Tuple, Type, List
-
-from openpyxl import Workbook
-from gspread_downloader import get_spreadsheet
+from datetime import date, datetime, time
+from operator import attrgetter
+from typing import (Any, Callable, Optional, Dict, Iterable, Tuple, Type,
+                    List, TYPE_CHECKING)
+
+from benchmark_registry import (BENCHMARKS, Antutu7, BatteryTest,  # noqa
+                                Benchmark, GeekBench4, SlingShotExtreme,
+                                plan)
+from data_sources import DataSource, GoogleSheetsSource
+from export import export
+from gspread_downloader import HEADER_ROWS, SheetsClient
+from metrics import incr, timed
+from row_parser import NAME_PATTERN, ParseReport, RowParser
 import app_config as cfg
 
+if TYPE_CHECKING:
+    from catalogue_store import CatalogueStore
+    from sheet_cache import SheetCache
+
 @dataclass
 class DataForPlots:
     """
     Class for storing different lists that represents axes of a plot to
     be rendered and a list with smartphones to be highlighted
+
+    x_axes has a list of values for every stacked bar of a plot, as many
+    as the benchmark declares. The first three of them are also available
+    as x_axis_values, x_axis_values2 and x_axis_values3
+
+    A page of a ranking split into several plots, see facets.py, also has
+    a subtitle and the length of the x axis shared by all its pages
     """
     y_axis_names: List[str] = field(default_factory=list)
-    x_axis_values: List[int] = field(default_factory=list)
-    x_axis_values2: List[Optional[int]] = field(default_factory=list)
-    x_axis_values3: List[Optional[int]] = field(default_factory=list)
+    x_axes: List[List[int]] = field(default_factory=list)
     highlighted_smartphones: List[int] = field(default_factory=list)
+    subtitle: str = ''
+    x_max: Optional[int] = None
+
+    def _x_axis(self, number: int) -> List[int]:
+        return self.x_axes[number] if number < len(self.x_axes) else []
+
+    @property
+    def x_axis_values(self) -> List[int]:
+        return self._x_axis(0)
+
+    @property
+    def x_axis_values2(self) -> List[int]:
+        return self._x_axis(1)
+
+    @property
+    def x_axis_values3(self) -> List[int]:
+        return self._x_axis(2)
 
     def all_axes_used(self) -> bool:
         """
-        Finds out whether there is any empty list among the axes
+        Finds out whether there are names and all three x axes have values
         ot not
         :return: true or false respectively
         """
-        for key, value in self.__dict__.items():
-            if 'axis' in key:
-                if not value:
-                    return False
-        return True
-
-    def get_axes(self) -> Tuple[List[str], List[int], List[Optional[int]],
-                                List[Optional[int]]]:
+        return (bool(self.y_axis_names) and len(self.x_axes) >= 3
+                and all(self.x_axes))
+
+    def get_axes(self) -> Tuple[List[str], List[int], List[int], List[int]]:
         """
-        Get all attributes which represent axes for a plot
+        Get names and the first three x axes of a plot
         :return: tuple of axes
         """
         return (self.y_axis_names, self.x_axis_values, self.x_axis_values2,
                 self.x_axis_values3)
 
 
-class Benchmark:
-
+def _end_of(as_of: Optional[date]) -> Optional[datetime]:
     """
-    Parent class for any benchmark - to gather results of a smarphone in a
-    benchmark
+    Gives the last moment of a date, a moment is left as it is
     """
-
-    name: str = 'Benchmark name here'
-
-    # There would be strings with user-friendly names of subtests for string
-    # representation of an instance of the class
-    subtests: Tuple[str] = ()
-
-    def __init__(self, smartphone: 'Smartphone',
-                 percentage_diff: Optional[str] = None) -> None:
-        self.smartphone = smartphone
-        self.percentage_diff = percentage_diff
-
-    def _get_bench_results(self) -> List[int]:
-        """
-        Returns a list of integers that represent results of a smartphone in
-        subtests of a given benchmark
-        """
-        return [v for (k, v) in self.__dict__.items() if 'score' in k]
-
-    def __str__(self) -> str:
-        """
-        Returns a string that represents vital information about an instance
-        of the class
-        """
-        score_attrs = self._get_bench_results()
-
-        response = (f'Smartphone {self.smartphone.name}, '
-                    f'results in {__class__.name}:\n')
-        response += f'Date: {self.smartphone.date}\n'
-
-        # Concatenate a name of the subtest and the score of a smartphone in
-        # this subtest
-        for name, value in zip(__class__.subtests, score_attrs):
-            response += f'{name}: {value}\n'
-
-        return response
+    if as_of is None or isinstance(as_of, datetime):
+        return as_of
+    return datetime.combine(as_of, time.max)
 
 
 @dataclass
@@ -103,74 +99,6 @@ class TableReadingSettings:
     chip_or_capacity: str
 
 
-class GeekBench4(Benchmark):
-
-    """
-    Class that represents famous mobile GeekBench 4 benchmark
-    """
-
-    name: str = 'GeekBench 4'
-    subtests: Tuple[str] = ('Single-Core Score', 'Multi-Core Score',
-                            'Total Score')
-
-    def __init__(self, smartphone: 'Smartphone', multi_core_score: int = 0,
-                 single_core_score: int = 0) -> None:
-
-        super().__init__(smartphone)
-
-        self.multi_core_score = multi_core_score
-        self.single_core_score = single_core_score
-        self.total_score: int = multi_core_score + single_core_score
-
-
-class SlingShotExtreme(Benchmark):
-    """
-    Class that represents famous mobile 3DMark benchmark, specifically
-    Sling Shot Extreme subtest
-    """
-
-    name: str = '3DMark Sling Shot Extreme'
-    subtests: Tuple[str] = ('Score',)
-
-    def __init__(self, smartphone: 'Smartphone', score: int = 0) -> None:
-        super().__init__(smartphone)
-        self.total_score = score
-
-
-class Antutu7(Benchmark):
-
-    """
-    Class that represents famous mobile Antutu 7 benchmark
-    """
-
-    name: str = 'AnTuTu Benchmark 7'
-    subtests: Tuple[str] = ('Score',)
-
-    def __init__(self, smartphone: 'Smartphone', score: int = 0) -> None:
-        super().__init__(smartphone)
-        self.total_score = score
-
-
-class BatteryTest(Benchmark):
-
-    """
-    Class that represents our own testing of a battery life
-    Score are minutes - how much each smarpthone lasted in each activity
-    """
-
-    name: str = 'Battery Test'
-    subtests: Tuple[str] = ('Read score', 'Movie score', 'Game score',
-                            'Total score')
-
-    def __init__(self, smartphone: 'Smartphone', movie_score: int = 0,
-                 read_score: int = 0, game_score: int = 0):
-        super().__init__(smartphone)
-        self.read_score = read_score
-        self.movie_score = movie_score
-        self.game_score = game_score
-        self.total_score: int = movie_score + read_score + game_score
-
-
 class Smartphone:
 
     """
@@ -178,6 +106,13 @@ class Smartphone:
     and results in benchmarks
     """
 
+    # every declared benchmark has an attribute with results in it
+    __slots__ = ('name', 'date', 'ignore', 'highlight', 'chip',
+                 'battery_capacity') + tuple(BENCHMARKS)
+
+    _bench_classes = tuple((key, spec.bench_class)
+                           for key, spec in BENCHMARKS.items())
+
     def __init__(self, name: str,
                  date: Optional[datetime] = None,
                  highlight: bool = False,
@@ -189,10 +124,8 @@ class Smartphone:
         self.highlight = highlight  # highlight in a plot if True
         self.chip: Optional[str] = None
         self.battery_capacity: Optional[str] = None
-        self.geek_bench4: GeekBench4 = GeekBench4(self)
-        self.sling_shot_extreme: SlingShotExtreme = SlingShotExtreme(self)
-        self.antutu7: Antutu7 = Antutu7(self)
-        self.battery_test = BatteryTest(self)
+        for key, bench_class in self._bench_classes:
+            setattr(self, key, bench_class(self))
 
     def __str__(self) -> str:
         return (f'Smartphone {self.name} on {self.chip} with '
@@ -212,6 +145,17 @@ class Smartphones:
         self.all_smartphones: Dict[str, Smartphone] = {}
         self.highlighted_smartphones: List[Smartphone] = []
 
+        # statistics and bad rows of every sheet that was read
+        self.parse_reports: List[ParseReport] = []
+
+        # smartphones with dates sorted by date and their dates to bisect,
+        # see build_date_index
+        self._date_index: Optional[List[Smartphone]] = None
+        self._index_dates: List[datetime] = []
+
+        # catalogue the smartphones were loaded from, the latest smartphones
+        # are selected with its index until anything else is read
+        self.catalogue: Optional[CatalogueStore] = None
 
     @staticmethod
     def _split_name(raw_name: str) -> Tuple[str, str]:
@@ -223,8 +167,7 @@ class Smartphones:
         and its processor or battery capacity
 
         """
-        regex = re.compile(r'^(.*)\((.*)\)')
-        matches = re.search(regex, raw_name).groups()
+        matches = NAME_PATTERN.search(raw_name).groups()
         name, attr = matches[0].strip(), matches[1].strip()
 
         return name, attr
@@ -234,93 +177,73 @@ class Smartphones:
 
         """
         Method to make different settings for reading different excel sheets
-        and tables with benchmark results
+        and tables with benchmark results, one per declared benchmark
 
         :return: a dictionary with objects of TableReadingSettings class
         """
-
-        geekbench4_trs = TableReadingSettings(sheet_name='GeekBench 4',
-                                              table_start_row=4,
-                                              column_with_name=32,
-                                              columns_after_name=2,
-                                              bench_class=GeekBench4,
-                                              bench_attr='geek_bench4',
-                                              chip_or_capacity='chip')
-
-        sling_shot_extreme_trs = TableReadingSettings(
-            sheet_name='3DMark Sling Shot Extreme',
-            table_start_row=4,
-            column_with_name=29,
-            columns_after_name=1,
-            bench_class=SlingShotExtreme,
-            bench_attr='sling_shot_extreme',
-            chip_or_capacity='chip')
-
-        antutu7_trs = TableReadingSettings(sheet_name='Antutu Benchmark 7',
-                                           table_start_row=4,
-                                           column_with_name=29,
-                                           columns_after_name=1,
-                                           bench_class=Antutu7,
-                                           bench_attr='antutu7',
-                                           chip_or_capacity='chip')
-
-        battery_test_trs = TableReadingSettings(sheet_name='battery_test',
-                                                table_start_row=4,
-                                                column_with_name=34,
-                                                columns_after_name=3,
-                                                bench_class=BatteryTest,
-                                                bench_attr='battery_test',
-                                                chip_or_capacity=
-                                                'battery_capacity')
-
-        trs = {'geek_bench4': geekbench4_trs,
-               'sling_shot_extreme': sling_shot_extreme_trs,
-               'antutu7': antutu7_trs,
-               'battery_test': battery_test_trs}
-
-        return trs
-
-    def _from_benchmark_table(self, trs: 'TableReadingSettings') -> None:
+        return {key: TableReadingSettings(
+                    sheet_name=spec.sheet_name,
+                    table_start_row=spec.table_start_row,
+                    column_with_name=spec.column_with_name,
+                    columns_after_name=len(spec.columns),
+                    bench_class=spec.bench_class,
+                    bench_attr=key,
+                    chip_or_capacity=spec.label_attr)
+                for key, spec in BENCHMARKS.items()}
+
+    def _from_benchmark_table(self, trs: 'TableReadingSettings',
+                              sheet: List[List[str]]) -> None:
 
         """
         Function that read benchmark scores from different sheet of specific
         Excel file
 
         :param trs: instance of the TableReadingSettings class
+        :param sheet: rows of the sheet described by trs
+        """
+        self._from_benchmark_pages(trs, [sheet])
+
+    def _from_benchmark_pages(self, trs: 'TableReadingSettings',
+                              pages: Iterable[List[List[str]]]) -> None:
+
+        """
+        Function that read benchmark scores from a sheet coming page by page,
+        only one page is parsed at a time
+
+        :param trs: instance of the TableReadingSettings class
+        :param pages: consecutive lists of rows of the sheet described by trs
         """
 
         # Get different setting for different benchmarks
         sheet_name, table_start_row, column_with_name, columns_after_name, \
         bench_class, bench_attr, chip_or_capacity = trs.__dict__.values()
 
-        # where my table with results of smartphones begins
-        sheet = get_spreadsheet(sheet_name)
+        # dates of smartphones may change, so the index has to be rebuilt
+        self._date_index = None
+        self._index_dates = []
+        self.catalogue = None
 
-        # read the table row by row to read results, make respective classes
-        for lst in sheet:
+        parser = RowParser(trs, first_row_number=HEADER_ROWS + 1)
+        rows = (row for page in pages for row in parser.parse_batch(page))
 
-            raw_name = lst[2]
+        # read the table row by row to read results, make respective classes
+        for row in rows:
+            name = row.name
 
-            # split name from an additional characteristic in parentheses
-            name, characteristic = self._split_name(raw_name)
             # get a smartphone object from the dict or create new one
-            if name not in self.all_smartphones.keys():
+            smartphone = self.all_smartphones.get(name)
+            if smartphone is None:
                 smartphone = Smartphone(name)
                 self.all_smartphones[name] = smartphone
-                print(f'ADD {name} from {sheet_name}')
-            else:
-                smartphone = self.all_smartphones[name]
-                print(f'UPDATE {name} from {sheet_name}')
 
             # set chip or battery capacity value to a smartphone object
-            setattr(smartphone, chip_or_capacity, characteristic)
+            setattr(smartphone, chip_or_capacity, row.characteristic)
 
             # set date if it hasn't been done yet and if it is possible
-            if not smartphone.date:
-                if lst[1]:
-                    smartphone.date = datetime.strptime(lst[1], '%d.%m.%Y')
+            if not smartphone.date and row.date:
+                smartphone.date = row.date
 
-            action = lst[0]
+            action = row.action
             if action == '+':
                 # highlight the smartphone on plots
                 smartphone.highlight = True
@@ -329,28 +252,40 @@ class Smartphones:
                 # don't show the smartphone on plots
                 smartphone.ignore = True
 
-            # gather results of a benchmark from a row in Excel
-            results = lst[3:-1] if len(lst[3:]) > 1 else [lst[3]]
-            for i, r in enumerate(results):
-                results[i] = int(results[i])
-            bench = bench_class(smartphone, *results)
+            # results of a benchmark from a row in Excel
+            bench = bench_class(smartphone, *row.scores)
             setattr(smartphone, bench_attr, bench)
 
-    def _evaluate_percentage_difference(self, bench, smartphones):
+        report = parser.report
+        self.parse_reports.append(report)
+        incr('rows', report.rows)
+        incr('bad_rows', len(report.errors))
+        # a report of a sheet without bad rows is just noise
+        if report.errors:
+            print(report)
+
+    def _evaluate_percentage_difference(self, bench, smartphones,
+                                        highlighted=None):
+
+        total = plan(bench).total
+        # highlighted smartphones the reference is chosen from, all of them
+        # by default
+        if highlighted is None:
+            highlighted = self.highlighted_smartphones
 
         # for a smartphones to be highlighted we set 100% by default
-        if len(self.highlighted_smartphones) == 1:
-            best_smartphone = self.highlighted_smartphones[0]
-            ref_score = getattr(getattr(best_smartphone, bench), 'total_score')
+        if len(highlighted) == 1:
+            best_smartphone = highlighted[0]
+            ref_score = total(best_smartphone)
 
         # evaluating a smartphone with the best score out of scores of
         # highlighted smartphones
-        elif len(self.highlighted_smartphones) > 1:
-            best_smartphone = self.highlighted_smartphones[0]
-            ref_score = getattr(getattr(best_smartphone, bench), 'total_score')
+        elif len(highlighted) > 1:
+            best_smartphone = highlighted[0]
+            ref_score = total(best_smartphone)
 
-            for s in self.highlighted_smartphones[1:]:
-                score = getattr(getattr(s, bench), 'total_score')
+            for s in highlighted[1:]:
+                score = total(s)
                 if score > ref_score:
                     ref_score = score
                     best_smartphone = s
@@ -359,13 +294,13 @@ class Smartphones:
             # if there is not smartphones to be highlighted, we set 100%
             # just to the one with the highest score in bench
             best_smartphone = smartphones[-1]
-            ref_score = getattr(getattr(smartphones[-1], bench), 'total_score')
+            ref_score = total(smartphones[-1])
 
         # set 100% difference for a reference smartphone
-        setattr(getattr(best_smartphone, bench), 'percentage_diff', '100')
+        getattr(best_smartphone, bench).percentage_diff = '100'
 
         for s in smartphones:
-            score = getattr(getattr(s, bench), 'total_score')
+            score = total(s)
             difference = int(score * 100 / ref_score)
             if score < ref_score:
                 percentage_diff = f'-{100 - difference}'
@@ -373,26 +308,185 @@ class Smartphones:
                 percentage_diff = f'+{difference - 100}'
             else:
                 percentage_diff = str(difference)
-            bench_obj = getattr(s, bench)
-            setattr(bench_obj, 'percentage_diff', percentage_diff)
+            getattr(s, bench).percentage_diff = percentage_diff
 
-    def prepare_data(self, benchmark: str) -> DataForPlots:
+    def build_date_index(self) -> None:
+        """
+        Sorts smartphones with dates by date once, so every following call
+        of prepare_data picks the latest smartphones by walking the index
+        from its end instead of looking through all smartphones
+
+        Smartphones with the same date keep the order they were added in,
+        just like with a stable sort by date. The index is dropped as soon as
+        new sheets are read. The latest smartphones as of any date are found
+        by bisecting the dates of the index, so rankings as of many dates
+        cost little more than one
+        """
+        self._date_index = sorted(
+            (x for x in self.all_smartphones.values() if x.date),
+            key=attrgetter('date'))
+        self._index_dates = [x.date for x in self._date_index]
+
+    def _select_latest(self, benchmark: str, window: Optional[int],
+                       as_of: Optional[datetime] = None) \
+            -> List[Smartphone]:
+        """
+        Selects the latest smartphones by date among ones with results in a
+        benchmark which are not ignored
 
-        # make a list of smartphones with date and values of a benchmark
-        # of interest
-        smartphones = [x for x in self.all_smartphones.values()
-                       if x.date and getattr(
-                getattr(x, benchmark), 'total_score') and not x.ignore]
+        It gives exactly the same smartphones in the same order as a stable
+        sort by date followed by taking the last window items, ties included
 
-        # Sort smartphones by date and take only the last 30 ones otherwise
-        # a plot will be way too big
-        smartphones = sorted(smartphones, key=lambda x: x.date)[-30:]
+        :param benchmark: name of a benchmark
+        :param window: how many smartphones to select, all of them if None
+        :param as_of: select only smartphones dated as of this moment,
+        every smartphone with a date if None
+        :return: list of smartphones sorted by date
+        """
+        if window is not None and window <= 0:
+            return []
+
+        total = plan(benchmark).total
+
+        if self._date_index is not None:
+            end = (len(self._date_index) if as_of is None
+                   else bisect_right(self._index_dates, as_of))
+            latest = []
+            for i in range(end - 1, -1, -1):
+                x = self._date_index[i]
+                if total(x) and not x.ignore:
+                    latest.append(x)
+                    if len(latest) == window:
+                        break
+            latest.reverse()
+            return latest
+
+        if self.catalogue is not None:
+            return [self.all_smartphones[name] for name in
+                    self.catalogue.latest(benchmark, window, as_of)]
+
+        # the last items of a stable sort by date are the largest ones by
+        # date and then by position, so a heap of size window is enough
+        candidates = ((x.date, position, x) for position, x
+                      in enumerate(self.all_smartphones.values())
+                      if x.date and total(x) and not x.ignore
+                      and (as_of is None or x.date <= as_of))
+        if window is None:
+            latest = sorted(candidates, key=lambda c: c[:2], reverse=True)
+        else:
+            latest = heapq.nlargest(window, candidates,
+                                    key=lambda c: c[:2])
+        return [x for _, _, x in reversed(latest)]
+
+    def rank(self, benchmark: str, window: Optional[int] = None,
+             rank_key: Optional[Callable[[Benchmark], Any]] = None,
+             as_of: Optional[date] = None) -> List[Smartphone]:
+        """
+        Ranks smartphones with results in a benchmark which are not ignored
+        and evaluates their percentage difference with the reference one
+
+        :param benchmark: name of a benchmark
+        :param window: rank only that many of the latest smartphones by
+        date, all smartphones if None, with a date or not
+        :param rank_key: function that takes results of a smartphone in the
+        benchmark and returns a key to rank smartphones by, the total score
+        by default
+        :param as_of: rank only smartphones dated as of this date or moment,
+        a date includes the whole day. Scores are the current ones, and only
+        highlighted smartphones ranked are the reference of percentages
+        :return: list of smartphones from the worst to the best
+        """
+        rank_key = rank_key or attrgetter('total_score')
+        bench_plan = plan(benchmark)
+        get_benchmark, total = bench_plan.benchmark, bench_plan.total
 
-        # sort the smartphones by the total score in benchmarks
-        smartphones.sort(key=lambda x: getattr(getattr(x, benchmark),
-                                               'total_score'))
+        if window is None and as_of is None:
+            smartphones = [x for x in self.all_smartphones.values()
+                           if total(x) and not x.ignore]
+        else:
+            # take the latest smartphones with date and values of a
+            # benchmark of interest
+            smartphones = self._select_latest(benchmark, window,
+                                              _end_of(as_of))
+
+        # sort the smartphones by their results in the benchmark
+        smartphones.sort(key=lambda x: rank_key(get_benchmark(x)))
+
+        highlighted = None
+        if as_of is not None:
+            # a past ranking can't refer to a smartphone that didn't exist
+            # yet, so only highlighted smartphones shown in it are the
+            # reference
+            selected = set(smartphones)
+            highlighted = [x for x in self.highlighted_smartphones
+                           if x in selected]
+        if smartphones:
+            self._evaluate_percentage_difference(benchmark, smartphones,
+                                                 highlighted)
+        return smartphones
+
+    @timed('prepare_data')
+    def prepare_data(self, benchmark: str, window: Optional[int] = None,
+                     rank_key: Optional[Callable[[Benchmark], Any]] = None,
+                     as_of: Optional[date] = None) -> DataForPlots:
+        """
+        Prepares axes of a plot of a benchmark
+
+        :param benchmark: name of a benchmark
+        :param window: how many of the latest smartphones to show,
+        cfg.PLOT_WINDOW by default, otherwise a plot will be way too big
+        :param rank_key: function that takes results of a smartphone in the
+        benchmark and returns a key to rank smartphones by, the total score
+        by default
+        :param as_of: show the plot as it was on this date, with the latest
+        smartphones dated as of it. The current plot if None
+        :return: axes of a plot
+        """
+        window = cfg.PLOT_WINDOW if window is None else window
+        return self.make_plot_data(
+            benchmark, self.rank(benchmark, window, rank_key, as_of))
+
+    @timed('prepare_series')
+    def prepare_series(self, benchmark: str, dates: Iterable[date],
+                       window: Optional[int] = None,
+                       rank_key: Optional[Callable[[Benchmark], Any]] = None) \
+            -> List[DataForPlots]:
+        """
+        Prepares axes of plots of a benchmark as they were on several dates,
+        see prepare_data
+
+        The date index is built if there is none and the smartphones aren't
+        linked to a catalogue, so every plot takes a bisect of the index and
+        a walk over the window instead of a pass over all smartphones
+
+        :param benchmark: name of a benchmark
+        :param dates: dates of plots
+        :param window: how many of the latest smartphones to show,
+        cfg.PLOT_WINDOW by default
+        :param rank_key: function to rank smartphones by, see prepare_data
+        :return: axes of a plot for every date, in the order of dates
+        """
+        if self._date_index is None and self.catalogue is None:
+            self.build_date_index()
+        return [self.prepare_data(benchmark, window, rank_key, as_of)
+                for as_of in dates]
 
-        self._evaluate_percentage_difference(benchmark, smartphones)
+    @staticmethod
+    def make_plot_data(benchmark: str, smartphones: List[Smartphone],
+                       ranks: Optional[Iterable[int]] = None) \
+            -> DataForPlots:
+        """
+        Makes axes of a plot of smartphones ranked by Smartphones.rank
+
+        :param benchmark: name of a benchmark
+        :param smartphones: smartphones from the worst to the best
+        :param ranks: places of the smartphones in the ranking, the best
+        one is the first by default
+        :return: axes of a plot
+        """
+        bench_plan = plan(benchmark)
+        if ranks is None:
+            ranks = range(len(smartphones), 0, -1)
 
         data_for_plots = DataForPlots()
 
@@ -401,109 +495,70 @@ class Smartphones:
             if smrtphn.highlight:
                 data_for_plots.highlighted_smartphones.append(i)
 
-        attr = 'chip' if benchmark != 'battery_test' else 'battery_capacity'
-
-        for indx, s in enumerate(smartphones):
-            # return name and chip of a smartphone with it index
-            # according to its performance in GeekBench 4
-            number = len(smartphones) - indx
-            percentage = getattr(getattr(s, benchmark), 'percentage_diff')
-            if indx in data_for_plots.highlighted_smartphones:
-                if percentage == '100':
-                    strng = f'<b>{number}. {s.name} ({getattr(s, attr)})</b>'
-                else:
-                    strng = (f'<b>{number}. {s.name} ({getattr(s, attr)}) '
-                             f'({percentage}%)</b>')
-            else:
-                if percentage == '100':
-                    strng = f'{number}. {s.name} ({getattr(s, attr)})'
-                else:
-                    strng = (f'{number}. {s.name} ({getattr(s, attr)}) '
-                             f'({percentage}%)')
-
+        label, percentage_of = bench_plan.label, bench_plan.percentage
+        for number, s in zip(ranks, smartphones):
+            # return name and chip or battery capacity of a smartphone with
+            # its place according to its performance in the benchmark
+            percentage = percentage_of(s)
+            strng = f'{number}. {s.name} ({label(s)})'
+            if percentage != '100':
+                strng += f' ({percentage}%)'
+            if s.highlight:
+                strng = f'<b>{strng}</b>'
             data_for_plots.y_axis_names.append(strng)
 
-            if benchmark == 'geek_bench4':
-
-                mc_score = getattr(getattr(s, benchmark), 'multi_core_score')
-                data_for_plots.x_axis_values.append(mc_score)
-
-                sc_score = getattr(getattr(s, benchmark), 'single_core_score')
-                data_for_plots.x_axis_values2.append(sc_score)
-
-            elif benchmark == 'sling_shot_extreme' or benchmark == 'antutu7':
-
-                total_score = getattr(getattr(s, benchmark), 'total_score')
-                data_for_plots.x_axis_values.append(total_score)
-
-            elif benchmark == 'battery_test':
-
-                data_for_plots.x_axis_values.append(getattr(
-                    getattr(s, benchmark), 'read_score'))
-                data_for_plots.x_axis_values2.append(getattr(
-                    getattr(s, benchmark), 'movie_score'))
-                data_for_plots.x_axis_values3.append(getattr(
-                    getattr(s, benchmark), 'game_score'))
+        data_for_plots.x_axes = bench_plan.extract_axes(smartphones)
 
         return data_for_plots
 
-    def read_from_excel_book(self) -> None:
+    def read_from_excel_book(self, client: Optional[SheetsClient] = None,
+                             cache: Optional[SheetCache] = None,
+                             offline: bool = False,
+                             max_workers: Optional[int] = None,
+                             page_size: Optional[int] = None,
+                             source: Optional[DataSource] = None) -> None:
         """
-        Read several Excel sheets one by one
+        Download all the sheets and read them one by one
+
+        Sheets are always read in the order benchmarks are declared in
+        benchmark_registry.py, so the result doesn't depend on how the
+        sheets were downloaded or where they were read from
+
+        :param client: client of the spreadsheet, a shared one by default
+        :param cache: cache of sheets to skip downloading of sheets that
+        haven't changed since the last run
+        :param offline: read sheets from the cache only
+        :param max_workers: download sheets concurrently with at most
+        max_workers requests at once instead of one batch request
+        :param page_size: stream every sheet in pages of page_size rows,
+        a page is parsed while the next one is being downloaded. Memory is
+        bounded by a few pages rather than by whole sheets, so sheets are
+        neither cached nor downloaded concurrently in this mode
+        :param source: where to read sheets from instead of the google
+        spreadsheet, e.g. a local workbook or CSV files. Other parameters
+        are ignored if it is given
         :return: None
         """
         trs = self._make_table_reading_settings()
-        for bench in cfg.LIST_OF_BENCHS:
-            self._from_benchmark_table(trs[bench])
+        # every declared benchmark is read, even the ones without charts,
+        # since any sheet may give a smartphone its date or flags
+        settings = list(trs.values())
 
-    def write_to_excel(self) -> None:
+        source = source or GoogleSheetsSource(client=client, cache=cache,
+                                              offline=offline,
+                                              max_workers=max_workers,
+                                              page_size=page_size)
+        for s, pages in source.read(settings):
+            self._from_benchmark_pages(s, pages)
+
+    def write_to_excel(self, dest_filename: str = 'smartphones.xlsx') \
+            -> None:
 
         """
         Save data about smartphones and their benchmark scores to an Excel
-        table
+        table, see export.py for other formats
         """
-
-        smartphones = list(self.all_smartphones.values())
-
-        # Prepare workbook and a sheet
-        wb = Workbook()
-        dest_filename = 'smartphones.xlsx'
-        ws1 = wb.active
-        ws1.title = 'smartphones'
-
-        heading = ["Date", "Smartphone", "Chip", "Battery"]
-
-        # Supplement heading with names of the benchmarks and their subtests
-        benchmark_subclasses = Benchmark.__subclasses__()
-        for bench in benchmark_subclasses:
-            name = getattr(bench, 'name')
-            for subtest in getattr(bench, 'subtests'):
-                heading.append(f'{name}: {subtest} ')
-
-        # Write the heading to the Excel sheet
-        for column, value in zip(range(1, len(heading)+1, 1), heading):
-            ws1.cell(row=1, column=column, value=value)
-
-        # Make a row with the data about a smartphone
-        smartphone_row = []
-        for i, s in enumerate(smartphones):
-            smartphone_row.extend([s.date, s.name, s.chip, s.battery_capacity])
-
-            # Get results of benchmarking a smartphone from its class
-            for bench_name in cfg.LIST_OF_BENCHS:
-                bench = getattr(s, bench_name)
-                for k, v in bench.__dict__.items():
-                    if 'score' in k:
-                        smartphone_row.append(v)
-
-            # Write results of benchmarking of a smartphone to the Excel sheet
-            column_len = (range(1, len(smartphone_row) + 1, 1))
-            for column, value in zip(column_len, smartphone_row):
-                ws1.cell(row=i+2, column=column, value=value)
-            smartphone_row[:] = []
-
-        wb.save(filename=dest_filename)
-        print(f'Wrote down data to {dest_filename}')
+        export(self, dest_filename, fmt='xlsx')
 
 
 def main():
@@ -0,0 +1,258 @@
+"""
+Module with a profiling mode of a run: every stage measured by a span of
+metrics.py - download, parse, prepare_data, build_figure, render - is
+profiled separately and reports are written to a directory
+
+There are two modes:
+
+* deterministic - cProfile and tracemalloc. For every stage it writes
+  {stage}.prof for pstats/snakeviz, {stage}.txt with the functions that
+  took the most time and {stage}.alloc.txt with the peak of traced memory
+  and the lines that allocated the most memory. Snapshots of memory are
+  slow, so allocation sites are taken from the first MEMORY_SPANS spans of
+  a stage only, and plotly is imported before tracing starts so that its
+  modules don't fill every snapshot. Precise, but slows a run down a lot
+* sampling - a background thread looks at stacks of all threads a given
+  number of times per second. For every stage it writes {stage}.folded with
+  collapsed stacks, the input of flamegraph.pl or speedscope, and
+  all.folded for the whole run. Cheap enough for full-size data, memory is
+  not traced in this mode
+
+Only one cProfile profiler may be active at a time, so a stage which starts
+while another one is being profiled, e.g. a page downloaded in the
+background while the previous one is parsed, is counted in the time of the
+stage which started first
+"""
+
+from __future__ import annotations
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+from metrics import METRICS, enable as enable_metrics
+
+# how many functions and allocation sites are put into reports
+TOP = 40
+# allocations are grouped by the line that made them
+TRACEMALLOC_FRAMES = 1
+# how many spans of a stage are compared with snapshots of memory
+MEMORY_SPANS = 3
+
+_TRACEMALLOC = tracemalloc.__file__
+
+
+class _Stage:
+
+    """
+    Everything collected about one stage in the deterministic mode
+    """
+
+    def __init__(self) -> None:
+        self.profile = cProfile.Profile()
+        self.spans = 0
+        # the highest traced memory while the stage was running, in bytes
+        self.peak = 0
+        self.allocations: Counter = Counter()
+        self.allocated_blocks: Counter = Counter()
+
+
+class Profiler:
+
+    """
+    Profiler of stages of a run, see the docstring of the module
+    """
+
+    def __init__(self, directory: str,
+                 sampling_rate: Optional[float] = None) -> None:
+        """
+        :param directory: where to write reports
+        :param sampling_rate: samples per second, the sampling mode is used
+        if it's set and the deterministic mode otherwise
+        """
+        self.directory = directory
+        self.sampling_rate = sampling_rate
+        self._lock = threading.Lock()
+
+        # deterministic mode
+        self._stages: Dict[str, _Stage] = defaultdict(_Stage)
+        self._active: Optional[str] = None
+        self._owner: Optional[int] = None
+        self._snapshots: Dict[int, tracemalloc.Snapshot] = {}
+
+        # sampling mode, stages being run by every thread
+        self._thread_stages: Dict[int, List[str]] = defaultdict(list)
+        self._samples: Dict[str, Counter] = defaultdict(Counter)
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        enable_metrics()
+        METRICS.profiler = self
+        if self.sampling_rate:
+            self._sampler = threading.Thread(target=self._sample_loop,
+                                             name='profiler-sampler',
+                                             daemon=True)
+            self._sampler.start()
+        else:
+            import plotly.graph_objs  # noqa: F401
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+
+    def stop(self) -> None:
+        METRICS.profiler = None
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def __enter__(self) -> Profiler:
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+        self.write()
+
+    def enter(self, name: str) -> None:
+        """
+        Called by a span when a stage starts
+        """
+        thread_id = threading.get_ident()
+        if self.sampling_rate:
+            self._thread_stages[thread_id].append(name)
+            return
+
+        with self._lock:
+            if self._active is not None:
+                return
+            self._active, self._owner = name, thread_id
+        stage = self._stages[name]
+        stage.spans += 1
+        if stage.spans <= MEMORY_SPANS:
+            self._snapshots[thread_id] = tracemalloc.take_snapshot()
+        # Python before 3.9 can't reset the peak, it's the peak of the run
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        stage.profile.enable()
+
+    def exit(self, name: str) -> None:
+        """
+        Called by a span when a stage ends
+        """
+        thread_id = threading.get_ident()
+        if self.sampling_rate:
+            stages = self._thread_stages[thread_id]
+            if stages:
+                stages.pop()
+            return
+
+        with self._lock:
+            if self._active != name or self._owner != thread_id:
+                return
+        stage = self._stages[name]
+        stage.profile.disable()
+        stage.peak = max(stage.peak, tracemalloc.get_traced_memory()[1])
+
+        before = self._snapshots.pop(thread_id, None)
+        if before is not None:
+            after = tracemalloc.take_snapshot()
+            for diff in after.compare_to(before, 'lineno'):
+                site = diff.traceback
+                # the snapshot taken at the start of the span itself
+                if diff.size_diff > 0 and site[0].filename != _TRACEMALLOC:
+                    stage.allocations[site] += diff.size_diff
+                    stage.allocated_blocks[site] += max(diff.count_diff, 0)
+
+        with self._lock:
+            self._active = self._owner = None
+
+    def _sample_loop(self) -> None:
+        interval = 1 / self.sampling_rate
+        own = threading.get_ident()
+        while not self._stop.wait(interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stages = self._thread_stages.get(thread_id)
+                stage = stages[-1] if stages else 'other'
+                self._samples[stage][_collapse(frame)] += 1
+
+    def write(self) -> None:
+        """
+        Writes reports of all stages to the directory
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        if self.sampling_rate:
+            self._write_samples()
+        else:
+            for name, stage in self._stages.items():
+                self._write_stage(name, stage)
+        print(f'Profiles were written to {self.directory}')
+
+    def _path(self, file_name: str) -> str:
+        return os.path.join(self.directory, file_name)
+
+    def _write_stage(self, name: str, stage: _Stage) -> None:
+        stage.profile.dump_stats(self._path(f'{name}.prof'))
+
+        report = io.StringIO()
+        stats = pstats.Stats(stage.profile, stream=report)
+        stats.strip_dirs()
+        report.write(f'Stage {name}, sorted by cumulative time\n')
+        stats.sort_stats('cumulative').print_stats(TOP)
+        report.write(f'Stage {name}, sorted by own time\n')
+        stats.sort_stats('tottime').print_stats(TOP)
+        with open(self._path(f'{name}.txt'), 'w', encoding='utf8') as out:
+            out.write(report.getvalue())
+
+        total = sum(stage.allocations.values())
+        with open(self._path(f'{name}.alloc.txt'), 'w',
+                  encoding='utf8') as out:
+            out.write(f'Stage {name}: {stage.spans} spans, peak of traced '
+                      f'memory {stage.peak / 1024 / 1024:.1f} MiB\n')
+            spans = min(stage.spans, MEMORY_SPANS)
+            out.write(f'{total / 1024:.1f} KiB allocated and still alive at '
+                      f'the end of the first {spans} spans\n\n')
+            for site, size in stage.allocations.most_common(TOP):
+                out.write(f'{size / 1024:.1f} KiB in '
+                          f'{stage.allocated_blocks[site]} blocks\n')
+                for line in site.format(most_recent_first=True):
+                    out.write(f'{line}\n')
+                out.write('\n')
+
+    def _write_samples(self) -> None:
+        everything: Counter = Counter()
+        for name, stacks in self._samples.items():
+            _write_folded(self._path(f'{name}.folded'), stacks)
+            for stack, count in stacks.items():
+                everything[f'{name};{stack}'] += count
+        _write_folded(self._path('all.folded'), everything)
+
+
+def _collapse(frame) -> str:
+    """
+    Makes a line of the collapsed stack format from a frame, the outermost
+    function goes first
+    """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} '
+                     f'({os.path.basename(code.co_filename)}:'
+                     f'{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def _write_folded(path: str, stacks: Counter) -> None:
+    with open(path, 'w', encoding='utf8') as out:
+        for stack, count in stacks.most_common():
+            out.write(f'{stack} {count}\n')
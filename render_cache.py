@@ -0,0 +1,133 @@
+"""
+Module that keeps rendered images of charts on a local disk addressed by a
+hash of the figure they were rendered from, so an unchanged chart doesn't
+have to be rendered again
+"""
+
+import hashlib
+import json
+import os
+from typing import Optional
+
+import app_config as cfg
+from metrics import incr
+
+
+class RenderCache:
+
+    """
+    Cache of rendered images limited by size
+
+    A key is a hash of the fully built figure together with a size and a
+    format of an image, so the same figure always gets the same key no
+    matter in which run or process it was built. The least recently used
+    images are evicted as soon as the cache grows bigger than max_bytes
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None,
+                 max_bytes: Optional[int] = None) -> None:
+        self.cache_dir = cache_dir or cfg.RENDER_CACHE_DIR
+        self.max_bytes = (max_bytes if max_bytes is not None
+                          else cfg.RENDER_CACHE_MAX_BYTES)
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(fig, format: str, width: Optional[int],
+                 height: Optional[int]) -> str:
+        """
+        Makes a stable hash of a figure and parameters of its image
+
+        :param fig: plotly figure or a dict representing one
+        :param format: format of an image
+        :param width: width of an image in pixels
+        :param height: height of an image in pixels
+        :return: hex digest
+        """
+        import plotly
+        from plotly.utils import PlotlyJSONEncoder
+
+        if hasattr(fig, 'to_plotly_json'):
+            fig = fig.to_plotly_json()
+        # plotly.js draws a chart, so a new version may draw it differently
+        content = json.dumps([fig, format, width, height, plotly.__version__],
+                             cls=PlotlyJSONEncoder, sort_keys=True)
+        return hashlib.sha256(content.encode('utf8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Returns a cached image or None if there is no such image
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as infile:
+                image = infile.read()
+        except FileNotFoundError:
+            self.misses += 1
+            incr('render_cache_misses')
+            return None
+
+        # mark the image as recently used
+        os.utime(path)
+        self.hits += 1
+        incr('render_cache_hits')
+        return image
+
+    def put(self, key: str, image: bytes) -> None:
+        """
+        Saves an image to the cache and evicts old images if needed
+        """
+        write_if_changed(self._path(key), image)
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Removes the least recently used images until the cache fits into
+        max_bytes
+        """
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.tmp'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+
+
+def write_if_changed(path: str, content: bytes) -> bool:
+    """
+    Writes content to a file unless the file already has exactly the same
+    content
+
+    :return: True if the file was written
+    """
+    try:
+        with open(path, 'rb') as infile:
+            if infile.read() == content:
+                return False
+    except FileNotFoundError:
+        pass
+
+    # write to a temporary file first so a reader never sees a half
+    # written file
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as outfile:
+        outfile.write(content)
+    os.replace(tmp_path, path)
+    return True
@@ -0,0 +1,250 @@
+"""
+Module that renders charts of several benchmarks in parallel, one process
+per core. Pages of rankings split into several charts, see facets.py, are
+rendered the same way
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from multiprocessing.util import Finalize
+from typing import (Dict, Iterable, List, Optional, Tuple, TYPE_CHECKING,
+                    Union)
+
+import app_config as cfg
+from benchmark_registry import chart_benchmarks
+from make_chart import FIGURE_FORMATS, render_chart
+from metrics import METRICS, enable as enable_metrics
+from render_cache import RenderCache
+from renderer import RendererPool
+
+if TYPE_CHECKING:
+    from columnar import ColumnarSmartphones
+    from prepare_data import DataForPlots, Smartphones
+
+
+@dataclass
+class ChartResult:
+    """
+    Outcome of making one chart
+    """
+    bench: str
+    path: Optional[str] = None
+    seconds: float = 0.0
+    error: Optional[str] = None
+    cache_hit: Optional[bool] = None
+    # metrics of a worker process that made the chart
+    metrics: Optional[dict] = None
+    # name of the chart if it isn't the name of the benchmark, e.g. of a
+    # page of a ranking
+    name: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+# Orca servers and a render cache of a worker process, they live as long as
+# the process
+_worker_renderer: Optional[RendererPool] = None
+_worker_cache: Optional[RenderCache] = None
+
+
+def _init_worker(cache: Optional[RenderCache],
+                 metrics_enabled: bool) -> None:
+    """
+    Makes a pool of Orca servers of a worker process which is shut down
+    when the process exits
+    """
+    global _worker_renderer, _worker_cache
+    _worker_cache = cache
+    if metrics_enabled:
+        enable_metrics()
+    _worker_renderer = RendererPool(size=1)
+    Finalize(None, _worker_renderer.shutdown, exitpriority=10)
+
+
+def _render(bench: str, data_for_plots: DataForPlots,
+            renderer: Optional[RendererPool],
+            cache: Optional[RenderCache], fmt: str = 'png',
+            name: Optional[str] = None) -> ChartResult:
+    """
+    Renders one chart, an error is returned instead of being raised so it
+    doesn't affect other charts
+    """
+    start = time.perf_counter()
+    hits = cache.hits if cache is not None else 0
+    try:
+        path = render_chart(bench, data_for_plots, renderer, cache, fmt,
+                            name)
+    except Exception:
+        return ChartResult(bench, seconds=time.perf_counter() - start,
+                           error=traceback.format_exc(), name=name)
+
+    # a process renders one chart at a time, so any new hit is this chart's
+    cache_hit = cache.hits > hits if cache is not None else None
+    return ChartResult(bench, path, time.perf_counter() - start,
+                       cache_hit=cache_hit, name=name)
+
+
+def _render_in_worker(bench: str, data_for_plots: DataForPlots, fmt: str,
+                      name: Optional[str] = None) -> ChartResult:
+    # metrics of every chart are sent back to the main process with it
+    METRICS.reset()
+    result = _render(bench, data_for_plots, _worker_renderer, _worker_cache,
+                     fmt, name)
+    if METRICS.enabled:
+        result.metrics = METRICS.report()
+    return result
+
+
+def _report(result: ChartResult, done: int, total: int) -> None:
+    name = result.name or result.bench
+    if result.ok:
+        source = ' from the render cache' if result.cache_hit else ''
+        print(f'[{done}/{total}] {name}: saved as {result.path}'
+              f'{source} in {result.seconds:.2f} s')
+    else:
+        print(f'[{done}/{total}] {name}: FAILED\n{result.error}')
+
+
+def render_charts(smartphones: Union[Smartphones, ColumnarSmartphones],
+                  benches: Optional[Iterable[str]] = None,
+                  max_workers: Optional[int] = None,
+                  cache: Optional[RenderCache] = None,
+                  fmt: str = 'png') -> List[ChartResult]:
+    """
+    Makes charts of several benchmarks
+
+    Data for every chart is prepared up front in this process, after that
+    the figures are built and rendered by a pool of processes. A chart that
+    fails doesn't stop the others
+
+    :param smartphones: smartphones with results of benchmarks, either
+    objects or their columnar store
+    :param benches: names of benchmarks to make charts of,
+    chart_benchmarks() by default
+    :param max_workers: number of processes, one per core by default. With
+    a single worker charts are rendered in this process
+    :param cache: cache of rendered images, charts are always rendered
+    if None
+    :param fmt: format of charts, see make_chart.FORMATS. Formats that
+    don't need Orca are always written in this process, it takes less time
+    than starting other processes
+    :return: results of making every chart in the order of benches
+    """
+    benches = list(chart_benchmarks() if benches is None else benches)
+    total = len(benches)
+    results: Dict[str, ChartResult] = {}
+
+    prepared: Dict[str, Tuple[str, DataForPlots]] = {}
+    for bench in benches:
+        try:
+            prepared[bench] = (bench, smartphones.prepare_data(bench))
+        except Exception:
+            results[bench] = ChartResult(bench, error=traceback.format_exc())
+            _report(results[bench], len(results), total)
+
+    results.update(_render_all(prepared, max_workers, cache, fmt,
+                               len(results), total))
+
+    failed = [r.bench for r in results.values() if not r.ok]
+    print(f'Made {total - len(failed)} of {total} charts'
+          + (f', failed: {", ".join(failed)}' if failed else ''))
+    _report_cache(results.values(), cache, fmt)
+
+    return [results[bench] for bench in benches]
+
+
+def render_pages(pages: Dict[str, Tuple[str, DataForPlots]],
+                 max_workers: Optional[int] = None,
+                 cache: Optional[RenderCache] = None,
+                 fmt: str = 'png') -> List[ChartResult]:
+    """
+    Makes charts whose data is already prepared, e.g. pages of rankings
+
+    :param pages: dict where a key is a name of a chart, its path in the
+    images directory without an extension, and a value is the name of its
+    benchmark and its axes
+    :param max_workers: number of processes, see render_charts
+    :param cache: cache of rendered images, see render_charts
+    :param fmt: format of charts, see render_charts
+    :return: results of making every chart in the order of pages
+    """
+    results = _render_all(pages, max_workers, cache, fmt, 0, len(pages))
+
+    failed = [name for name, r in results.items() if not r.ok]
+    print(f'Made {len(pages) - len(failed)} of {len(pages)} charts'
+          + (f', failed: {", ".join(failed)}' if failed else ''))
+    _report_cache(results.values(), cache, fmt)
+
+    return [results[name] for name in pages]
+
+
+def _render_all(charts: Dict[str, Tuple[str, DataForPlots]],
+                max_workers: Optional[int], cache: Optional[RenderCache],
+                fmt: str, done: int, total: int) -> Dict[str, ChartResult]:
+    """
+    Renders charts in this process or in a pool of processes
+
+    :param charts: dict where a key is a name of a chart and a value is the
+    name of its benchmark and its axes
+    :param done: number of charts already reported, for progress
+    :param total: number of charts to report progress of
+    :return: dict where a key is a name of a chart and a value is the
+    result of making it
+    """
+    results: Dict[str, ChartResult] = {}
+    max_workers = max_workers or cfg.RENDER_WORKERS or os.cpu_count() or 1
+    max_workers = min(max_workers, len(charts)) or 1
+    if fmt in FIGURE_FORMATS:
+        max_workers, cache = 1, None
+
+    # a chart named after its benchmark is reported by that name
+    def name_of(name: str, bench: str) -> Optional[str]:
+        return None if name == bench else name
+
+    if max_workers == 1:
+        with RendererPool(size=1) as renderer:
+            for name, (bench, data_for_plots) in charts.items():
+                results[name] = _render(bench, data_for_plots, renderer,
+                                        cache, fmt, name_of(name, bench))
+                _report(results[name], done + len(results), total)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers,
+                                 initializer=_init_worker,
+                                 initargs=(cache,
+                                           METRICS.enabled)) as executor:
+            futures = {executor.submit(_render_in_worker, bench,
+                                       data_for_plots, fmt,
+                                       name_of(name, bench)): name
+                       for name, (bench, data_for_plots) in charts.items()}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    results[name] = future.result()
+                except BrokenProcessPool:
+                    bench = charts[name][0]
+                    results[name] = ChartResult(
+                        bench, error='Worker process died unexpectedly',
+                        name=name_of(name, bench))
+                METRICS.merge(results[name].metrics)
+                _report(results[name], done + len(results), total)
+    return results
+
+
+def _report_cache(results: Iterable[ChartResult],
+                  cache: Optional[RenderCache], fmt: str) -> None:
+    # charts in FIGURE_FORMATS don't use the cache
+    if cache is not None and fmt not in FIGURE_FORMATS:
+        # workers count hits in their own copies of the cache, so the totals
+        # are gathered from the results
+        results = list(results)
+        hits = sum(1 for r in results if r.cache_hit)
+        misses = sum(1 for r in results if r.cache_hit is False)
+        print(f'Render cache: {hits} hits, {misses} misses')
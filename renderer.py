@@ -0,0 +1,210 @@
+"""
+Module that keeps long-lived Orca processes running in server mode and
+renders plotly figures with them, so the Electron app starts once per run
+instead of once per chart
+"""
+
+import json
+import os
+import queue
+import socket
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import List, Optional
+
+import app_config as cfg
+
+
+class RenderError(Exception):
+    """
+    Raised when a figure can't be rendered even by a freshly started server
+    """
+
+
+def _find_free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+class OrcaServer:
+
+    """
+    One Orca process which renders figures sent to it over a local http
+    connection
+    """
+
+    def __init__(self, executable: str, timeout: float) -> None:
+        self.executable = executable
+        self.timeout = timeout
+        self.port: Optional[int] = None
+        self.process: Optional[subprocess.Popen] = None
+
+    @property
+    def url(self) -> str:
+        return f'http://localhost:{self.port}'
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def start(self) -> None:
+        """
+        Launches the process and waits until it answers to a ping
+        """
+        import plotly.io as pio
+
+        self.port = _find_free_port()
+        cmd = [self.executable, 'serve', '-p', str(self.port),
+               '--plotly', pio.orca.config.plotlyjs, '--graph-only']
+        self.process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL,
+                                        stderr=subprocess.DEVNULL)
+
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            if not self.is_alive():
+                break
+            try:
+                with urllib.request.urlopen(f'{self.url}/ping', timeout=1):
+                    return
+            except OSError:
+                time.sleep(0.1)
+
+        self.stop()
+        raise RenderError(f'Orca server did not start in {self.timeout} s')
+
+    def stop(self) -> None:
+        """
+        Terminates the process, kills it if it doesn't exit in time
+        """
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+
+    def restart(self) -> None:
+        self.stop()
+        self.start()
+
+    def render(self, figure_json: bytes) -> bytes:
+        """
+        Sends a figure to the process and returns the rendered image
+
+        :param figure_json: JSON with a figure and parameters of an image
+        :return: bytes of the image
+        """
+        request = urllib.request.Request(
+            f'{self.url}/', data=figure_json,
+            headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return response.read()
+
+
+class RendererPool:
+
+    """
+    Pool of Orca servers
+
+    Servers are started on the first figure to render, so a run that
+    doesn't need to render anything doesn't start Orca at all, and they are
+    stopped when the pool is exited as a context manager. A server that
+    crashed or didn't answer in time is restarted and the figure is sent to
+    it once again
+    """
+
+    def __init__(self, size: Optional[int] = None,
+                 executable: Optional[str] = None,
+                 timeout: Optional[float] = None) -> None:
+        self.size = size or cfg.RENDERER_POOL_SIZE
+        self.executable = executable or cfg.PATH_TO_ORCA
+        self.timeout = timeout or cfg.RENDER_TIMEOUT
+        self._servers: List[OrcaServer] = []
+        self._idle: 'queue.Queue[OrcaServer]' = queue.Queue()
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> 'RendererPool':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.shutdown()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._servers:
+                return
+            for _ in range(self.size):
+                server = OrcaServer(self.executable, self.timeout)
+                server.start()
+                self._servers.append(server)
+                self._idle.put(server)
+        print(f'Started {self.size} Orca server(s)')
+
+    def shutdown(self) -> None:
+        for server in self._servers:
+            server.stop()
+        self._servers.clear()
+        self._idle = queue.Queue()
+
+    def to_image(self, fig, format: str = 'png', width: Optional[int] = None,
+                 height: Optional[int] = None,
+                 scale: Optional[float] = None) -> bytes:
+        """
+        Renders a figure with the first idle server of the pool
+
+        :param fig: plotly figure or a dict representing one
+        :param format: format of an image, any format Orca supports
+        :param width: width of an image in pixels
+        :param height: height of an image in pixels
+        :param scale: scale factor of an image
+        :return: bytes of the image
+        """
+        from plotly.utils import PlotlyJSONEncoder
+
+        params = {'figure': fig, 'format': format, 'width': width,
+                  'height': height, 'scale': scale}
+        figure_json = json.dumps({k: v for k, v in params.items()
+                                  if v is not None},
+                                 cls=PlotlyJSONEncoder).encode('utf8')
+
+        self.start()
+        server = self._idle.get()
+        try:
+            if not server.is_alive():
+                server.restart()
+            try:
+                return server.render(figure_json)
+            except urllib.error.HTTPError as e:
+                # the server is fine, it just can't render this figure
+                raise RenderError(f'Orca failed to render a figure: {e}')
+            except OSError:
+                # the server crashed or hung, give the figure one more try
+                # with a fresh process
+                server.restart()
+                try:
+                    return server.render(figure_json)
+                except OSError as e:
+                    raise RenderError(f'Orca failed to render a figure: {e}')
+        finally:
+            self._idle.put(server)
+
+    def write_image(self, fig, file: str, format: Optional[str] = None,
+                    width: Optional[int] = None, height: Optional[int] = None,
+                    scale: Optional[float] = None) -> None:
+        """
+        Renders a figure and saves it to a file, the same way as
+        plotly.io.write_image does
+        """
+        if format is None:
+            format = os.path.splitext(file)[1].lstrip('.') or 'png'
+        image = self.to_image(fig, format=format, width=width, height=height,
+                              scale=scale)
+        with open(file, 'wb') as outfile:
+            outfile.write(image)
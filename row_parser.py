@@ -0,0 +1,175 @@
+"""
+Module that parses rows of tables with results of benchmarks
+
+Patterns are compiled once, dates are memoized since sheets repeat the same
+dates over and over, and a row that can't be parsed is put into a report
+instead of stopping the whole run
+"""
+
+from __future__ import annotations
+
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Optional, TYPE_CHECKING
+
+from metrics import span
+
+if TYPE_CHECKING:
+    from prepare_data import TableReadingSettings
+
+# 'Nokia 1 (Snapdragon 450)' -> 'Nokia 1 ', 'Snapdragon 450'
+NAME_PATTERN = re.compile(r'^(.*)\((.*)\)')
+
+DATE_FORMAT = '%d.%m.%Y'
+
+
+@lru_cache(maxsize=4096)
+def parse_date(value: str) -> datetime:
+    return datetime.strptime(value, DATE_FORMAT)
+
+
+@dataclass
+class ParsedRow:
+    """
+    One row of a table with results of a smartphone in a benchmark
+    """
+    action: str
+    date: Optional[datetime]
+    name: str
+    characteristic: str
+    scores: List[int]
+
+
+@dataclass
+class RowError:
+    """
+    A row that couldn't be parsed or was parsed only partially
+    """
+    row_number: int
+    row: List[str]
+    reason: str
+    skipped: bool = True
+
+    def __str__(self) -> str:
+        outcome = 'skipped' if self.skipped else 'read partially'
+        return f'row {self.row_number} {outcome}: {self.reason} {self.row}'
+
+
+@dataclass
+class ParseReport:
+    """
+    Statistics and errors of parsing one sheet
+    """
+    sheet_name: str
+    rows: int = 0
+    parsed: int = 0
+    seconds: float = 0.0
+    errors: List[RowError] = field(default_factory=list)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        lines = [f'{self.sheet_name}: {self.parsed} of {self.rows} rows '
+                 f'read in {self.seconds:.3f} s '
+                 f'({self.rows_per_second:,.0f} rows/s)']
+        lines.extend(f'  {error}' for error in self.errors)
+        return '\n'.join(lines)
+
+
+class RowParser:
+
+    """
+    Parser of rows of one sheet
+
+    Every row looks like [action, date, 'Name (Chip)', score, ...]. A row
+    with a malformed name or scores is skipped, a row with a malformed date
+    is read without a date. Both are put into the report
+    """
+
+    def __init__(self, trs: TableReadingSettings,
+                 first_row_number: int = 1) -> None:
+        """
+        :param trs: settings of reading the sheet
+        :param first_row_number: number of the first row to be parsed in
+        the sheet, to point at bad rows in the report
+        """
+        self.max_scores = trs.columns_after_name
+        self.report = ParseReport(trs.sheet_name)
+        self._row_number = first_row_number
+
+    def parse(self, rows: Iterable[List[str]]) -> Iterator[ParsedRow]:
+        """
+        Parses rows one by one, rows may come from a generator
+
+        :param rows: rows of the sheet
+        :return: iterator over rows that were parsed
+        """
+        report = self.report
+        errors = report.errors
+        max_scores = self.max_scores
+        search_name = NAME_PATTERN.search
+
+        for row in rows:
+            row_number = self._row_number
+            self._row_number += 1
+
+            # blank rows are just skipped
+            if not any(row):
+                continue
+            report.rows += 1
+
+            if len(row) < 4:
+                errors.append(RowError(row_number, row, 'too few cells'))
+                continue
+
+            matches = search_name(str(row[2]))
+            if matches is None:
+                errors.append(RowError(row_number, row,
+                                       f'no chip or battery capacity in '
+                                       f'parentheses: {row[2]!r}'))
+                continue
+
+            # the last column is a total score, unless it's the only one
+            raw_scores = row[3:-1] if len(row) > 4 else row[3:]
+            if len(raw_scores) > max_scores:
+                errors.append(RowError(row_number, row,
+                                       f'more than {max_scores} scores'))
+                continue
+            try:
+                scores = list(map(int, raw_scores))
+            except (TypeError, ValueError) as e:
+                errors.append(RowError(row_number, row, f'bad score: {e}'))
+                continue
+
+            # local workbooks may have real dates instead of strings, and
+            # numbers in cells that aren't dates at all
+            date = row[1] or None
+            if date and not isinstance(date, datetime):
+                try:
+                    date = parse_date(date)
+                except (TypeError, ValueError) as e:
+                    errors.append(RowError(row_number, row,
+                                           f'bad date: {e}', skipped=False))
+                    date = None
+
+            report.parsed += 1
+            yield ParsedRow(row[0], date, matches.group(1).strip(),
+                            matches.group(2).strip(), scores)
+
+    def parse_batch(self, rows: Iterable[List[str]]) -> List[ParsedRow]:
+        """
+        Parses a batch of rows at once and measures how long it took
+
+        :param rows: rows of the sheet
+        :return: list of rows that were parsed
+        """
+        start = time.perf_counter()
+        with span('parse'):
+            parsed = list(self.parse(rows))
+        self.report.seconds += time.perf_counter() - start
+        return parsed
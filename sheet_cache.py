@@ -0,0 +1,137 @@
+"""
+Module that keeps snapshots of sheets of the spreadsheet on a local disk, so
+a sheet doesn't have to be downloaded again until somebody changes the
+spreadsheet
+"""
+
+import hashlib
+import json
+import os
+import time
+from typing import List, Optional
+
+import app_config as cfg
+from metrics import incr
+
+
+class CacheMissError(LookupError):
+    """
+    Raised when a sheet is needed in offline mode but isn't in the cache
+    """
+
+
+class SheetCache:
+
+    """
+    Persistent cache of sheets keyed by spreadsheet ID and sheet name
+
+    Every entry is a file of two lines: a JSON header with the modified time
+    of the spreadsheet and a checksum of the payload, then the payload itself
+    - rows of the sheet as JSON. An entry which doesn't match its checksum is
+    treated as corrupted and removed. Entries older than max_age seconds are
+    evicted, and the least recently used entries are evicted as soon as the
+    cache grows bigger than max_bytes
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None,
+                 max_bytes: Optional[int] = None,
+                 max_age: Optional[float] = None) -> None:
+        self.cache_dir = cache_dir or cfg.CACHE_DIR
+        self.max_bytes = (max_bytes if max_bytes is not None
+                          else cfg.CACHE_MAX_BYTES)
+        self.max_age = (max_age if max_age is not None
+                        else cfg.CACHE_MAX_AGE_DAYS * 24 * 60 * 60)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, spreadsheet_id: str, sheet_name: str) -> str:
+        key = f'{spreadsheet_id}\n{sheet_name}'.encode('utf8')
+        return os.path.join(self.cache_dir,
+                            hashlib.sha1(key).hexdigest() + '.json')
+
+    def get(self, spreadsheet_id: str, sheet_name: str,
+            modified_time: Optional[str] = None) -> Optional[List[List[str]]]:
+        """
+        Returns rows of a cached sheet
+
+        :param spreadsheet_id: ID of the spreadsheet
+        :param sheet_name: name of the sheet
+        :param modified_time: current modified time of the spreadsheet, the
+        entry is returned only if it was cached at the same time. If None,
+        the entry is returned regardless of its modified time
+        :return: list of rows or None if there is no valid entry
+        """
+        path = self._path(spreadsheet_id, sheet_name)
+        try:
+            with open(path, 'rb') as infile:
+                header, payload = infile.read().split(b'\n', 1)
+            header = json.loads(header)
+        except (OSError, ValueError):
+            self._remove(path)
+            incr('sheet_cache_misses')
+            return None
+
+        if hashlib.sha256(payload).hexdigest() != header.get('checksum'):
+            print(f'Cached sheet {sheet_name} is corrupted, dropping it')
+            self._remove(path)
+            incr('sheet_cache_misses')
+            return None
+
+        if (modified_time is not None
+                and header.get('modified_time') != modified_time):
+            incr('sheet_cache_misses')
+            return None
+
+        # mark the entry as recently used
+        os.utime(path)
+        incr('sheet_cache_hits')
+        return json.loads(payload)
+
+    def put(self, spreadsheet_id: str, sheet_name: str,
+            modified_time: Optional[str], rows: List[List[str]]) -> None:
+        """
+        Saves rows of a sheet to the cache
+        """
+        payload = json.dumps(rows, ensure_ascii=False).encode('utf8')
+        header = json.dumps({'spreadsheet_id': spreadsheet_id,
+                             'sheet_name': sheet_name,
+                             'modified_time': modified_time,
+                             'checksum': hashlib.sha256(payload).hexdigest()},
+                            ensure_ascii=False).encode('utf8')
+
+        # write to a temporary file first so a reader never sees a half
+        # written entry
+        path = self._path(spreadsheet_id, sheet_name)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as outfile:
+            outfile.write(header + b'\n' + payload)
+        os.replace(tmp_path, path)
+
+    def evict(self) -> None:
+        """
+        Removes entries that are too old, then the least recently used ones
+        until the cache fits into max_bytes
+        """
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith('.json'):
+                continue
+            stat = entry.stat()
+            if now - stat.st_mtime > self.max_age:
+                self._remove(entry.path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_bytes:
+                break
+            self._remove(path)
+            total_size -= size
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,13 @@
+import pytest
+
+from benchmarks.synthetic import make_client
+from data_sources import GoogleSheetsSource
+from prepare_data import Smartphones
+
+
+@pytest.fixture(scope='module')
+def smartphones():
+    smartphones = Smartphones()
+    smartphones.read_from_excel_book(
+        source=GoogleSheetsSource(client=make_client(2000)))
+    return smartphones
@@ -0,0 +1,43 @@
+import pytest
+
+import app_config as cfg
+from benchmark_registry import (BENCHMARKS, UnknownBenchmark,
+                                chart_benchmarks, plan)
+from make_chart import chart_settings
+
+
+def test_all_benchmarks_are_charted_by_default(monkeypatch):
+    monkeypatch.setattr(cfg, 'LIST_OF_BENCHS', [])
+    assert chart_benchmarks() == list(BENCHMARKS)
+
+
+def test_unknown_benchmark_is_reported_with_declared_ones(monkeypatch):
+    monkeypatch.setattr(cfg, 'LIST_OF_BENCHS', ['antutu7', 'geekbench4'])
+    with pytest.raises(UnknownBenchmark) as error:
+        chart_benchmarks()
+    assert 'geekbench4' in str(error.value)
+    assert all(key in str(error.value) for key in BENCHMARKS)
+
+    with pytest.raises(UnknownBenchmark):
+        plan('geekbench4')
+
+
+def test_override_must_name_every_bar():
+    override = {'battery_test': {'traces_names': ['Чтение', 'Видео']}}
+    with pytest.raises(ValueError, match='battery_test'):
+        chart_settings('battery_test', override)
+
+    override = {'battery_test': {'title': 'Батарея'}}
+    settings = chart_settings('battery_test', override)
+    assert settings['title'] == 'Батарея'
+    assert settings['traces_names'] == list(
+        BENCHMARKS['battery_test'].trace_names)
+
+
+def test_results_take_scores_in_the_order_of_columns():
+    results = BENCHMARKS['geek_bench4'].bench_class(None, 3000, 900)
+    assert (results.multi_core_score, results.single_core_score,
+            results.total_score) == (3000, 900, 3900)
+    assert BENCHMARKS['geek_bench4'].bench_class(None).total_score == 0
+    with pytest.raises(TypeError):
+        BENCHMARKS['antutu7'].bench_class(None, 1, 2)
@@ -0,0 +1,93 @@
+import threading
+from http import HTTPStatus
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+from benchmarks.synthetic import make_client
+from chart_service import ChartHTTPServer, ChartService
+from data_sources import GoogleSheetsSource
+from prepare_data import Smartphones
+
+
+class FakeRenderer:
+
+    def to_image(self, fig, format, width, height) -> bytes:
+        return f'{format} {width}x{height}'.encode('utf8')
+
+    def shutdown(self) -> None:
+        pass
+
+
+@pytest.fixture(scope='module')
+def url():
+    service = ChartService(
+        source=GoogleSheetsSource(client=make_client(400)),
+        renderer=FakeRenderer(), refresh_interval=0)
+    service.start()
+    server = ChartHTTPServer(('127.0.0.1', 0), service)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+    service.stop()
+
+
+def status(url: str) -> int:
+    try:
+        with urlopen(url) as response:
+            return response.status
+    except HTTPError as e:
+        return e.code
+
+
+def test_charts_and_client_errors(url):
+    assert status(f'{url}/chart/geek_bench4') == HTTPStatus.OK
+    assert status(f'{url}/chart/geek_bench4.json') == HTTPStatus.OK
+    assert status(f'{url}/chart/geekbench4') == HTTPStatus.NOT_FOUND
+    assert status(f'{url}/chart/geek_bench4.gif') == HTTPStatus.BAD_REQUEST
+    assert (status(f'{url}/chart/geek_bench4?width=0')
+            == HTTPStatus.BAD_REQUEST)
+
+
+@pytest.mark.parametrize('error', [KeyError('total_score'),
+                                   ValueError('bad value')])
+def test_bugs_are_server_errors(url, monkeypatch, error):
+    def prepare_data(self, bench, *args, **kwargs):
+        raise error
+
+    monkeypatch.setattr(Smartphones, 'prepare_data', prepare_data)
+    # a size that isn't cached yet, so the chart is made again
+    assert (status(f'{url}/chart/antutu7?width={len(str(error))}')
+            == HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
+def test_request_missing_the_cache_during_a_render_does_not_render():
+    service = ChartService(
+        source=GoogleSheetsSource(client=make_client(400)),
+        renderer=FakeRenderer(), refresh_interval=0)
+    service.start()
+    get = service.images.get
+    missed, rendered = threading.Event(), threading.Event()
+
+    def late_get(key):
+        # the second request misses the cache and waits until the first
+        # one has rendered the chart and left _in_flight
+        content = get(key)
+        if threading.current_thread().name == 'late':
+            missed.set()
+            rendered.wait()
+        return content
+
+    service.images.get = late_get
+    late = threading.Thread(target=service.get_chart, args=('antutu7',),
+                            name='late')
+    late.start()
+    missed.wait()
+    first = service.get_chart('antutu7')
+    rendered.set()
+    late.join()
+    service.stop()
+    assert first and service.renders == 1
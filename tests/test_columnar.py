@@ -0,0 +1,40 @@
+import pytest
+
+from benchmark_registry import BENCHMARKS
+from benchmarks.synthetic import FakeSheetsService, make_sheets
+from columnar import ColumnarSmartphones
+from data_sources import GoogleSheetsSource
+from gspread_downloader import HEADER_ROWS, RequestScheduler, SheetsClient
+from prepare_data import Smartphones
+
+
+@pytest.mark.parametrize('bench', list(BENCHMARKS))
+def test_columnar_data_is_the_same(smartphones, bench):
+    columnar = ColumnarSmartphones.from_smartphones(smartphones)
+    assert columnar.prepare_data(bench) == smartphones.prepare_data(bench)
+
+    def rank_key(results):
+        return -results.total_score
+
+    expected = smartphones.prepare_data(bench, rank_key=rank_key)
+    assert expected != smartphones.prepare_data(bench)
+    assert columnar.prepare_data(bench, rank_key=rank_key) == expected
+
+
+def test_benchmark_without_scores_gives_empty_data():
+    sheets = make_sheets(200)
+    # only the header rows of the sheet are left
+    del sheets[BENCHMARKS['antutu7'].sheet_name][HEADER_ROWS:]
+    client = SheetsClient(spreadsheet_id='synthetic',
+                          service=FakeSheetsService(sheets),
+                          scheduler=RequestScheduler(quota=0))
+    smartphones = Smartphones()
+    smartphones.read_from_excel_book(source=GoogleSheetsSource(client=client))
+    for s in smartphones.highlighted_smartphones:
+        s.highlight = False
+    smartphones.highlighted_smartphones.clear()
+
+    expected = smartphones.prepare_data('antutu7')
+    assert not expected.y_axis_names
+    columnar = ColumnarSmartphones.from_smartphones(smartphones)
+    assert columnar.prepare_data('antutu7') == expected
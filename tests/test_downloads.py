@@ -0,0 +1,59 @@
+import time
+
+from benchmark_registry import BENCHMARKS
+from benchmarks.synthetic import FakeSheetsService, make_sheets
+from data_sources import GoogleSheetsSource
+from gspread_downloader import RequestScheduler, SheetsClient
+from prepare_data import Smartphones
+
+
+class JitteryService(FakeSheetsService):
+
+    """
+    Fake service whose responses take random time, so concurrent requests
+    finish in a random order
+    """
+
+    def admit(self) -> None:
+        time.sleep(self._random.uniform(0, 0.05))
+        super().admit()
+
+
+def read(max_workers=None, page_size=None, seed=0,
+         sheets=None) -> Smartphones:
+    client = SheetsClient(spreadsheet_id='synthetic',
+                          service=JitteryService(sheets or make_sheets(2000),
+                                                 seed=seed),
+                          scheduler=RequestScheduler(quota=0))
+    smartphones = Smartphones()
+    smartphones.read_from_excel_book(source=GoogleSheetsSource(
+        client=client, max_workers=max_workers, page_size=page_size))
+    return smartphones
+
+
+def snapshot(smartphones: Smartphones) -> list:
+    return [(s.name, s.date, s.highlight, s.ignore, s.chip,
+             s.battery_capacity,
+             [str(getattr(s, bench)) for bench in BENCHMARKS])
+            for s in smartphones.all_smartphones.values()]
+
+
+def test_concurrent_and_sequential_downloads_are_the_same():
+    sequential = read()
+    for seed in range(3):
+        concurrent = read(max_workers=4, seed=seed)
+        assert snapshot(concurrent) == snapshot(sequential)
+        assert ([s.name for s in concurrent.highlighted_smartphones]
+                == [s.name for s in sequential.highlighted_smartphones])
+
+
+
+def test_blank_rows_in_the_middle_do_not_end_a_paged_sheet():
+    sheets = make_sheets(2000)
+    rows = sheets['GeekBench 4']
+    # a gap longer than a page, Google gives blank rows as empty lists
+    rows[300:300] = [[] for _ in range(120)]
+
+    paged = read(page_size=50, sheets=sheets)
+    assert snapshot(paged) == snapshot(read(sheets=sheets))
+    assert rows[-1][2].split(' (')[0] in paged.all_smartphones
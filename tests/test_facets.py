@@ -0,0 +1,56 @@
+import json
+import math
+import os
+
+import pytest
+
+import render_scheduler
+from facets import render_facets
+from make_chart import load_plot_settings
+
+
+@pytest.fixture
+def images_dir(tmp_path, monkeypatch):
+    # plot settings are read once from the project, charts go to tmp_path
+    load_plot_settings()
+    monkeypatch.chdir(tmp_path)
+
+
+def pages(bench: str) -> list:
+    return sorted(os.listdir(os.path.join('images', 'page', bench)))
+
+
+def names(count: int) -> list:
+    return [f'{n:03d}.json' for n in range(1, count + 1)]
+
+
+@pytest.mark.usefixtures('images_dir')
+def test_stale_pages_are_removed_and_failed_ones_kept(smartphones,
+                                                      monkeypatch):
+    ranked = len(smartphones.rank('geek_bench4'))
+    render_facets(smartphones, benches=['geek_bench4', 'antutu7'],
+                  page_size=25, max_workers=1, fmt='json')
+    assert pages('geek_bench4') == names(math.ceil(ranked / 25))
+
+    render_chart = render_scheduler.render_chart
+
+    def fail_second_page(bench, data_for_plots, *args):
+        if args[-1].endswith('/002'):
+            raise RuntimeError('render failed')
+        return render_chart(bench, data_for_plots, *args)
+
+    monkeypatch.setattr(render_scheduler, 'render_chart', fail_second_page)
+    manifest, ok = render_facets(smartphones, benches=['geek_bench4'],
+                                 page_size=50, max_workers=1, fmt='json')
+
+    assert not ok
+    # the previous image of the failed page is kept
+    assert pages('geek_bench4') == names(math.ceil(ranked / 50))
+    assert sorted(os.listdir(os.path.join('images', 'page'))) == [
+        'geek_bench4', 'index.json']
+    entries = manifest['benchmarks'][0]['pages']
+    assert [entry['ok'] for entry in entries] == [
+        entry['page'] != 2 for entry in entries]
+    with open(os.path.join('images', 'page', 'index.json'),
+              encoding='utf8') as infile:
+        assert json.load(infile) == manifest
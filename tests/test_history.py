@@ -0,0 +1,55 @@
+from datetime import date
+
+import pytest
+
+from benchmark_registry import BENCHMARKS
+from history import make_series
+from make_chart import build_animation
+
+
+@pytest.mark.parametrize('bench', list(BENCHMARKS))
+def test_every_frame_has_a_trace_per_bar(smartphones, bench):
+    # the first date is before any smartphone
+    dates = [date(2014, 1, 1), date(2016, 1, 1), date(2014, 6, 1)]
+    series = make_series(smartphones, bench, dates)
+    assert not series[0].y_axis_names and series[1].y_axis_names
+
+    fig = build_animation(bench, [(str(as_of), data_for_plots) for
+                                  as_of, data_for_plots in zip(dates, series)])
+    bars = len(BENCHMARKS[bench].axes)
+    assert len(fig.data) == bars
+    assert [len(frame.data) for frame in fig.frames] == [bars] * len(dates)
+    assert all(len(trace.x) == 0 for trace in fig.frames[2].data)
+    assert all(len(trace.x) for trace in fig.frames[1].data)
+
+
+def test_past_ranking_refers_to_smartphones_shown(smartphones):
+    bench, as_of = 'geek_bench4', date(2015, 6, 30)
+    later = [s for s in smartphones.highlighted_smartphones
+             if s.date and s.date.date() > as_of]
+    assert later
+
+    ranked = smartphones.rank(bench, 30, as_of=as_of)
+    shown = [s for s in ranked if s.highlight]
+    reference = max(shown or ranked[-1:],
+                    key=lambda s: s.geek_bench4.total_score)
+    assert reference.geek_bench4.percentage_diff == '100'
+    assert all(s.geek_bench4.percentage_diff != '100' or
+               s.geek_bench4.total_score == reference.geek_bench4.total_score
+               for s in ranked)
+
+
+def test_animation_works_with_plotly_3(monkeypatch, smartphones):
+    import plotly.graph_objs as go
+
+    def missing(*args, **kwargs):
+        raise AttributeError('update_layout')
+
+    # requirements.txt pins plotly 3, which has no Figure.update_layout
+    monkeypatch.setattr(go.Figure, 'update_layout', missing)
+    dates = [date(2016, 1, 1), date(2017, 1, 1)]
+    fig = build_animation('antutu7', [
+        (str(as_of), data_for_plots) for as_of, data_for_plots in
+        zip(dates, make_series(smartphones, 'antutu7', dates))])
+    assert [step.label for step in fig.layout.sliders[0].steps] == \
+        [str(as_of) for as_of in dates]
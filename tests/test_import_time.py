@@ -0,0 +1,17 @@
+import os
+
+import pytest
+
+from benchmarks.import_time import BUDGET_MS, REPEAT, measure
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize('module', list(BUDGET_MS))
+def test_module_imports_within_budget(monkeypatch, module):
+    # modules are imported by a fresh interpreter from the root of the
+    # project
+    monkeypatch.chdir(ROOT)
+    runs = [measure(module) for _ in range(REPEAT)]
+    assert min(ms for ms, _ in runs) <= BUDGET_MS[module]
+    assert runs[-1][1] == []
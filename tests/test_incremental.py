@@ -0,0 +1,12 @@
+import app_config as cfg
+from incremental import chart_inputs, fingerprint
+from make_chart import load_plot_settings
+
+
+def test_window_is_an_input_of_charts(monkeypatch, smartphones):
+    plot_settings = load_plot_settings()
+    before = fingerprint(chart_inputs(smartphones, 'antutu7', plot_settings))
+
+    monkeypatch.setattr(cfg, 'PLOT_WINDOW', cfg.PLOT_WINDOW + 1)
+    assert fingerprint(chart_inputs(smartphones, 'antutu7',
+                                    plot_settings)) != before
@@ -0,0 +1,58 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+import catalogue_store
+from benchmarks.synthetic import make_sheets, write_csv
+from main import parse_args, read_smartphones
+
+
+@pytest.fixture
+def stores(monkeypatch):
+    opened = []
+
+    class RecordedStore(catalogue_store.CatalogueStore):
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            opened.append(self)
+
+    monkeypatch.setattr(catalogue_store, 'CatalogueStore', RecordedStore)
+    return opened
+
+
+def assert_closed(store):
+    with pytest.raises(sqlite3.ProgrammingError):
+        store._connection.execute('SELECT 1')
+
+
+def test_catalogue_selects_latest_and_is_closed(tmp_path, stores):
+    csv_dir, db = str(tmp_path / 'sheets'), str(tmp_path / 'catalogue.db')
+    write_csv(make_sheets(200), csv_dir)
+
+    with read_smartphones(parse_args(['ingest', '--csv-dir', csv_dir,
+                                      '--catalogue', db])) as read:
+        assert read.catalogue is None
+    assert_closed(stores[0])
+
+    with read_smartphones(parse_args(['ingest', '--catalogue', db,
+                                      '--from-catalogue'])) as loaded:
+        catalogue = loaded.catalogue
+        assert catalogue is stores[1]
+        queries, latest = [], catalogue.latest
+
+        def counted_latest(*args):
+            queries.append(args)
+            return latest(*args)
+
+        catalogue.latest = counted_latest
+
+        assert (loaded.prepare_data('geek_bench4')
+                == read.prepare_data('geek_bench4'))
+        dates = [date(2017, 1, 1), date(2018, 1, 1)]
+        assert (loaded.prepare_series('antutu7', dates)
+                == read.prepare_series('antutu7', dates))
+        # the index of the catalogue selects the latest smartphones
+        assert len(queries) == 3 and loaded._date_index is None
+    assert_closed(catalogue)
@@ -0,0 +1,45 @@
+from datetime import date, datetime
+
+from benchmarks.synthetic import make_sheets, write_csv
+from data_sources import CsvSource
+from prepare_data import Smartphones
+from row_parser import RowParser
+
+SETTINGS = Smartphones._make_table_reading_settings()
+
+
+def test_bad_date_is_dropped():
+    parser = RowParser(SETTINGS['geek_bench4'])
+    rows = list(parser.parse([['', '31.02.2019', 'Phone (Chip)', '1', '2',
+                               '3']]))
+    assert rows[0].date is None
+    assert not parser.report.errors[0].skipped
+
+
+def test_numeric_cells_are_reported():
+    parser = RowParser(SETTINGS['geek_bench4'])
+    rows = list(parser.parse([['', 43500, 'Phone (Chip)', '1', '2', '3'],
+                              ['', '', 'Other (Chip)', None, '2', '3']]))
+    assert [row.date for row in rows] == [None]
+    assert [error.skipped for error in parser.report.errors] == [False, True]
+
+
+def test_smartphone_with_bad_date_is_charted(tmp_path):
+    sheets = make_sheets(200)
+    sheets['GeekBench 4'].append(['', '31.02.2019', 'Broken Date (Chip)',
+                                  '1', '2', '3'])
+    write_csv(sheets, str(tmp_path))
+
+    smartphones = Smartphones()
+    smartphones.read_from_excel_book(source=CsvSource(str(tmp_path)))
+    assert smartphones.all_smartphones['Broken Date'].date is None
+
+    current = smartphones.prepare_data('geek_bench4')
+    assert current.y_axis_names
+    assert smartphones.prepare_data('geek_bench4',
+                                    as_of=date(2018, 1, 1)).y_axis_names
+
+    smartphones.build_date_index()
+    assert smartphones.prepare_data('geek_bench4') == current
+    assert smartphones.prepare_data(
+        'geek_bench4', as_of=datetime(2018, 1, 1)).y_axis_names
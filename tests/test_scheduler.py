@@ -0,0 +1,77 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from benchmarks.synthetic import FakeHttpError, FakeResponse, make_client
+from gspread_downloader import (HEADER_ROWS, RequestBudgetExceeded,
+                                RequestScheduler, SheetsClient)
+
+# quotas are per PERIOD seconds instead of a minute to keep tests short
+ROWS = 2000
+SHEET = 'GeekBench 4'
+PAGE_SIZE = 50
+QUOTA = 4
+PERIOD = 0.5
+BURST = 2
+
+
+def download(client: SheetsClient) -> None:
+    pages = list(client.iter_sheet_pages(SHEET, PAGE_SIZE))
+    rows = [row for page in pages for row in page if row]
+    assert rows == client.service.sheets[SHEET][HEADER_ROWS:]
+
+
+def test_limited_requests_are_not_throttled():
+    scheduler = RequestScheduler(quota=QUOTA, period=PERIOD, burst=BURST,
+                                 backoff=0.01, max_backoff=0.05)
+    client = make_client(ROWS, scheduler=scheduler, quota=QUOTA,
+                         period=PERIOD, error_rate=0.3)
+    download(client)
+    assert client.service.throttled == 0
+    assert client.service.failed and scheduler.retries
+
+
+def test_throttled_requests_are_sent_again():
+    scheduler = RequestScheduler(quota=0, backoff=0.01, max_backoff=0.05,
+                                 max_retries=20)
+    client = make_client(ROWS, scheduler=scheduler, quota=QUOTA,
+                         period=PERIOD)
+    download(client)
+    assert client.service.throttled and scheduler.retries
+
+
+def test_quota_of_one_request_spreads_requests():
+    scheduler = RequestScheduler(quota=1, period=0.1)
+    start = time.monotonic()
+    for _ in range(3):
+        scheduler.execute(dict)
+    assert time.monotonic() - start >= 0.2
+
+
+def test_other_errors_are_not_retried():
+    scheduler = RequestScheduler(quota=0, backoff=0.01)
+
+    def send():
+        raise FakeHttpError(FakeResponse(404))
+
+    with pytest.raises(FakeHttpError):
+        scheduler.execute(send)
+    assert scheduler.sent == 1 and scheduler.retries == 0
+
+
+def test_identical_requests_are_sent_once():
+    client = make_client(ROWS, latency=0.2)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        sheets = list(executor.map(client.get_sheet, [SHEET] * 8))
+    assert client.service.requests == 1
+    assert all(sheet == sheets[0] for sheet in sheets)
+    assert client.scheduler.deduplicated == 7
+
+
+def test_run_stops_at_its_budget():
+    client = make_client(ROWS, scheduler=RequestScheduler(quota=0,
+                                                          budget=3))
+    with pytest.raises(RequestBudgetExceeded):
+        download(client)
+    assert client.service.requests == 3